@@ -0,0 +1,313 @@
+"""
+@since: 2014-07-01
+@author: Jivan
+@brief: End to end benchmark of the fixture migrator on a generated project, so changes to the
+    pipeline can be measured without a real project's repository.
+    A throwaway git repository is built with a small Django/South project of several apps and
+    fixtures of a given number & size.  The fixtures are initialized, then a series of commits
+    adds South migrations to every app (new defaulted columns, with every so often a data
+    migration, which can't take the schema-only fast path) and the fixtures are migrated.
+    initialize_fixtures.py & migrate_fixtures.py are run as they would be from the command line,
+    with --trace, and reported as fixtures/minute with a per-phase breakdown (@see tracing).
+
+Usage:
+    python benchmark.py --apps 3 --fixtures 5 --rows 200 --migrations 4
+    Needs django, South & django_extensions importable, as for the tools themselves.
+    The scratch database is SQLite unless --backend postgres is given, in which case it's the
+    fixture_tools_db database of settings_migrator.py.
+"""
+import argparse
+import logging
+import os
+import shutil
+from subprocess import check_call
+import sys
+import tempfile
+import time
+
+import simplejson as json
+
+from django_fixture_tools.git_worktrees import TOOLS_DIR, tools_environment
+from django_fixture_tools.tracing import FIXTURE_SPAN
+
+
+logger = logging.getLogger(__name__)
+sh = logging.StreamHandler()
+logger.addHandler(sh)
+logger.setLevel(logging.DEBUG)
+
+PROJECT_PACKAGE = 'benchproj'
+BASE_FIELDS = [
+    ('name', 'django.db.models.fields.CharField', {'max_length': '100'}),
+    ('value', 'django.db.models.fields.IntegerField', {}),
+]
+
+SETTINGS_TEMPLATE = '''\
+import os
+
+SECRET_KEY = 'benchmark'
+DEBUG = False
+USE_TZ = False
+DATABASES = {{
+    'default': {{
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(os.path.dirname(os.path.dirname(__file__)), 'bench.sqlite3'),
+    }}
+}}
+INSTALLED_APPS = (
+    'django.contrib.contenttypes',
+    'django.contrib.auth',
+{apps}
+)
+FIXTURE_TOOLS_CACHE_DIR = {cache_dir!r}
+'''
+
+MIGRATION_TEMPLATE = '''\
+from django.db.models import F
+from south.db import db
+from south.v2 import SchemaMigration, DataMigration
+
+
+class Migration({base}):
+
+    def forwards(self, orm):
+{forwards}
+
+    def backwards(self, orm):
+{backwards}
+
+    models = {{
+        u'{app}.item': {{
+            'Meta': {{'object_name': 'Item'}},
+            u'id': ('django.db.models.fields.AutoField', [], {{'primary_key': 'True'}}),
+{frozen_fields}
+        }}
+    }}
+
+    complete_apps = ['{app}']
+'''
+
+
+def _write(path, text):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def git(repo_dir, *args):
+    with open(os.devnull, 'w') as devnull:
+        check_call(['git'] + list(args), cwd=repo_dir, stdout=devnull)
+
+
+def _extra_field(step):
+    return ('extra_{}'.format(step), 'django.db.models.fields.IntegerField', {'default': '0'})
+
+
+def write_models(repo_dir, app, fields):
+    lines = ['from django.db import models', '', '', 'class Item(models.Model):']
+    for name, field_class, options in fields:
+        args = ', '.join('{}={}'.format(k, v) for k, v in sorted(options.items()))
+        lines.append('    {} = models.{}({})'.format(name, field_class.split('.')[-1], args))
+    _write(os.path.join(repo_dir, app, 'models.py'), '\n'.join(lines) + '\n')
+
+
+def write_migration(repo_dir, app, number, name, fields, forwards, backwards, data=False):
+    frozen_fields = '\n'.join(
+        "            '{}': ('{}', [], {!r}),".format(field, field_class, options)
+            for field, field_class, options in fields)
+    text = MIGRATION_TEMPLATE.format(
+        base='DataMigration' if data else 'SchemaMigration', app=app,
+        forwards='\n'.join('        ' + l for l in forwards),
+        backwards='\n'.join('        ' + l for l in backwards),
+        frozen_fields=frozen_fields)
+    _write(os.path.join(repo_dir, app, 'migrations', '{:04d}_{}.py'.format(number, name)), text)
+
+
+def generate_project(repo_dir, cache_dir, apps, fixtures, rows):
+    """ @brief: Creates the benchmark project in a new git repository at \a repo_dir, with
+            \a apps apps each with \a fixtures fixtures of \a rows objects.
+        @author: Jivan
+        @since: 2014-07-01
+        @return: [<app label>, ...]
+    """
+    app_labels = ['app_{}'.format(i) for i in range(apps)]
+    git(repo_dir, 'init', '-q')
+    git(repo_dir, 'config', 'user.name', 'benchmark')
+    git(repo_dir, 'config', 'user.email', 'benchmark@localhost')
+
+    _write(os.path.join(repo_dir, PROJECT_PACKAGE, '__init__.py'), '')
+    _write(os.path.join(repo_dir, PROJECT_PACKAGE, 'settings.py'), SETTINGS_TEMPLATE.format(
+        apps='\n'.join("    '{}',".format(app) for app in app_labels), cache_dir=cache_dir))
+    _write(os.path.join(repo_dir, '.gitignore'), '*.pyc\n*.sqlite3\n')
+
+    for app in app_labels:
+        _write(os.path.join(repo_dir, app, '__init__.py'), '')
+        _write(os.path.join(repo_dir, app, 'migrations', '__init__.py'), '')
+        write_models(repo_dir, app, BASE_FIELDS)
+        table = "u'{}_item'".format(app)
+        columns = ["    (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),"]
+        columns.extend("    ('{}', self.gf('{}')({})),".format(
+                           name, field_class,
+                           ', '.join('{}={}'.format(k, v) for k, v in options.items()))
+                       for name, field_class, options in BASE_FIELDS)
+        write_migration(repo_dir, app, 1, 'initial', BASE_FIELDS,
+                        ['db.create_table({}, ('.format(table)] + columns + [
+                         '))', "db.send_create_signal(u'{}', ['Item'])".format(app)],
+                        ['db.delete_table({})'.format(table)])
+        for i in range(fixtures):
+            objects = [{
+                'model': '{}.item'.format(app),
+                'pk': pk,
+                'fields': {'name': '{} item {}'.format(app, pk), 'value': pk},
+            } for pk in range(1, rows + 1)]
+            _write(os.path.join(repo_dir, app, 'fixtures', 'bench_{}.json'.format(i)),
+                   json.dumps(objects, indent=4))
+
+    git(repo_dir, 'add', '-A')
+    git(repo_dir, 'commit', '-q', '-m', 'Benchmark project')
+    return app_labels
+
+
+def add_migrations(repo_dir, app_labels, step, fields, data=False):
+    """ @brief: Commits migration number \a step + 1 of every app, a data migration if \a data,
+            otherwise a new defaulted column.
+        @author: Jivan
+        @since: 2014-07-01
+        @param fields: The fields of the apps' models before this step.
+        @return: The fields of the apps' models after this step.
+    """
+    if not data:
+        fields = fields + [_extra_field(step)]
+    for app in app_labels:
+        table = "u'{}_item'".format(app)
+        if data:
+            write_migration(repo_dir, app, step + 1, 'bump_values_{}'.format(step), fields,
+                            ["orm['{}.Item'].objects.update(value=F('value') + 1)".format(app)],
+                            ["orm['{}.Item'].objects.update(value=F('value') - 1)".format(app)],
+                            data=True)
+        else:
+            field = fields[-1]
+            write_models(repo_dir, app, fields)
+            write_migration(repo_dir, app, step + 1, 'add_extra_{}'.format(step), fields,
+                            ["db.add_column({}, '{}', self.gf('{}')(default=0), "\
+                             "keep_default=False)".format(table, field[0], field[1])],
+                            ["db.delete_column({}, '{}')".format(table, field[0])])
+    git(repo_dir, 'add', '-A')
+    git(repo_dir, 'commit', '-q', '-m', 'Migration step {}'.format(step))
+    return fields
+
+
+def run_tool(repo_dir, script, args, trace_path, backend='sqlite'):
+    """ @brief: Runs fixture tools \a script (Ex: 'fixture_migrator/migrate_fixtures.py') on the
+            benchmark project with \a args, tracing it to \a trace_path.
+        @author: Jivan
+        @since: 2014-07-01
+        @return: Wall clock seconds the run took.
+    """
+    env = tools_environment(repo_dir)
+    env['DJANGO_SETTINGS_MODULE'] = 'django_fixture_tools.settings_migrator'
+    env['FIXTURE_TOOLS_PROJECT_SETTINGS'] = '{}.settings'.format(PROJECT_PACKAGE)
+    if backend == 'sqlite':
+        env['FIXTURE_TOOLS_SCRATCH_BACKEND'] = 'sqlite'
+    start = time.time()
+    check_call([sys.executable, os.path.join(TOOLS_DIR, script)] + list(args) +
+               ['--trace', trace_path], cwd=repo_dir, env=env)
+    return time.time() - start
+
+
+def phase_totals(trace_path):
+    """ @return: {<phase>: (<count>, <total seconds>), ...} from the spans written beside the
+            trace at \a trace_path (@see tracing.write_trace()).
+    """
+    with open('{}.spans.json'.format(os.path.splitext(trace_path)[0])) as tf:
+        spans = json.load(tf)
+    totals = {}
+    for s in spans:
+        if s['name'] == FIXTURE_SPAN:
+            continue
+        count, total = totals.get(s['name'], (0, 0.0))
+        totals[s['name']] = (count + 1, total + s['duration'])
+    return totals
+
+
+def describe_run(stage, fixtures, seconds, phases):
+    """ @return: A human readable report of a benchmarked run. """
+    lines = ['{}: {} fixtures in {:.1f}s, {:.1f} fixtures/min'.format(
+             stage, fixtures, seconds, fixtures * 60.0 / seconds if seconds else 0)]
+    for name, (count, total) in sorted(phases.items(), key=lambda p: p[1][1], reverse=True):
+        lines.append('    {:<24} {:>6} {:>9.2f}s {:>6.1f}%'.format(
+                     name, count, total, 100.0 * total / seconds if seconds else 0))
+    return '\n'.join(lines)
+
+
+def run_benchmark(apps=3, fixtures=5, rows=200, migrations=4, data_every=2, jobs=1,
+                  backend='sqlite', work_dir=None, keep=False):
+    """ @brief: Builds the benchmark project & times initializing then migrating its fixtures.
+        @author: Jivan
+        @since: 2014-07-01
+        @param data_every: Every this many migration steps is a data migration, 0 for none.
+        @param jobs: @see migrate_fixtures.migrate_all_fixtures()
+        @param keep: Keep the benchmark repository & traces, in \a work_dir or a temporary
+            directory.
+        @return: The report, @see describe_run()
+    """
+    work_dir = work_dir or tempfile.mkdtemp(prefix='fixture_tools_bench_')
+    repo_dir = os.path.join(work_dir, 'repo')
+    cache_dir = os.path.join(work_dir, 'cache')
+    os.makedirs(repo_dir)
+    try:
+        logger.info('Generating benchmark project in {}'.format(repo_dir))
+        app_labels = generate_project(repo_dir, cache_dir, apps, fixtures, rows)
+        total_fixtures = apps * fixtures
+        reports = []
+
+        trace_path = os.path.join(work_dir, 'initialize.trace.json')
+        seconds = run_tool(repo_dir, os.path.join('fixture_migrator', 'initialize_fixtures.py'),
+                           ['-s', repo_dir], trace_path, backend=backend)
+        reports.append(describe_run('initialize_all_fixtures', total_fixtures, seconds,
+                                    phase_totals(trace_path)))
+        git(repo_dir, 'add', '-A')
+        git(repo_dir, 'commit', '-q', '-m', 'Initialize fixtures')
+
+        fields = BASE_FIELDS
+        for step in range(1, migrations + 1):
+            fields = add_migrations(repo_dir, app_labels, step, fields,
+                                    data=bool(data_every) and step % data_every == 0)
+
+        trace_path = os.path.join(work_dir, 'migrate.trace.json')
+        seconds = run_tool(repo_dir, os.path.join('fixture_migrator', 'migrate_fixtures.py'),
+                           ['-s', repo_dir, '-j', str(jobs)], trace_path, backend=backend)
+        reports.append(describe_run('migrate_all_fixtures', total_fixtures, seconds,
+                                    phase_totals(trace_path)))
+        return '\n'.join(reports)
+    finally:
+        if keep:
+            logger.info('Benchmark repository & traces kept in {}'.format(work_dir))
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the fixture migrator end to end.')
+    parser.add_argument('--apps', type=int, default=3, help='Apps in the generated project')
+    parser.add_argument('--fixtures', type=int, default=5, help='Fixtures per app')
+    parser.add_argument('--rows', type=int, default=200, help='Objects per fixture')
+    parser.add_argument('--migrations', type=int, default=4,
+        help='Commits adding a migration to every app, made after the fixtures are initialized')
+    parser.add_argument('--data-every', type=int, default=2,
+        help='Every this many migrations is a data migration (0 for none), the rest add columns')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+        help='Fixtures to migrate at once, @see migrate_fixtures.py -j')
+    parser.add_argument('--backend', choices=['sqlite', 'postgres'], default='sqlite',
+        help='Scratch database backend')
+    parser.add_argument('--dir', default=None,
+        help='Directory to build the benchmark in (default: a temporary directory), implies '\
+             '--keep')
+    parser.add_argument('--keep', action='store_true',
+        help='Keep the generated repository & traces')
+    args = parser.parse_args()
+
+    print(run_benchmark(apps=args.apps, fixtures=args.fixtures, rows=args.rows,
+                        migrations=args.migrations, data_every=args.data_every, jobs=args.jobs,
+                        backend=args.backend, work_dir=args.dir, keep=args.keep or bool(args.dir)))
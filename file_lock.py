@@ -0,0 +1,50 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Advisory file locks for state shared by concurrent fixture tools processes (Ex: the
+    jobs of a --jobs run, or two runs in the same repository), such as the worktree cache and
+    the scratch database template registry.
+    Locks are flock()s, so they're released when the process holding them dies.
+"""
+from contextlib import contextmanager
+import errno
+import fcntl
+import os
+
+
+@contextmanager
+def file_lock(lock_path):
+    """ @brief: Holds an exclusive lock on \a lock_path (created if needed) for the duration of
+            the with block, waiting for other processes to release it first.
+        @author: Jivan
+        @since: 2014-07-06
+        @note: Threads take the lock through their own open file, so they exclude each other
+            too.
+    """
+    directory = os.path.dirname(lock_path)
+    if directory and not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # Made by another process meanwhile.
+            if not os.path.isdir(directory):
+                raise
+    with open(lock_path, 'a') as lf:
+        fcntl.flock(lf, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lf, fcntl.LOCK_UN)
+
+
+def process_exists(pid):
+    """ @brief: True if a process with id \a pid is running (on this machine).
+        @author: Jivan
+        @since: 2014-07-06
+    """
+    try:
+        os.kill(pid, 0)
+    except OSError as ex:
+        # EPERM: it exists but belongs to someone else.
+        return ex.errno == errno.EPERM
+    return True
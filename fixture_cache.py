@@ -0,0 +1,434 @@
+"""
+@since: 2014-07-03
+@author: Jivan
+@brief: Compiles fixtures into bulk load artifacts for test suites, so loading a fixture is a
+    COPY per table (Postgres) or a script of INSERTs (SQLite) instead of loaddata deserializing
+    & saving one object at a time.
+    A fixture is compiled by loading it into a database and copying its rows back out of each
+    table, so an artifact holds exactly what loaddata would have stored.  Artifacts are kept in
+    a directory per fixture hash & named by the database backend and a hash of the models &
+    migrations of the apps the fixture has rows for.  A fixture without an artifact matching
+    its current contents & schema is loaded with loaddata as before.
+    Loading an artifact replaces rows with the same primary keys (& the many-to-many rows of
+    the objects in it) like loaddata does, but no model signals are sent.
+    Base fixtures (@see fixture_dedupe) are compiled on their own & loaded first.
+
+Usage:
+    python fixture_cache.py -s <scan path>
+    python fixture_cache.py -p <fixture path>
+    Run with DJANGO_SETTINGS_MODULE=django_fixture_tools.settings_migrator, fixtures are loaded
+    into the scratch database to compile them.  migrate_fixtures.py --compile also compiles the
+    fixtures it migrates through the scratch database.
+    In tests, with the test database's settings:
+        from django_fixture_tools.fixture_cache import load_compiled_fixture
+        load_compiled_fixture('<app>/fixtures/<fixture>.json')
+Settings:
+    FIXTURE_TOOLS_COMPILED_DIR: Where artifacts are kept
+        (default <FIXTURE_TOOLS_CACHE_DIR>/compiled_fixtures).
+    FIXTURE_TOOLS_MAX_COMPILED: Number of artifacts to keep, the least recently used are
+        removed first (default 1000).
+"""
+import argparse
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+
+from django.conf import settings
+from django.db import connections, transaction
+
+import simplejson as json
+
+from django_fixture_tools.fixture_io import iter_fixture_objects, fixture_file_hash
+from django_fixture_tools.fixture_dedupe import get_fixture_bases, write_base_data,\
+    HISTORY_MODEL
+from django_fixture_tools.scratch_db import get_cache_dir, is_postgres, is_sqlite, _schema_files
+from django_fixture_tools.tracing import span
+
+
+logger = logging.getLogger(__name__)
+sh = logging.StreamHandler()
+logger.addHandler(sh)
+logger.setLevel(logging.DEBUG)
+
+APPS_FILENAME = 'apps.json'
+# Each block of an artifact starts with a line of this prefix & the block's json header.
+HEADER_PREFIX = '-- '
+# Ends the COPY data of a block in Postgres artifacts.
+COPY_END = b'\\.\n'
+# Keys per DELETE statement in SQLite artifacts.
+DELETE_CHUNK = 500
+LOAD_TABLE = 'fixture_tools_load'
+
+
+def get_compiled_dir():
+    """ @brief: Returns the directory artifacts are kept in, creating it if needed.
+        @author: Jivan
+        @since: 2014-07-03
+    """
+    compiled_dir = getattr(settings, 'FIXTURE_TOOLS_COMPILED_DIR',
+                           os.path.join(get_cache_dir(), 'compiled_fixtures'))
+    if not os.path.isdir(compiled_dir):
+        os.makedirs(compiled_dir)
+    return compiled_dir
+
+
+def _backend(database):
+    if is_postgres(database):
+        return 'postgres'
+    if is_sqlite(database):
+        return 'sqlite'
+    return None
+
+
+def schema_key(database, app_labels):
+    """ @brief: Returns a hash of the backend of \a database and the models & migrations on disk
+            of the apps \a app_labels.
+        @author: Jivan
+        @since: 2014-07-03
+        @note: Only the apps a fixture has rows for count, so changes to other apps or to the
+            rest of INSTALLED_APPS (Ex: the scratch database's extra apps) keep its artifact.
+    """
+    app_names = dict((app_name.rsplit('.', 1)[-1], app_name)
+                         for app_name in settings.INSTALLED_APPS)
+    sha = hashlib.sha1()
+    sha.update(_backend(database).encode('utf-8'))
+    for app_label in sorted(app_labels):
+        sha.update(app_label.encode('utf-8'))
+        for path in _schema_files(app_names.get(app_label, app_label)):
+            sha.update(os.path.basename(path).encode('utf-8'))
+            with open(path, 'rb') as sf:
+                sha.update(sf.read())
+    return sha.hexdigest()
+
+
+def _artifact_path(fixture_dir, database, app_labels):
+    extension = '.copy' if is_postgres(database) else '.sql'
+    return os.path.join(fixture_dir, '{}_{}{}'.format(
+                        _backend(database), schema_key(database, app_labels), extension))
+
+
+def find_compiled_fixture(fixture_path, database='default'):
+    """ @brief: Returns the path of the artifact of \a fixture_path for \a database, None if
+            there isn't one for the fixture's current contents & schema.
+        @author: Jivan
+        @since: 2014-07-03
+    """
+    if _backend(database) is None:
+        return None
+    fixture_dir = os.path.join(get_compiled_dir(), fixture_file_hash(fixture_path))
+    try:
+        with open(os.path.join(fixture_dir, APPS_FILENAME)) as af:
+            app_labels = json.load(af)
+    except (IOError, ValueError):
+        return None
+    path = _artifact_path(fixture_dir, database, app_labels)
+    return path if os.path.exists(path) else None
+
+
+def _fixture_tables(fixture_path):
+    """ @brief: Returns the tables holding the rows of \a fixture_path.
+        @return: [{'model': <model label>, 'table': <table>, 'columns': [<column>, ...],
+                   'key': <column identifying the fixture's rows>, 'keys': [<value>, ...]}, ...]
+            Many-to-many tables are identified by the column referencing the fixture's objects
+            & don't include their own ids, which the database assigns on load.
+    """
+    from django.db.models import get_model
+    pks = {}
+    for obj in iter_fixture_objects(fixture_path):
+        if 'pk' not in obj:
+            raise Exception('{}: {} object without a pk can\'t be compiled'.format(
+                            fixture_path, obj['model']))
+        pks.setdefault(obj['model'], []).append(obj['pk'])
+
+    tables = []
+    for label in sorted(pks):
+        model = get_model(*label.split('.'))
+        if model is None:
+            raise Exception('{}: unknown model {}'.format(fixture_path, label))
+        tables.append({'model': label, 'table': model._meta.db_table,
+                       'columns': [f.column for f in model._meta.local_fields],
+                       'key': model._meta.pk.column, 'keys': pks[label]})
+        for f in model._meta.local_many_to_many:
+            if f.rel.through._meta.auto_created:
+                tables.append({'model': label, 'table': f.m2m_db_table(),
+                               'columns': [f.m2m_column_name(), f.m2m_reverse_name()],
+                               'key': f.m2m_column_name(), 'keys': pks[label]})
+    return tables
+
+
+def _header_line(table):
+    header = dict((k, table[k]) for k in ('model', 'table', 'columns', 'key'))
+    return u'{}{}\n'.format(HEADER_PREFIX, json.dumps(header, sort_keys=True))
+
+
+def _write_postgres(database, tables, af):
+    qn = connections[database].ops.quote_name
+    cursor = connections[database].connection.cursor()
+    for table in tables:
+        query = cursor.mogrify('SELECT {} FROM {} WHERE {} = ANY(%s)'.format(
+                               ', '.join(qn(c) for c in table['columns']), qn(table['table']),
+                               qn(table['key'])), [table['keys']])
+        if not isinstance(query, str):
+            query = query.decode('utf-8')
+        af.write(_header_line(table).encode('utf-8'))
+        cursor.copy_expert('COPY ({}) TO STDOUT'.format(query), af)
+        af.write(COPY_END)
+
+
+def _write_sqlite(database, tables, af):
+    qn = connections[database].ops.quote_name
+    # Values are quoted by SQLite itself, as in its .dump output.
+    cursor = connections[database].connection.cursor()
+    for table in tables:
+        keys = set(table['keys'])
+        cursor.execute('SELECT {key}, quote({key}), {row} FROM {table} ORDER BY {key}'.format(
+                       key=qn(table['key']), table=qn(table['table']),
+                       row=" || ', ' || ".join('quote({})'.format(qn(c))
+                                                   for c in table['columns'])))
+        quoted_keys = []
+        rows = []
+        for key, quoted_key, row in cursor:
+            if key in keys:
+                if quoted_key not in quoted_keys[-1:]:
+                    # Many-to-many rows of an object are together.
+                    quoted_keys.append(quoted_key)
+                rows.append(row)
+        af.write(_header_line(table))
+        for i in range(0, len(quoted_keys), DELETE_CHUNK):
+            af.write(u'DELETE FROM {} WHERE {} IN ({});\n'.format(
+                     qn(table['table']), qn(table['key']),
+                     ', '.join(quoted_keys[i:i + DELETE_CHUNK])))
+        insert = u'INSERT INTO {} ({}) VALUES '.format(
+                     qn(table['table']), ', '.join(qn(c) for c in table['columns']))
+        for row in rows:
+            af.write(u'{}({});\n'.format(insert, row))
+
+
+def compile_fixture(fixture_path, database='fixture_tools_db', loaded=False):
+    """ @brief: Compiles \a fixture_path into an artifact for \a database's backend.
+        @author: Jivan
+        @since: 2014-07-03
+        @param loaded: True if \a database already holds the fixture (Ex: just migrated &
+            dumped), otherwise the scratch database is emptied & the fixture loaded into it.
+        @return: The artifact's path, None if \a database's backend isn't supported.
+        @note: \a database must have the schema of the models on disk.
+    """
+    if _backend(database) is None:
+        logger.warning('Compiled fixtures need Postgres or SQLite, not {}'.format(
+                       settings.DATABASES[database]['ENGINE']))
+        return None
+    if not loaded:
+        from django_fixture_tools.scratch_db import prepare_scratch_db
+        from django_fixture_tools.shared import load_fixture
+        prepare_scratch_db(database)
+        load_fixture(fixture_path, database=database)
+
+    with span('compile_fixture', fixture=fixture_path, database=database) as trace:
+        tables = _fixture_tables(fixture_path)
+        app_labels = sorted(set(table['model'].split('.')[0] for table in tables))
+        fixture_dir = os.path.join(get_compiled_dir(), fixture_file_hash(fixture_path))
+        if not os.path.isdir(fixture_dir):
+            os.makedirs(fixture_dir)
+        path = _artifact_path(fixture_dir, database, app_labels)
+        # The raw connection is only opened by django's cursor().
+        connections[database].cursor()
+        # Written under unique names first, other processes may be compiling the same fixture.
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        if is_postgres(database):
+            with io.open(tmp_path, 'wb') as af:
+                _write_postgres(database, tables, af)
+        else:
+            with io.open(tmp_path, 'w', encoding='utf-8') as af:
+                _write_sqlite(database, tables, af)
+        os.rename(tmp_path, path)
+        apps_path = os.path.join(fixture_dir, APPS_FILENAME)
+        tmp_path = '{}.{}.tmp'.format(apps_path, os.getpid())
+        with open(tmp_path, 'w') as af:
+            json.dump(app_labels, af)
+        os.rename(tmp_path, apps_path)
+        trace['tables'] = len(tables)
+        trace['bytes'] = os.path.getsize(path)
+
+    evict_compiled_fixtures()
+    logger.info('Compiled {} to {}'.format(fixture_path, path))
+    return path
+
+
+def evict_compiled_fixtures(keep=None):
+    """ @brief: Removes the least recently used artifacts beyond the newest \a keep
+            (default FIXTURE_TOOLS_MAX_COMPILED).
+        @author: Jivan
+        @since: 2014-07-03
+    """
+    if keep is None:
+        keep = getattr(settings, 'FIXTURE_TOOLS_MAX_COMPILED', 1000)
+    compiled_dir = get_compiled_dir()
+    artifacts = []
+    for fixture_hash in os.listdir(compiled_dir):
+        fixture_dir = os.path.join(compiled_dir, fixture_hash)
+        if os.path.isdir(fixture_dir):
+            artifacts.extend(os.path.join(fixture_dir, f) for f in os.listdir(fixture_dir)
+                                 if f.endswith(('.copy', '.sql')))
+    artifacts.sort(key=os.path.getmtime, reverse=True)
+    for path in artifacts[keep:]:
+        logger.debug('Evicting compiled fixture {}'.format(path))
+        os.remove(path)
+        fixture_dir = os.path.dirname(path)
+        if not any(f.endswith(('.copy', '.sql')) for f in os.listdir(fixture_dir)):
+            os.remove(os.path.join(fixture_dir, APPS_FILENAME))
+            os.rmdir(fixture_dir)
+
+
+def _read_blocks(path):
+    """ @brief: Yields the (<header>, [<line>, ...]) blocks of the artifact at \a path. """
+    if path.endswith('.copy'):
+        with io.open(path, 'rb') as af:
+            header, lines = None, []
+            for line in af:
+                if header is None:
+                    header = json.loads(line[len(HEADER_PREFIX):].decode('utf-8'))
+                elif line == COPY_END:
+                    yield header, lines
+                    header, lines = None, []
+                else:
+                    lines.append(line)
+    else:
+        with io.open(path, encoding='utf-8') as af:
+            header, lines, statement = None, [], u''
+            for line in af:
+                if not statement and line.startswith(HEADER_PREFIX):
+                    if header is not None:
+                        yield header, lines
+                    header, lines = json.loads(line[len(HEADER_PREFIX):]), []
+                    continue
+                statement += line
+                if sqlite3.complete_statement(statement):
+                    lines.append(statement)
+                    statement = u''
+            if header is not None:
+                yield header, lines
+
+
+def _load_postgres(database, header, lines):
+    qn = connections[database].ops.quote_name
+    cursor = connections[database].connection.cursor()
+    columns = ', '.join(qn(c) for c in header['columns'])
+    table = qn(header['table'])
+    key = qn(header['key'])
+    load_table = qn(LOAD_TABLE)
+    cursor.execute('CREATE TEMPORARY TABLE {} AS SELECT {} FROM {} WITH NO DATA'.format(
+                   load_table, columns, table))
+    cursor.copy_expert('COPY {} ({}) FROM STDIN'.format(load_table, columns),
+                       io.BytesIO(b''.join(lines)))
+    cursor.execute('DELETE FROM {table} USING {load} WHERE {table}.{key} = {load}.{key}'.format(
+                   table=table, load=load_table, key=key))
+    cursor.execute('INSERT INTO {} ({}) SELECT {} FROM {}'.format(
+                   table, columns, columns, load_table))
+    cursor.execute('DROP TABLE {}'.format(load_table))
+
+
+def _load_sqlite(database, header, lines):
+    # The raw cursor, django's would take '%s' in the data for parameters.
+    cursor = connections[database].connection.cursor()
+    for statement in lines:
+        cursor.execute(statement)
+
+
+def _reset_sequences(database, model_labels):
+    from django.core.management.color import no_style
+    from django.db.models import get_model
+    models = [get_model(*label.split('.')) for label in model_labels]
+    cursor = connections[database].cursor()
+    for sql in connections[database].ops.sequence_reset_sql(no_style(), models):
+        cursor.execute(sql)
+
+
+def load_artifact(path, database='default', history=True):
+    """ @brief: Loads the compiled fixture at \a path into \a database in one transaction.
+        @author: Jivan
+        @since: 2014-07-03
+        @param history: If False the South migration history in the artifact isn't loaded
+            (as for base fixtures).
+    """
+    # Only needed on django versions without atomic().
+    atomic = getattr(transaction, 'atomic', None) or transaction.commit_on_success
+    model_labels = set()
+    with span('load_compiled_fixture', artifact=path, database=database,
+              bytes=os.path.getsize(path)):
+        with atomic(using=database):
+            # The raw connection is only opened by django's cursor().
+            connections[database].cursor()
+            for header, lines in _read_blocks(path):
+                if not history and header['model'] == HISTORY_MODEL:
+                    continue
+                if is_postgres(database):
+                    _load_postgres(database, header, lines)
+                else:
+                    _load_sqlite(database, header, lines)
+                model_labels.add(header['model'])
+            if is_postgres(database):
+                _reset_sequences(database, model_labels)
+    # Marks the artifact as recently used, @see evict_compiled_fixtures()
+    os.utime(path, None)
+
+
+def load_compiled_fixture(fixture_path, database='default'):
+    """ @brief: Loads \a fixture_path into \a database from its artifact if it has one for its
+            current contents & schema, with loaddata otherwise.  Its base fixtures are loaded
+            first, the same way.
+        @author: Jivan
+        @since: 2014-07-03
+        @return: True if the fixture was loaded from its artifact, False if with loaddata.
+    """
+    from django_fixture_tools.shared import load_fixture
+    base_artifacts = [find_compiled_fixture(base_path, database)
+                          for base_path in get_fixture_bases(fixture_path)]
+    if all(base_artifacts):
+        for artifact in base_artifacts:
+            load_artifact(artifact, database=database, history=False)
+    else:
+        base_data = write_base_data(fixture_path)
+        try:
+            for base_path in base_data:
+                load_fixture(base_path, database=database, bases=[])
+        finally:
+            for base_path in base_data:
+                os.remove(base_path)
+
+    artifact = find_compiled_fixture(fixture_path, database)
+    if artifact is None:
+        logger.debug('Not compiled, loading with loaddata: {}'.format(fixture_path))
+        load_fixture(fixture_path, database=database, bases=[])
+        return False
+    load_artifact(artifact, database=database)
+    return True
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                description='Compile fixtures into bulk load artifacts for the test database.')
+    parser.add_argument('-s', '--scan_path', nargs=1,
+        help='path to scan for fixtures to compile')
+    parser.add_argument('-p', '--fixture_path', nargs=1,
+        help='path to fixture to compile')
+    parser.add_argument('--database', default='fixture_tools_db',
+        help='Database to compile fixtures with (default fixture_tools_db)')
+    args = parser.parse_args()
+
+    if args.scan_path:
+        from django_fixture_tools.shared import scan_filesystem_for_fixtures
+        fs = scan_filesystem_for_fixtures(args.scan_path[0], exclude_dirs=['build', 'sandbox'])
+    else:
+        fs = args.fixture_path or []
+    failed = []
+    for f in fs:
+        if find_compiled_fixture(f, args.database) is not None:
+            logger.info('{}: already compiled'.format(f))
+            continue
+        try:
+            compile_fixture(f, database=args.database)
+        except Exception as ex:
+            logger.error('{}: failed to compile:\n{}'.format(f, ex))
+            failed.append(f)
+    logger.info('{} fixture(s), {} failed'.format(len(fs), len(failed)))
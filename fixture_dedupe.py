@@ -0,0 +1,403 @@
+"""
+@since: 2014-07-02
+@author: Jivan
+@brief: Moves rows repeated across fixtures (content types, cities, users, restaurants, ... that
+    db_sample() includes with every fixture needing them) into shared base fixtures, so each is
+    stored, loaded & migrated once instead of once per fixture.
+    Rows are compared by content.  Fixtures are only compared with fixtures at the same South
+    history heads.  Rows found in the same set of fixtures form a base fixture, named by the hash
+    of its rows, which gets the South history of the fixtures it came from so it's migrated like
+    any other fixture.  Each fixture keeps its own rows & history and lists its bases, relative
+    to its directory, in a json file beside it: <fixture path>.bases
+    A row only moves to a base if the rows it references (foreign keys, many-to-many & parent
+    models) are in the same base, so a base loads on its own.
+    Loading a fixture loads its bases first (without their history), @see shared.load_fixture().
+
+Usage:
+    python fixture_dedupe.py -s <scan path> [--base-dir <dir>] [--dry-run]
+    python fixture_dedupe.py --expand <fixture path>
+    Run with DJANGO_SETTINGS_MODULE=django_fixture_tools.settings_migrator, model relations are
+    read from the project's models.
+"""
+import argparse
+import hashlib
+import logging
+import os
+import tempfile
+
+import simplejson as json
+
+from django_fixture_tools.fixture_io import iter_fixture_objects, read_fixture, write_fixture,\
+    write_fixture_text, canonical_fixture_text, parse_fixture_data, get_fixture_extension
+
+
+logger = logging.getLogger(__name__)
+sh = logging.StreamHandler()
+logger.addHandler(sh)
+logger.setLevel(logging.DEBUG)
+
+BASES_SUFFIX = '.bases'
+BASE_DIRNAME = 'shared_fixtures'
+HISTORY_MODEL = 'south.migrationhistory'
+
+
+def get_reference_fields():
+    """ @brief: Returns the fields of each installed model that reference other rows.
+        @author: Jivan
+        @since: 2014-07-02
+        @return: {<model label>: ({<field name>: (<target model label>, <is many-to-many>,
+                                                  <target field name>), ...},
+                                  [<parent model label>, ...]), ...}
+            Labels are as used in fixtures, parent rows share the child row's pk.  The target
+            field is None for references to the pk, the field's name for foreign keys with a
+            to_field, whose values in fixtures are that field's.
+    """
+    from django.db.models import get_models
+    references = {}
+    for model in get_models(include_auto_created=True):
+        fields = {}
+        for f in model._meta.fields:
+            if f.rel is not None and not isinstance(f.rel.to, basestring):
+                target_field = f.rel.field_name
+                if target_field == f.rel.to._meta.pk.name:
+                    target_field = None
+                fields[f.name] = (unicode(f.rel.to._meta), False, target_field)
+        for f in model._meta.many_to_many:
+            if not isinstance(f.rel.to, basestring):
+                fields[f.name] = (unicode(f.rel.to._meta), True, None)
+        parents = [unicode(parent._meta) for parent in model._meta.parents]
+        if fields or parents:
+            references[unicode(model._meta)] = (fields, parents)
+    return references
+
+
+def get_target_fields(reference_fields):
+    """ @brief: Returns the fields other than the pk that rows are referenced by.
+        @author: Jivan
+        @since: 2014-07-06
+        @param reference_fields: @see get_reference_fields()
+        @return: {<model label>: set([<field name>, ...]), ...}
+    """
+    target_fields = {}
+    for fields, parents in reference_fields.values():
+        for target, many, target_field in fields.values():
+            if target_field is not None:
+                target_fields.setdefault(target, set()).add(target_field)
+    return target_fields
+
+
+def _hashable(value):
+    if isinstance(value, list):
+        return tuple(_hashable(v) for v in value)
+    return value
+
+
+def row_key(obj):
+    """ @return: (<model label>, <pk>) identifying \a obj within a fixture. """
+    return (obj['model'], _hashable(obj.get('pk')))
+
+
+def row_value_keys(obj, target_fields):
+    """ @return: [(<model label>, <field name>, <value>), ...] identifying \a obj by each of
+            its fields in \a target_fields (@see get_target_fields()), as references with a
+            to_field name it.
+    """
+    return [(obj['model'], name, _hashable(obj['fields'].get(name)))
+                for name in sorted(target_fields.get(obj['model'], ()))
+                if obj['fields'].get(name) is not None]
+
+
+def row_hash(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def row_references(obj, reference_fields):
+    """ @brief: Returns the rows \a obj references.
+        @author: Jivan
+        @since: 2014-07-02
+        @return: [(<model label>, <target field name, None for the pk>,
+                   <pk, target field value or natural key>, <is natural key>), ...]
+    """
+    fields, parents = reference_fields.get(obj['model'], ({}, []))
+    references = [(parent, None, _hashable(obj.get('pk')), False) for parent in parents]
+    for name, (target, many, target_field) in fields.items():
+        value = obj['fields'].get(name)
+        if value is None:
+            continue
+        # Many-to-many values are lists of pks, natural keys are lists.
+        for v in (value if many else [value]):
+            references.append((target, target_field, _hashable(v), isinstance(v, list)))
+    return references
+
+
+def get_fixture_bases(fixture_path):
+    """ @brief: Returns the paths of the base fixtures of \a fixture_path, none if it has none.
+        @author: Jivan
+        @since: 2014-07-02
+    """
+    bases_path = fixture_path + BASES_SUFFIX
+    if not os.path.exists(bases_path):
+        return []
+    with open(bases_path) as bf:
+        relative_paths = json.load(bf)
+    fixture_dir = os.path.dirname(os.path.abspath(fixture_path))
+    return [os.path.normpath(os.path.join(fixture_dir, p)) for p in relative_paths]
+
+
+def _base_objects(base_path, commit=None):
+    """ @return: The rows of \a base_path (as it was at \a commit if given) without its South
+            history.
+    """
+    objects = None
+    if commit is not None:
+        from django_fixture_tools.shared import read_file_at_commit
+        try:
+            objects = parse_fixture_data(read_file_at_commit(base_path, commit), base_path)
+        except IOError:
+            logger.warning('{} not found at {}, using the working tree'.format(
+                           base_path, commit[:8]))
+    if objects is None:
+        objects = iter_fixture_objects(base_path)
+    return [o for o in objects if o['model'] != HISTORY_MODEL]
+
+
+def write_base_data(fixture_path, commit=None):
+    """ @brief: Writes the rows of each base fixture of \a fixture_path, without their South
+            history, to temporary plain json files for loaddata.
+        @author: Jivan
+        @since: 2014-07-02
+        @param commit: Use the bases as they were at this commit.
+        @return: [<temporary file path>, ...] in loading order, the caller removes them.
+    """
+    paths = []
+    for base_path in get_fixture_bases(fixture_path):
+        fd, tmp_path = tempfile.mkstemp(suffix='.json', prefix='fixture_tools_base_')
+        with os.fdopen(fd, 'w') as tf:
+            json.dump(_base_objects(base_path, commit), tf)
+        paths.append(tmp_path)
+    return paths
+
+
+def strip_base_rows(fixture_path, canonical=False):
+    """ @brief: Removes the rows of its base fixtures from \a fixture_path, after a dump of a
+            database the bases were loaded into.
+        @author: Jivan
+        @since: 2014-07-02
+        @param canonical: Write \a fixture_path in canonical form (@see shared.dumpdata()).
+        @return: The number of rows removed.
+    """
+    base_paths = get_fixture_bases(fixture_path)
+    if not base_paths:
+        return 0
+    base_keys = set()
+    for base_path in base_paths:
+        base_keys.update(row_key(o) for o in _base_objects(base_path))
+    objects = read_fixture(fixture_path, ordered=True)
+    kept = [o for o in objects if row_key(o) not in base_keys]
+    if canonical:
+        from django_fixture_tools.shared import get_unordered_fields
+        write_fixture_text(fixture_path,
+                           canonical_fixture_text(kept, unordered_fields=get_unordered_fields()),
+                           skip_unchanged=True)
+    else:
+        write_fixture(fixture_path, kept)
+    return len(objects) - len(kept)
+
+
+def _scan(fixture_path, reference_fields, target_fields):
+    """ @return: (<history heads>, {<row key>: <row hash>, ...},
+                  {<row hash>: [<reference>, ...], ...},
+                  {<row value key>: <row hash>, ...}) for \a fixture_path.
+            @see row_value_keys()
+    """
+    heads = {}
+    rows = {}
+    references = {}
+    values = {}
+    for o in iter_fixture_objects(fixture_path):
+        if o['model'] == HISTORY_MODEL:
+            app, migration = o['fields']['app_name'], o['fields']['migration']
+            heads[app] = max(heads.get(app, ''), migration)
+            continue
+        h = row_hash(o)
+        rows[row_key(o)] = h
+        references[h] = row_references(o, reference_fields)
+        for value_key in row_value_keys(o, target_fields):
+            values[value_key] = h
+    return (heads, rows, references, values)
+
+
+def plan_bases(fixture_paths, min_fixtures=2, min_rows=1, reference_fields=None):
+    """ @brief: Works out which rows of \a fixture_paths move to which base fixtures.
+        @author: Jivan
+        @since: 2014-07-02
+        @param min_fixtures: Rows must be in at least this many fixtures to be shared.
+        @param min_rows: Smaller sets of shared rows stay in their fixtures.
+        @return: [(<fixture paths sharing the base>, set([<row hash>, ...])), ...]
+    """
+    if reference_fields is None:
+        reference_fields = get_reference_fields()
+    target_fields = get_target_fields(reference_fields)
+    scans = dict((f, _scan(f, reference_fields, target_fields)) for f in fixture_paths)
+
+    groups = {}
+    for f, (heads, rows, references, values) in scans.items():
+        groups.setdefault(json.dumps(heads, sort_keys=True), []).append(f)
+
+    bases = []
+    for group in groups.values():
+        if len(group) < min_fixtures:
+            continue
+        # {<row hash>: frozenset([<fixture path>, ...]), ...}
+        sharing = {}
+        for f in group:
+            for h in scans[f][1].values():
+                sharing.setdefault(h, set()).add(f)
+        shared = dict((h, frozenset(fs)) for h, fs in sharing.items() if len(fs) >= min_fixtures)
+
+        # Drop rows referencing rows that won't be in the same base, until none do.
+        changed = True
+        while changed:
+            changed = False
+            for h, fixtures in list(shared.items()):
+                for f in fixtures:
+                    heads, rows, references, values = scans[f]
+                    models_present = set(model for model, pk in rows)
+                    for model, field, key, natural in references[h]:
+                        if natural:
+                            # Natural keys can't be matched to rows, they're fine only when
+                            #    the target model isn't in the fixture at all.
+                            ok = model not in models_present
+                        else:
+                            if field is None:
+                                target = rows.get((model, key))
+                            else:
+                                target = values.get((model, field, key))
+                            # Not in the fixture is fine (Ex: content types created by syncdb).
+                            ok = target is None or shared.get(target) == fixtures
+                        if not ok:
+                            break
+                    else:
+                        continue
+                    del shared[h]
+                    changed = True
+                    break
+
+        by_fixtures = {}
+        for h, fixtures in shared.items():
+            by_fixtures.setdefault(fixtures, set()).add(h)
+        for fixtures, hashes in sorted(by_fixtures.items(), key=lambda b: sorted(b[0])):
+            if len(hashes) >= min_rows:
+                bases.append((sorted(fixtures), hashes))
+    return bases
+
+
+def base_name(hashes, extension='.json'):
+    """ @return: The content addressed file name of a base fixture of the rows \a hashes, in the
+            format of fixture \a extension (@see fixture_io.FIXTURE_EXTENSIONS).
+    """
+    digest = hashlib.sha1(''.join(sorted(hashes)).encode('utf-8')).hexdigest()
+    return '{}{}'.format(digest[:16], extension)
+
+
+def dedupe_fixtures(fixture_paths, base_dir, min_fixtures=2, min_rows=1, dry_run=False):
+    """ @brief: Moves rows shared by \a fixture_paths into base fixtures in \a base_dir.
+        @author: Jivan
+        @since: 2014-07-02
+        @param dry_run: Only report what would be done.
+        @return: {'bases': <base fixtures>, 'rows': <rows moved out of fixtures>,
+                  'fixtures': <fixtures rewritten>}
+        @note: Fixtures that already have bases are left out.
+    """
+    fixture_paths = [f for f in fixture_paths if not get_fixture_bases(f)]
+    bases = plan_bases(fixture_paths, min_fixtures=min_fixtures, min_rows=min_rows)
+    # {<fixture path>: [(<base path>, set([<row hash>, ...])), ...], ...}
+    fixture_bases = {}
+    for fixtures, hashes in bases:
+        # Bases are written in the format of the fixture their rows are taken from.
+        base_path = os.path.join(base_dir,
+                                 base_name(hashes, get_fixture_extension(fixtures[0])))
+        for f in fixtures:
+            fixture_bases.setdefault(f, []).append((base_path, hashes))
+    report = {
+        'bases': len(bases),
+        'rows': sum(len(fixtures) * len(hashes) for fixtures, hashes in bases),
+        'fixtures': len(fixture_bases),
+    }
+    if dry_run:
+        return report
+
+    if not os.path.isdir(base_dir):
+        os.makedirs(base_dir)
+    for fixtures, hashes in bases:
+        base_path = os.path.join(base_dir,
+                                 base_name(hashes, get_fixture_extension(fixtures[0])))
+        if os.path.exists(base_path):
+            continue
+        # Rows keep the order of the first fixture, which loaddata was happy with, & its history.
+        objects = [o for o in iter_fixture_objects(fixtures[0], ordered=True)
+                       if o['model'] == HISTORY_MODEL or row_hash(o) in hashes]
+        logger.info('Writing base fixture {} ({} rows, {} fixtures)'.format(
+                    base_path, len(hashes), len(fixtures)))
+        write_fixture_text(base_path, json.dumps(objects, indent=4) + '\n')
+
+    for f, f_bases in fixture_bases.items():
+        moved = set()
+        for base_path, hashes in f_bases:
+            moved.update(hashes)
+        objects = [o for o in read_fixture(f, ordered=True)
+                       if o['model'] == HISTORY_MODEL or row_hash(o) not in moved]
+        write_fixture(f, objects)
+        fixture_dir = os.path.dirname(os.path.abspath(f))
+        with open(f + BASES_SUFFIX, 'w') as bf:
+            json.dump([os.path.relpath(os.path.abspath(base_path), fixture_dir)
+                           for base_path, hashes in f_bases], bf, indent=4)
+    return report
+
+
+def expand_fixture(fixture_path):
+    """ @brief: Puts the rows of its base fixtures back into \a fixture_path & removes its
+            list of bases.
+        @author: Jivan
+        @since: 2014-07-02
+    """
+    base_paths = get_fixture_bases(fixture_path)
+    if not base_paths:
+        return
+    objects = []
+    for base_path in base_paths:
+        objects.extend(_base_objects(base_path))
+    objects.extend(read_fixture(fixture_path, ordered=True))
+    write_fixture(fixture_path, objects)
+    os.remove(fixture_path + BASES_SUFFIX)
+
+
+if __name__ == '__main__':
+    from django_fixture_tools.shared import scan_filesystem_for_fixtures
+    parser = argparse.ArgumentParser(
+                description='Move rows shared by fixtures into content addressed base fixtures.')
+    parser.add_argument('-s', '--scan_path', help='path to scan for fixtures to dedupe')
+    parser.add_argument('--base-dir', default=None,
+        help='directory to write base fixtures to (default: <scan path>/{})'.format(BASE_DIRNAME))
+    parser.add_argument('--min-fixtures', type=int, default=2,
+        help='only share rows found in at least this many fixtures')
+    parser.add_argument('--min-rows', type=int, default=1,
+        help='only make base fixtures with at least this many rows')
+    parser.add_argument('--dry-run', action='store_true',
+        help="report what would be shared without changing anything")
+    parser.add_argument('--expand', metavar='FIXTURE',
+        help='put the rows of its base fixtures back into FIXTURE')
+    args = parser.parse_args()
+
+    if args.expand:
+        expand_fixture(args.expand)
+    elif args.scan_path:
+        base_dir = args.base_dir or os.path.join(args.scan_path, BASE_DIRNAME)
+        fs = scan_filesystem_for_fixtures(args.scan_path, exclude_dirs=['build', 'sandbox'])
+        # Base fixtures from earlier runs aren't deduped again.
+        fs = [f for f in fs if not os.path.abspath(f).startswith(os.path.abspath(base_dir) + os.sep)]
+        report = dedupe_fixtures(fs, base_dir, min_fixtures=args.min_fixtures,
+                                 min_rows=args.min_rows, dry_run=args.dry_run)
+        print('{bases} base fixtures, {rows} rows moved out of {fixtures} fixtures'.format(**report))
+    else:
+        parser.print_usage()
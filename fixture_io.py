@@ -0,0 +1,306 @@
+"""
+@since: 2014-06-05
+@author: Jivan
+@brief: Reading & writing fixture files in each of the formats the fixture tools support.
+    Formats are plain json ('.json', what dumpdata produces) and JSON-Lines ('.jsonl', one
+    object per line), each of which may be compressed with gzip ('.gz') or xz ('.xz').
+    Ex: 'restaurants.json', 'restaurants.jsonl.gz', 'restaurants.json.xz'
+"""
+import argparse
+import gzip
+import hashlib
+from io import BytesIO
+import numbers
+import os
+import tempfile
+
+import simplejson as json
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+
+FIXTURE_FORMATS = ('json', 'jsonl')
+COMPRESSIONS = ('gz', 'xz')
+FIXTURE_EXTENSIONS = tuple(
+    '.{}{}'.format(fmt, '.{}'.format(comp) if comp else '')
+        for fmt in FIXTURE_FORMATS for comp in (None,) + COMPRESSIONS
+)
+
+
+def is_fixture_filename(filename):
+    """ @brief: True if \a filename has one of the extensions in FIXTURE_EXTENSIONS.
+        @author: Jivan
+        @since: 2014-06-05
+    """
+    return filename.endswith(FIXTURE_EXTENSIONS)
+
+
+def get_fixture_format(fixture_path):
+    """ @brief: Identifies the format of the fixture at \a fixture_path from its extension.
+        @author: Jivan
+        @since: 2014-06-05
+        @return: (<format>, <compression>) Ex: ('jsonl', 'gz'), ('json', None)
+    """
+    name = os.path.basename(fixture_path)
+    compression = None
+    base, ext = os.path.splitext(name)
+    if ext[1:] in COMPRESSIONS:
+        compression = ext[1:]
+        base, ext = os.path.splitext(base)
+    fmt = ext[1:]
+    if fmt not in FIXTURE_FORMATS:
+        raise ValueError('Unrecognized fixture format: {}'.format(fixture_path))
+    return (fmt, compression)
+
+
+def get_fixture_extension(fixture_path):
+    """ @brief: Returns the extension of the fixture at \a fixture_path.
+        @author: Jivan
+        @since: 2014-07-02
+        @return: One of FIXTURE_EXTENSIONS, Ex: '.jsonl.gz', '.json'
+    """
+    fmt, compression = get_fixture_format(fixture_path)
+    return '.{}{}'.format(fmt, '.{}'.format(compression) if compression else '')
+
+
+def open_fixture(fixture_path, mode='r'):
+    """ @brief: Opens \a fixture_path for reading or writing, (de)compressing as needed.
+        @author: Jivan
+        @since: 2014-06-05
+        @param mode: 'r' or 'w'
+    """
+    fmt, compression = get_fixture_format(fixture_path)
+    if compression == 'gz':
+        f = gzip.open(fixture_path, mode + 'b')
+    elif compression == 'xz':
+        if lzma is None:
+            raise Exception('xz-compressed fixtures need the lzma module '\
+                            '(pip install backports.lzma): {}'.format(fixture_path))
+        f = lzma.open(fixture_path, mode + 'b')
+    else:
+        f = open(fixture_path, mode)
+    return f
+
+
+def iter_fixture_objects(fixture_path, contains=None, ordered=False):
+    """ @brief: Yields the objects in the fixture at \a fixture_path one at a time.
+        @author: Jivan
+        @since: 2014-06-05
+        @param contains: If given, JSON-Lines fixtures skip parsing lines that don't contain
+            this string.  This is an optimization only, plain json fixtures ignore it so
+            callers must still check the objects they get back.
+        @param ordered: If True, objects are OrderedDicts keeping the key order of the file.
+        @note: JSON-Lines fixtures are streamed, plain json fixtures are parsed in one go.
+    """
+    fmt, compression = get_fixture_format(fixture_path)
+    hook = json.OrderedDict if ordered else None
+    with open_fixture(fixture_path) as ff:
+        if fmt == 'jsonl':
+            for line in ff:
+                if contains is not None and contains not in line:
+                    continue
+                line = line.strip()
+                if line:
+                    yield json.loads(line, object_pairs_hook=hook)
+        else:
+            for obj in json.load(ff, object_pairs_hook=hook):
+                yield obj
+
+
+def read_fixture(fixture_path, ordered=False):
+    """ @brief: Returns a list of the objects in the fixture at \a fixture_path.
+        @author: Jivan
+        @since: 2014-06-05
+    """
+    return list(iter_fixture_objects(fixture_path, ordered=ordered))
+
+
+def parse_fixture_data(data, fixture_path, ordered=False):
+    """ @brief: Returns a list of the objects in \a data, the raw contents of a fixture file
+            named \a fixture_path (Ex: as read from git).
+        @author: Jivan
+        @since: 2014-06-20
+    """
+    fmt, compression = get_fixture_format(fixture_path)
+    if compression == 'gz':
+        data = gzip.GzipFile(fileobj=BytesIO(data)).read()
+    elif compression == 'xz':
+        if lzma is None:
+            raise Exception('xz-compressed fixtures need the lzma module '\
+                            '(pip install backports.lzma): {}'.format(fixture_path))
+        data = lzma.decompress(data)
+    if not isinstance(data, str):
+        data = data.decode('utf-8')
+    hook = json.OrderedDict if ordered else None
+    if fmt == 'jsonl':
+        return [json.loads(line, object_pairs_hook=hook)
+                    for line in data.split('\n') if line.strip()]
+    return json.loads(data, object_pairs_hook=hook)
+
+
+def read_fixture_text(fixture_path):
+    """ @brief: Returns the (decompressed) contents of the fixture at \a fixture_path.
+        @author: Jivan
+        @since: 2014-06-05
+    """
+    with open_fixture(fixture_path) as ff:
+        return ff.read()
+
+
+def format_fixture_text(json_text, fmt):
+    """ @brief: Converts \a json_text, the plain json produced by dumpdata, to format \a fmt.
+        @author: Jivan
+        @since: 2014-06-05
+    """
+    if fmt == 'json':
+        text = json_text
+    elif fmt == 'jsonl':
+        objects = json.loads(json_text, object_pairs_hook=json.OrderedDict)
+        text = ''.join('{}\n'.format(json.dumps(o)) for o in objects)
+    else:
+        raise ValueError('Unrecognized fixture format: {}'.format(fmt))
+    return text
+
+
+def write_fixture_text(fixture_path, json_text, skip_unchanged=False):
+    """ @brief: Writes \a json_text, the plain json produced by dumpdata, to \a fixture_path
+            in the format indicated by its extension.
+        @author: Jivan
+        @since: 2014-06-05
+        @param skip_unchanged: If True and the existing (decompressed) contents of
+            \a fixture_path hash the same as the new contents, the file isn't rewritten.
+        @return: True if \a fixture_path was written, False if it was skipped.
+    """
+    fmt, compression = get_fixture_format(fixture_path)
+    text = format_fixture_text(json_text, fmt)
+    if skip_unchanged and os.path.exists(fixture_path):
+        if content_hash(read_fixture_text(fixture_path)) == content_hash(text):
+            return False
+    with open_fixture(fixture_path, 'w') as ff:
+        ff.write(text)
+    return True
+
+
+def write_fixture(fixture_path, objects):
+    """ @brief: Writes \a objects to \a fixture_path in the format indicated by its extension.
+        @author: Jivan
+        @since: 2014-06-05
+        @note: Plain json is written with indent=4 to match dumpdata's output.
+    """
+    fmt, compression = get_fixture_format(fixture_path)
+    with open_fixture(fixture_path, 'w') as ff:
+        if fmt == 'jsonl':
+            for o in objects:
+                ff.write('{}\n'.format(json.dumps(o)))
+        else:
+            ff.write(json.dumps(list(objects), indent=4))
+            ff.write('\n')
+
+
+def content_hash(text):
+    """ @brief: Returns a hex digest identifying the fixture contents \a text.
+        @author: Jivan
+        @since: 2014-06-06
+    """
+    if not isinstance(text, bytes):
+        text = text.encode('utf-8')
+    return hashlib.sha1(text).hexdigest()
+
+
+def fixture_file_hash(fixture_path):
+    """ @brief: Returns a hex digest of the file at \a fixture_path as stored on disk.
+        @author: Jivan
+        @since: 2014-06-06
+        @note: This is the cheap check for 'has this file changed', compressed fixtures aren't
+            decompressed.
+    """
+    sha = hashlib.sha1()
+    with open(fixture_path, 'rb') as ff:
+        for chunk in iter(lambda: ff.read(1 << 16), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _pk_sort_key(pk):
+    # Integer pks sort numerically, anything else (strings, natural keys) by its json.
+    if isinstance(pk, numbers.Integral):
+        return (0, pk, '')
+    return (1, 0, json.dumps(pk, sort_keys=True))
+
+
+def canonicalize_fixture_objects(objects, unordered_fields=None):
+    """ @brief: Returns \a objects in a canonical order so equal data always dumps the same.
+        @author: Jivan
+        @since: 2014-06-06
+        @param unordered_fields: {<model label>: <set of field names>, ...} of list-valued fields
+            whose order is meaningless (many-to-many fields), these lists are sorted.
+        @note: Models keep the order of their first appearance in \a objects.  dumpdata orders
+            models so natural key dependencies are loaded first, and that order is already
+            stable for a given set of models.  Objects are sorted by pk within each model.
+    """
+    unordered_fields = unordered_fields or {}
+    model_order = {}
+    for o in objects:
+        model_order.setdefault(o['model'], len(model_order))
+
+    for o in objects:
+        for field_name in unordered_fields.get(o['model'], ()):
+            value = o['fields'].get(field_name)
+            if isinstance(value, list):
+                o['fields'][field_name] = sorted(value, key=_pk_sort_key)
+
+    return sorted(objects, key=lambda o: (model_order[o['model']], _pk_sort_key(o.get('pk'))))
+
+
+def canonical_fixture_text(objects, unordered_fields=None):
+    """ @brief: Returns plain json for \a objects with canonical object order & sorted keys.
+        @author: Jivan
+        @since: 2014-06-06
+    """
+    objects = canonicalize_fixture_objects(objects, unordered_fields=unordered_fields)
+    return json.dumps(objects, indent=4, sort_keys=True, separators=(',', ': ')) + '\n'
+
+
+def as_plain_json(fixture_path):
+    """ @brief: Returns the path of a plain json copy of \a fixture_path suitable for loaddata.
+        @author: Jivan
+        @since: 2014-06-05
+        @return: (<path>, <is_temporary>)  If is_temporary the caller should remove <path>
+            when finished with it.
+    """
+    fmt, compression = get_fixture_format(fixture_path)
+    if fmt == 'json' and compression is None:
+        return (fixture_path, False)
+
+    fd, tmp_path = tempfile.mkstemp(suffix='.json', prefix='fixture_tools_')
+    with os.fdopen(fd, 'w') as tf:
+        if fmt == 'json':
+            tf.write(read_fixture_text(fixture_path))
+        else:
+            json.dump(list(iter_fixture_objects(fixture_path)), tf)
+    return (tmp_path, True)
+
+
+def convert_fixture(src_path, dest_path):
+    """ @brief: Rewrites the fixture at \a src_path to \a dest_path, converting between the
+            formats indicated by their extensions.
+        @author: Jivan
+        @since: 2014-06-05
+    """
+    write_fixture(dest_path, iter_fixture_objects(src_path))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                description='Convert a fixture between the supported fixture formats ({}).'\
+                            .format(', '.join(FIXTURE_EXTENSIONS)))
+    parser.add_argument('src', help='fixture to convert')
+    parser.add_argument('dest', help='path to write the converted fixture to')
+    args = parser.parse_args()
+    convert_fixture(args.src, args.dest)
@@ -27,7 +27,8 @@ import django.db
 from django.db.models.fields.related import ManyToOneRel, OneToOneRel, \
     ManyToManyRel
 
-from django_fixture_tools.shared import reset_db, dumpdata, fake_migrations, sync_all
+from django_fixture_tools.shared import dumpdata
+from django_fixture_tools.scratch_db import prepare_scratch_db
 
 
 logfilename = 'make_fixture.log'
@@ -292,11 +293,7 @@ def db_sample(db_obj_iterable, skip_south_history=False, child_depth=1, dest_db_
 
     # Make an empty database with schema reflecting current code.
     if show_progress: print("Emptying destination database '{}'".format(dest_db_alias))
-    django.db.close_connection()
-    reset_db(database=dest_db_alias)
-    sync_all(database=dest_db_alias)
-    if not skip_south_history:
-        fake_migrations(database=dest_db_alias)
+    prepare_scratch_db(dest_db_alias, fake_history=not skip_south_history)
     if show_progress: print("Destination database emptied, sampling objects.")
 
     # Copy requested objects from default db to fixture db.
@@ -0,0 +1,248 @@
+"""
+@since: 2014-07-04
+@author: Jivan
+@brief: Prunes a fixture down to the rows reachable from a set of root rows, dropping the rows
+    nothing needs any more without loading it into a database.
+    Reachability follows the sampler's notions (@see db_sampler_script): the rows a kept row
+    references (foreign keys & parent models) are dependencies and always kept.  Rows
+    referencing a root (foreign keys, one-to-one & child models) and a root's many-to-many
+    rows are its children, kept down to child_depth levels, along with their dependencies.
+    Many-to-many lists of kept rows are cut down to the rows kept.
+    The fixture is read twice: once to build the graph of references between rows (row keys
+    only, not the rows themselves) and pick out the roots, once to write the rows kept.
+    References by natural key can't be matched to rows, so every row of their model is kept.
+    The South migration history is always kept.
+
+Usage:
+    python prune_fixture.py -p <fixture path> -r <root> [-r <root> ...] [-o <output path>]
+    A root is <app_label>.<model>:<pk>, <app_label>.<model>:<field>=<value>[,<field>=<value>...]
+    or just <app_label>.<model> for all its rows.  Values are compared as json where they
+    parse as json (Ex: 233, true), as strings otherwise.
+    Run with DJANGO_SETTINGS_MODULE=django_fixture_tools.settings_maker, relations are read
+    from the project's models.
+"""
+import argparse
+import logging
+import os
+
+import simplejson as json
+
+from django_fixture_tools.fixture_io import iter_fixture_objects, write_fixture,\
+    FIXTURE_EXTENSIONS
+from django_fixture_tools.fixture_dedupe import get_reference_fields, get_target_fields, row_key,\
+    row_value_keys, HISTORY_MODEL
+
+
+logger = logging.getLogger(__name__)
+sh = logging.StreamHandler()
+logger.addHandler(sh)
+logger.setLevel(logging.DEBUG)
+
+
+def _parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def parse_root(spec):
+    """ @brief: Parses the root row spec \a spec, @see the module's usage.
+        @author: Jivan
+        @since: 2014-07-04
+        @return: (<model label>, {<field or 'pk'>: (<value>, <text>), ...})
+    """
+    label, _, selector = spec.partition(':')
+    filters = {}
+    if selector and '=' not in selector:
+        filters['pk'] = (_parse_value(selector), selector)
+    elif selector:
+        for condition in selector.split(','):
+            field, _, text = condition.partition('=')
+            filters[field.strip()] = (_parse_value(text), text)
+    return (label.lower(), filters)
+
+
+def matches_root(obj, root):
+    """ @return: True if fixture object \a obj is one of the rows of \a root (@see parse_root()).
+    """
+    label, filters = root
+    if obj['model'] != label:
+        return False
+    for field, (value, text) in filters.items():
+        actual = obj.get('pk') if field == 'pk' else obj['fields'].get(field)
+        if actual != value and actual != text:
+            return False
+    return True
+
+
+def build_graph(fixture_path, roots, reference_fields):
+    """ @brief: First pass, reads the references between the rows of \a fixture_path.
+        @author: Jivan
+        @since: 2014-07-04
+        @return: {'rows': <number of rows>,
+                  'roots': set([<row key of a root>, ...]),
+                  'dependencies': {<row key>: [<referenced row key>, ...], ...},
+                  'children': {<row key>: [<child row key>, ...], ...},
+                  'by_model': {<model label>: [<row key>, ...], ...},
+                  'natural_models': set([<model referenced by natural key>, ...])}
+    """
+    graph = {'rows': 0, 'roots': set(), 'dependencies': {}, 'children': {}, 'by_model': {},
+             'natural_models': set()}
+    target_fields = get_target_fields(reference_fields)
+    # {(<model label>, <field>, <value>): <row key>, ...} for references with a to_field.
+    values = {}
+    # [(<row key>, (<model label>, <field>, <value>), <is many-to-many>), ...]  Resolved to row
+    #    keys once every row has been read.
+    value_references = []
+
+    def add_reference(key, target_key, many):
+        if many:
+            # The other side of a many-to-many relation is a child.
+            graph['children'].setdefault(key, []).append(target_key)
+        else:
+            graph['dependencies'].setdefault(key, []).append(target_key)
+            graph['children'].setdefault(target_key, []).append(key)
+
+    for obj in iter_fixture_objects(fixture_path):
+        graph['rows'] += 1
+        key = row_key(obj)
+        graph['by_model'].setdefault(obj['model'], []).append(key)
+        if any(matches_root(obj, root) for root in roots):
+            graph['roots'].add(key)
+        for value_key in row_value_keys(obj, target_fields):
+            values[value_key] = key
+
+        fields, parents = reference_fields.get(obj['model'], ({}, []))
+        for parent in parents:
+            add_reference(key, (parent, key[1]), False)
+        for name, (target, many, target_field) in fields.items():
+            value = obj['fields'].get(name)
+            if value is None:
+                continue
+            for v in (value if many else [value]):
+                if isinstance(v, list):
+                    graph['natural_models'].add(target)
+                elif target_field is not None:
+                    value_references.append((key, (target, target_field, v), many))
+                else:
+                    add_reference(key, (target, v), many)
+
+    for key, value_key, many in value_references:
+        # Rows not in the fixture are left to the database, @see reachable_rows()
+        if value_key in values:
+            add_reference(key, values[value_key], many)
+    return graph
+
+
+def reachable_rows(graph, child_depth=1, keep_models=(HISTORY_MODEL,)):
+    """ @brief: Returns the keys of the rows reachable from the roots of \a graph.
+        @author: Jivan
+        @since: 2014-07-04
+        @param graph: @see build_graph()
+        @param child_depth: Levels of children of the roots to keep, 0 for none.
+        @param keep_models: Models whose rows are all kept.
+    """
+    selected = set(graph['roots'])
+    frontier = list(graph['roots'])
+    for depth in range(child_depth):
+        children = []
+        for key in frontier:
+            for child in graph['children'].get(key, []):
+                if child not in selected:
+                    selected.add(child)
+                    children.append(child)
+        frontier = children
+    for model in set(keep_models) | graph['natural_models']:
+        selected.update(graph['by_model'].get(model, []))
+
+    # Dependencies of the rows selected, & of their dependencies.
+    present = set()
+    for keys in graph['by_model'].values():
+        present.update(keys)
+    kept = set()
+    stack = [key for key in selected if key in present]
+    while stack:
+        key = stack.pop()
+        if key in kept:
+            continue
+        kept.add(key)
+        # References to rows not in the fixture (Ex: content types created by syncdb) are
+        #    left to the database.
+        stack.extend(d for d in graph['dependencies'].get(key, []) if d in present)
+    return kept
+
+
+def _pruned_objects(fixture_path, kept, reference_fields):
+    """ @brief: Second pass, yields the rows of \a fixture_path in \a kept, with their
+            many-to-many lists cut down to rows in \a kept.
+    """
+    for obj in iter_fixture_objects(fixture_path, ordered=True):
+        if row_key(obj) not in kept:
+            continue
+        fields, parents = reference_fields.get(obj['model'], ({}, []))
+        # Many-to-many relations reference pks.
+        for name, (target, many, target_field) in fields.items():
+            if many and obj['fields'].get(name):
+                obj['fields'][name] = [v for v in obj['fields'][name]
+                                           if isinstance(v, list) or (target, v) in kept]
+        yield obj
+
+
+def prune_fixture(fixture_path, roots, output_path=None, child_depth=1,
+                  keep_models=(HISTORY_MODEL,), reference_fields=None):
+    """ @brief: Writes the rows of \a fixture_path reachable from \a roots to \a output_path.
+        @author: Jivan
+        @since: 2014-07-04
+        @param roots: Root row specs, @see parse_root()
+        @param output_path: Defaults to replacing \a fixture_path.  Its extension picks the
+            format written (@see fixture_io).
+        @param child_depth: @see reachable_rows()
+        @return: {'rows': <rows read>, 'roots': <root rows>, 'kept': <rows written>}
+    """
+    if reference_fields is None:
+        reference_fields = get_reference_fields()
+    output_path = output_path or fixture_path
+    roots = [parse_root(r) for r in roots]
+
+    graph = build_graph(fixture_path, roots, reference_fields)
+    if not graph['roots']:
+        raise Exception('No rows of {} match the roots: {}'.format(
+                        fixture_path, ', '.join(label for label, filters in roots)))
+    kept = reachable_rows(graph, child_depth=child_depth, keep_models=keep_models)
+
+    # Written beside the output first, the fixture is still being read.
+    extension = [e for e in FIXTURE_EXTENSIONS if output_path.endswith(e)][-1]
+    tmp_path = '{}.{}.tmp{}'.format(output_path[:-len(extension)], os.getpid(), extension)
+    try:
+        write_fixture(tmp_path, _pruned_objects(fixture_path, kept, reference_fields))
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.rename(tmp_path, output_path)
+
+    report = {'rows': graph['rows'], 'roots': len(graph['roots']), 'kept': len(kept)}
+    logger.info('{}: kept {kept} of {rows} rows reachable from {roots} roots'.format(
+                output_path, **report))
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                description='Prune a fixture to the rows reachable from root rows.')
+    parser.add_argument('-p', '--fixture_path', required=True,
+        help='path to fixture to prune')
+    parser.add_argument('-r', '--root', dest='roots', action='append', required=True,
+        help='root rows: <app_label>.<model>[:<pk> | :<field>=<value>[,...]], may be repeated')
+    parser.add_argument('-o', '--output', default=None,
+        help='write the pruned fixture here instead of replacing the fixture')
+    parser.add_argument('--child-depth', type=int, default=1,
+        help='levels of rows referencing the roots to keep (default 1, 0 for none)')
+    parser.add_argument('--keep-model', dest='keep_models', action='append',
+        default=[HISTORY_MODEL],
+        help='keep every row of this model (default {}), may be repeated'.format(HISTORY_MODEL))
+    args = parser.parse_args()
+
+    prune_fixture(args.fixture_path, args.roots, output_path=args.output,
+                  child_depth=args.child_depth, keep_models=args.keep_models)
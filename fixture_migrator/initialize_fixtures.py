@@ -15,7 +15,14 @@ import django.db
 from south.models import MigrationHistory
 
 from django_fixture_tools.shared import scan_filesystem_for_fixtures, \
-    get_latest_fixture_migrations, reset_db, sync_all, load_fixture, migrate_and_dump
+    get_latest_fixture_migrations, load_fixture, migrate_and_dump
+from django_fixture_tools.scratch_db import prepare_scratch_db
+from django_fixture_tools.fixture_io import fixture_file_hash
+from django_fixture_tools.fixture_dedupe import strip_base_rows
+from django_fixture_tools.fixture_validator import find_invalid_fixtures
+from django_fixture_tools.fixture_migrator.planner import FixtureHeadsIndex
+from django_fixture_tools.journal import RunJournal, PLANNED, LOADED, DUMPED, DONE, FAILED
+from django_fixture_tools.tracing import get_tracer, span, write_trace, FIXTURE_SPAN
 
 
 logger = logging.getLogger(__name__)
@@ -25,11 +32,20 @@ logger.setLevel(logging.DEBUG)
 
 
 def initialize_all_fixtures(path, exclude_dirs=[], skip_fixtures=[],
-                            database='fixture_tools_db', debug=False, force=False):
-    """ @brief: Peforms initialize_fixture() on all json fixtures beneath \a path.
+                            database='fixture_tools_db', debug=False, force=False,
+                            canonical=False, resume=False, validate=False):
+    """ @brief: Peforms initialize_fixture() on all fixtures beneath \a path.
         @author: Jivan
         @since: 2014-05-23
-        @note: Fixtures are files ending in .json in a directory with name containing 'fixture'.
+        @note: Fixtures are files ending in .json (or .jsonl, optionally gzip/xz compressed) in
+            a directory with name containing 'fixture'.
+        @param resume: Carry on from the journal of the last run over \a path, skipping
+            fixtures it initialized.  @see journal.RunJournal
+        @param validate: Check the references of the fixtures to be loaded first & fail those
+            with missing references without loading them, @see fixture_validator
+            Fixtures are loaded with the models on disk, which they're checked against.
+        @note: A fixture that fails with an exception is reported as failed & the run carries
+            on with the next one.
     """
     fs = scan_filesystem_for_fixtures(
              path, exclude_dirs=exclude_dirs, exclude_fixtures=skip_fixtures)
@@ -37,26 +53,59 @@ def initialize_all_fixtures(path, exclude_dirs=[], skip_fixtures=[],
     successful_fixtures = []
     failed_fixtures = []
     skipped_fixtures = []
+    journal = RunJournal('initialize', path, resume=resume)
+    invalid = set()
+    if validate:
+        # Fixtures with history are left alone unless forced, @see initialize_fixture()
+        index = FixtureHeadsIndex()
+        to_load = [f for f in fs if f not in skip_fixtures and
+                       not (resume and journal.is_finished(f)) and (force or not index.heads(f))]
+        index.save()
+        if to_load:
+            invalid = find_invalid_fixtures(to_load)
     for f in fs:
         if f in skip_fixtures:
             skipped_fixtures.append(f)
             logger.info('{}: skipped'.format(f))
             continue
+        if resume and journal.is_finished(f):
+            logger.info('{}: initialized by an earlier run'.format(f))
+            successful_fixtures.append(f)
+            continue
+        if f in invalid:
+            logger.info('{}: missing references, not initialized'.format(f))
+            journal.record(f, FAILED)
+            failed_fixtures.append(f)
+            continue
         logger.info('{}: initializing'.format(f))
-        success = initialize_fixture(f, force=force)
-        if success: successful_fixtures.append(f)
-        else: failed_fixtures.append(f)
+        try:
+            with span(FIXTURE_SPAN, fixture=f):
+                success = initialize_fixture(f, force=force, canonical=canonical,
+                                             journal=journal)
+        except Exception as ex:
+            logger.error('{}: failed to initialize:\n{}'.format(f, ex))
+            success = False
+        if success:
+            journal.record(f, DONE, file_hash=fixture_file_hash(f))
+            successful_fixtures.append(f)
+        else:
+            journal.record(f, FAILED)
+            failed_fixtures.append(f)
 
+    journal.close()
     return (successful_fixtures, failed_fixtures, skip_fixtures)
 
 
-def initialize_fixture(fixture_path, database='fixture_tools_db', debug=False, force=False):
+def initialize_fixture(fixture_path, database='fixture_tools_db', debug=False, force=False,
+                       canonical=False, journal=None):
     """ @brief: Adds up-to-date South migration history to the fixture at \a fixture_path.
         @author: Jivan
         @since: 2014-05-23
         @param force: If True, existing South migration history in the fixture will be ignored.
             If False, fixtures with South migration history will result in a warning and
             remain unchanged.
+        @param canonical: Dump \a fixture_path in canonical form (@see shared.dumpdata()).
+        @param journal: journal.RunJournal to record the fixture's progress in.
     """
     fms = get_latest_fixture_migrations(fixture_path)
     # If there is migration history in the fixture, and we're not forcing an overwrite.
@@ -67,17 +116,23 @@ def initialize_fixture(fixture_path, database='fixture_tools_db', debug=False, f
         logger.warning(msg)
         ret = False
     else:
-        django.db.close_connection()
-        reset_db(database=database, debug=debug)
-        sync_all(database=database, debug=debug)
+        if journal:
+            journal.record(fixture_path, PLANNED, file_hash=fixture_file_hash(fixture_path))
+        prepare_scratch_db(database, debug=debug)
         load_fixture(fixture_path, database=database)
+        if journal:
+            journal.record(fixture_path, LOADED)
 
         # If there is migration history history & we're forcing an overwrite
         if len(fms) > 0 and force:
             # Scrap the migration history from the fixture
             MigrationHistory.objects.all().delete()
     
-        migrate_and_dump(fixture_path, database=database, fake=True)
+        migrate_and_dump(fixture_path, database=database, fake=True, canonical=canonical)
+        # The dump includes the rows of any base fixtures loaded with it.
+        strip_base_rows(fixture_path, canonical=canonical)
+        if journal:
+            journal.record(fixture_path, DUMPED, file_hash=fixture_file_hash(fixture_path))
         ret = True
 
     return ret
@@ -92,7 +147,19 @@ if __name__ == '__main__':
     parser.add_argument('-d', '--debug', type=bool, default=False, help='Turn on debugging features')
     parser.add_argument('-f', '--force', action='store_true',
         help='Ignore South migraton history in fixture(s).')
+    parser.add_argument('-C', '--canonical', action='store_true',
+        help='Dump fixtures in canonical (stable) order, leaving unchanged fixtures untouched')
+    parser.add_argument('--resume', action='store_true',
+        help='When scanning, carry on from where the last run over the same path stopped')
+    parser.add_argument('--validate', action='store_true',
+        help="When scanning, check the fixtures' references before initializing them & fail "\
+             "those that are missing rows")
+    parser.add_argument('--trace', default=None, metavar='PATH',
+        help='Time each phase of the run, write the trace to PATH in Chrome trace event format '\
+             '(& as plain json beside it) and print a summary of the slowest fixtures & phases')
     args = parser.parse_args()
+    if args.trace:
+        get_tracer().enabled = True
     
     if args.scan_path and args.fixture_path:
         parser.print_usage()
@@ -100,7 +167,7 @@ if __name__ == '__main__':
     elif args.fixture_path:
         fixture_path = args.fixture_path[0]
         force = args.force
-        initialize_fixture(fixture_path, force=force, debug=args.debug)
+        initialize_fixture(fixture_path, force=force, debug=args.debug, canonical=args.canonical)
     elif args.scan_path:
         scan_path = args.scan_path[0]
         force = args.force
@@ -108,8 +175,15 @@ if __name__ == '__main__':
         exclude_dirs = ['build', 'sandbox']
         success, fail, skip = initialize_all_fixtures(scan_path, force=force, debug=args.debug,
                                                       exclude_dirs=exclude_dirs,
-                                                      skip_fixtures=skip_fixtures)
+                                                      skip_fixtures=skip_fixtures,
+                                                      canonical=args.canonical,
+                                                      resume=args.resume,
+                                                      validate=args.validate)
         print('Successful: \n{}\n'\
               'Skipped: \n{}\n'\
               'Failed: \n{}'.format('\n'.join(success), '\n'.join(skip), '\n'.join(fail))
         )
+
+    if args.trace:
+        write_trace(args.trace)
+        print(get_tracer().summary())
@@ -2,23 +2,39 @@
 @since: 2014-05-07
 @author: Jivan
 @brief: Script to combine fixture data migration & dumping the data back to the fixture file.
-    This is a workaround because django's model cache gets confused by the git checkouts and
-    the dumpdata command needs to be executed in a fresh django process untouched by the evil
-    hacks to the cache done by the migration process.
-@todo: Make sure the current git workspace is clean before attempting to switch commits.
+    Fixtures are loaded with the models of an old commit by a process forked from a zygote
+    running in a git worktree of that commit (@see git_worktrees), then migrated & dumped by a
+    process forked from a zygote running the current code (@see worker_pool).  The working tree
+    is never checked out to another commit.
 """
 import argparse
 import logging
-from subprocess import check_output
+import os
 import sys
+import threading
+
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
 
 import django.db
 from south.models import MigrationHistory
 
-from django_fixture_tools.shared import query_yes_no, identify_and_check_out_last_modified_commit,\
-    check_out_branch, create_compatible_db, load_fixture, fake_migrations,\
+from django_fixture_tools.shared import query_yes_no, create_compatible_db, fake_migrations,\
     get_latest_fixture_migrations, reset_db, sync_all, migrate_and_dump,\
-    scan_filesystem_for_fixtures, clear_south_migration_caches, git_commit_all
+    scan_filesystem_for_fixtures, git_commit_all, git_commit_file, get_last_modified_commit
+from django_fixture_tools.fixture_io import fixture_file_hash
+from django_fixture_tools.fixture_dedupe import write_base_data, strip_base_rows
+from django_fixture_tools.fixture_migrator.planner import plan_fixture, plan_fixtures,\
+    describe_plan, get_affected_apps, FixtureHeadsIndex, UP_TO_DATE, UNINITIALISED
+from django_fixture_tools.fixture_migrator.schema_only import migrate_fixture_json,\
+    record_migrations
+from django_fixture_tools.git_history import order_commits, git_output
+from django_fixture_tools.journal import RunJournal, PLANNED, LOADED, MIGRATED, DUMPED,\
+    COMMITTED, DONE, FAILED
+from django_fixture_tools.tracing import get_tracer, span, write_trace, FIXTURE_SPAN
+from django_fixture_tools.worker_pool import get_worker_pool, commit_zygote
 
 
 logger = logging.getLogger(__name__)
@@ -28,15 +44,36 @@ logger.setLevel(logging.DEBUG)
 
 
 def migrate_all_fixtures(scan_path, load_commit=None, exclude_dirs=[], skip_fixtures=[],
-                            database='fixture_tools_db', debug=False):
-    """ @brief: Peforms migrate_fixture() on all json fixtures beneath \a path.
+                            database='fixture_tools_db', debug=False, canonical=False,
+                            fast_path=True, jobs=1, since=None, bump_history=True,
+                            resume=False, compile_fixtures=False, validate=False):
+    """ @brief: Peforms migrate_fixture() on all fixtures beneath \a path.
         @author: Jivan
         @since: 2014-05-23
-        @note: Fixtures are files ending in .json in a directory with name containing 'fixture'.
+        @note: Fixtures are files ending in .json (or .jsonl, optionally gzip/xz compressed) in
+            a directory with name containing 'fixture'.
         @param exclude_dirs: Don't search for fixtures in these directories.  Directories
             should be expressed relative to \a path.
         @param skip_fixtures: Don't process these fixtures.  Fixtures should be expressed with
             the full path from \a path.
+        @param canonical: Dump fixtures in canonical form (@see shared.dumpdata()).
+        @param fast_path: @see migrate_fixture()
+        @param jobs: Number of fixtures to migrate at once, @see migrate_groups_in_parallel()
+        @param since: If given, only fixtures with data for apps that gained migrations since
+            this commit are migrated.  Other fixtures are left alone, except that if
+            \a bump_history their South history is brought up to date for the apps that did
+            gain migrations (@see schema_only.record_migrations()).
+        @param resume: Carry on from the journal of the last run over \a scan_path, skipping
+            fixtures it finished & committing fixtures it wrote but didn't commit.
+            @see journal.RunJournal
+        @param compile_fixtures: @see migrate_fixture_group()
+        @param validate: @see migrate_fixture_group()
+        @note: Fixtures needing a database are grouped by the commit they're loaded at, so each
+            commit's worktree is used while it's cached and its schema built once.
+            @see migrate_fixture_group()
+        @note: Fixtures whose contents didn't change are counted as successful but not committed.
+        @note: Fixtures already up to date with the codebase's migrations are counted as
+            successful without being loaded, @see planner.plan_fixtures()
     """
     fs = scan_filesystem_for_fixtures(
              scan_path, exclude_dirs=exclude_dirs, exclude_fixtures=skip_fixtures)
@@ -44,72 +81,375 @@ def migrate_all_fixtures(scan_path, load_commit=None, exclude_dirs=[], skip_fixt
     successful_fixtures = []
     failed_fixtures = []
     skipped_fixtures = []
+    original_hashes = {}
+    needs_database = []
+    journal = RunJournal('migrate', scan_path, resume=resume)
+    index = FixtureHeadsIndex()
+    with span('plan_fixtures', fixtures=len(fs)):
+        plan = plan_fixtures([f for f in fs if f not in skip_fixtures], index=index)
+    if since is not None:
+        affected_apps = get_affected_apps(since)
+        logger.info('Apps with migrations since {}: {}'.format(
+                    since[:8], ', '.join(sorted(affected_apps)) or 'none'))
     for f in fs:
         if f in skip_fixtures:
             skipped_fixtures.append(f)
             logger.info('{}: skipped'.format(f))
             continue
-        logger.info('{}: migrating'.format(f))
-        success = migrate_fixture(f, load_commit=load_commit, database=database, debug=debug)
-        if success:
+        if resume:
+            if journal.is_finished(f):
+                logger.info('{}: finished by an earlier run'.format(f))
+                successful_fixtures.append(f)
+                continue
+            original_hash = journal.written_from(f)
+            if original_hash is not None:
+                logger.info('{}: migrated by an earlier run, not yet committed'.format(f))
+                original_hashes[f] = original_hash
+                successful_fixtures.append(f)
+                continue
+        status, pending = plan[f]
+        if status == UNINITIALISED:
+            logger.info('{}: no South migration history, initialize it first'.format(f))
+            failed_fixtures.append(f)
+            continue
+        elif status == UP_TO_DATE:
+            logger.info('{}: up to date'.format(f))
             successful_fixtures.append(f)
+            continue
+        original_hashes[f] = fixture_file_hash(f)
+        journal.record(f, PLANNED, file_hash=original_hashes[f])
+        with span(FIXTURE_SPAN, fixture=f):
+            if since is not None and not (index.apps(f) & affected_apps):
+                affected_pending = [m for m in pending if m[0] in affected_apps]
+                if bump_history and affected_pending:
+                    record_migrations(f, affected_pending, canonical=canonical)
+                    journal.record(f, MIGRATED, file_hash=fixture_file_hash(f))
+                    successful_fixtures.append(f)
+                else:
+                    logger.info('{}: no data for apps with new migrations, left alone'.format(f))
+                    del original_hashes[f]
+                    skipped_fixtures.append(f)
+            elif load_commit is None and fast_path and migrate_fixture_json(f, canonical=canonical):
+                journal.record(f, MIGRATED, file_hash=fixture_file_hash(f))
+                successful_fixtures.append(f)
+            else:
+                needs_database.append(f)
+
+    groups = group_fixtures_by_load_commit(needs_database, load_commit)
+    if jobs > 1:
+        success, fail = migrate_groups_in_parallel(groups, jobs, debug=debug, canonical=canonical,
+                                                   journal=journal,
+                                                   compile_fixtures=compile_fixtures,
+                                                   validate=validate)
+        successful_fixtures.extend(success)
+        failed_fixtures.extend(fail)
+    else:
+        for group_commit, group_fixtures in groups:
+            logger.info('{} fixture(s) to load at {}'.format(len(group_fixtures), group_commit[:8]))
+            success, fail = migrate_fixture_group(group_commit, group_fixtures, database=database,
+                                                  debug=debug, canonical=canonical,
+                                                  journal=journal,
+                                                  compile_fixtures=compile_fixtures,
+                                                  validate=validate)
+            successful_fixtures.extend(success)
+            failed_fixtures.extend(fail)
+
+    for f in successful_fixtures:
+        if f not in original_hashes:
+            continue
+        file_hash = fixture_file_hash(f)
+        if file_hash == original_hashes[f]:
+            logger.info('{}: unchanged, nothing to commit'.format(f))
+            journal.record(f, DONE, file_hash=file_hash)
+        else:
             msg = 'auto-migrated: {}'.format(f)
-            git_commit_all(msg)
-        else: failed_fixtures.append(f)
+            git_commit_file(f, msg)
+            journal.record(f, COMMITTED, commit=git_output(['rev-parse', 'HEAD']),
+                           file_hash=file_hash)
+
+    index.save()
+    journal.close()
+    return (successful_fixtures, failed_fixtures, skipped_fixtures)
+
+
+def group_fixtures_by_load_commit(fixture_paths, load_commit=None):
+    """ @brief: Groups \a fixture_paths by the commit each should be loaded at.
+        @author: Jivan
+        @since: 2014-06-18
+        @param load_commit: If not None, all fixtures are loaded at this commit.
+        @return: [(<commit>, [<fixture path>, ...]), ...] oldest commit first.
+    """
+    groups = {}
+    for f in fixture_paths:
+        commit = load_commit if load_commit else get_last_modified_commit(f)
+        groups.setdefault(commit, []).append(f)
+    return [(commit, groups[commit]) for commit in order_commits(groups)]
+
+
+def run_migrate_and_dump(fixture_path, canonical=False, db_index=None):
+    """ @brief: Migrates the scratch database to the latest migrations and dumps it to
+            \a fixture_path in a worker process.
+        @author: Jivan
+        @since: 2014-06-18
+        @note: This is performed in a worker process running the current code, which is
+            reused for later fixtures so django & the project are only set up once.
+            @see worker_pool
+        @param db_index: Use scratch database fixture_tools_db_<db_index> instead of the default.
+        @return: True if \a fixture_path was rewritten, False if its contents were unchanged.
+    """
+    return get_worker_pool(db_index=db_index).run('migrate_and_dump', fixture_path=fixture_path,
+                                                  canonical=canonical)
+
+
+def run_compile_fixture(fixture_path, db_index=None):
+    """ @brief: Compiles \a fixture_path for test suites from the scratch database it was just
+            migrated & dumped from, in a worker process.  @see fixture_cache
+        @author: Jivan
+        @since: 2014-07-03
+        @param db_index: @see run_migrate_and_dump()
+        @return: The compiled fixture's path, None if it couldn't be compiled.
+        @note: A fixture that fails to compile is still migrated, it's loaded with loaddata.
+    """
+    try:
+        return get_worker_pool(db_index=db_index).run('compile_fixture',
+                                                      fixture_path=fixture_path, loaded=True)
+    except Exception as ex:
+        logger.warning('{}: failed to compile:\n{}'.format(fixture_path, ex))
+        return None
+
+
+def load_fixture_at_commit(fixture_path, load_commit, database='fixture_tools_db',
+                           zygote=None):
+    """ @brief: Empties \a database and loads \a fixture_path into it with the models of
+            \a load_commit.
+        @author: Jivan
+        @since: 2014-06-19
+        @param zygote: A worker_pool.commit_zygote() for \a load_commit to load with.
+        @note: The load runs in a process forked from a zygote rooted in a worktree of
+            \a load_commit, the working tree isn't touched.
+        @note: The fixture's base fixtures are loaded first, as they were at \a load_commit.
+    """
+    if zygote is None:
+        with commit_zygote(load_commit) as zygote:
+            return load_fixture_at_commit(fixture_path, load_commit, database, zygote)
+    bases = write_base_data(fixture_path, commit=load_commit)
+    try:
+        zygote.run('load_fixture', fixture_path=os.path.abspath(fixture_path), database=database,
+                   bases=bases)
+    finally:
+        for base_path in bases:
+            os.remove(base_path)
+
+
+def find_invalid_fixtures_at_commit(zygote, load_commit, fixture_paths):
+    """ @brief: Checks the references of \a fixture_paths with the models of \a load_commit,
+            the commit they're loaded at, in its \a zygote.  @see fixture_validator
+        @author: Jivan
+        @since: 2014-07-05
+        @param zygote: A worker_pool.commit_zygote() for \a load_commit.
+        @return: set([<fixture path with missing references or that can't be read>, ...])
+        @note: If the fixtures can't be checked at \a load_commit (Ex: its models don't import
+            without a database) they're all returned, so none is loaded unchecked.
+    """
+    paths = [os.path.abspath(f) for f in fixture_paths]
+    try:
+        invalid = set(zygote.run('find_invalid_fixtures', fixture_paths=paths))
+    except Exception as ex:
+        logger.error('Fixtures loaded at {} could not be validated:\n{}'.format(
+                     load_commit[:8], ex))
+        return set(fixture_paths)
+    return set(f for f, path in zip(fixture_paths, paths) if path in invalid)
+
+
+def migrate_fixture_group(load_commit, fixture_paths, database='fixture_tools_db', debug=False,
+                          canonical=False, db_index=None, journal=None, compile_fixtures=False,
+                          validate=False):
+    """ @brief: Migrates each of \a fixture_paths, all of which load at \a load_commit.
+        @author: Jivan
+        @since: 2014-06-18
+        @return: ([<successful fixture>, ...], [<failed fixture>, ...])
+        @note: The scratch database schema for \a load_commit is built once & then only
+            emptied between fixtures (@see scratch_db.prepare_scratch_db()), and the project
+            code of \a load_commit is imported once for all the loads.
+        @param db_index: Use scratch database fixture_tools_db_<db_index> instead of \a database.
+        @param journal: journal.RunJournal to record each fixture's progress in.
+        @param compile_fixtures: Also compile each migrated fixture for test suites,
+            @see run_compile_fixture()
+        @param validate: Check the fixtures' references with the models of \a load_commit first
+            & fail those with missing references without loading them, or the whole group if
+            they can't be checked.  @see find_invalid_fixtures_at_commit()
+    """
+    successful_fixtures = []
+    failed_fixtures = []
+
+    if db_index is None:
+        zygote_env = None
+    else:
+        # Each process's default & 'fixture_tools_db' database is picked from the environment.
+        zygote_env = {'FIXTURE_TOOLS_DB_INDEX': str(db_index)}
+        database = 'fixture_tools_db'
+
+    with commit_zygote(load_commit, env=zygote_env) as zygote:
+        invalid = find_invalid_fixtures_at_commit(zygote, load_commit, fixture_paths) \
+                  if validate else set()
+        for i, f in enumerate(fixture_paths):
+            if f in invalid:
+                logger.info('{}: not validated, not migrated'.format(f))
+                if journal:
+                    journal.record(f, FAILED, commit=load_commit)
+                failed_fixtures.append(f)
+                continue
+            logger.info('--- Loading fixture at {}: {}'.format(load_commit[:8], f))
+            try:
+                with span(FIXTURE_SPAN, fixture=f, commit=load_commit):
+                    load_fixture_at_commit(f, load_commit, database=database, zygote=zygote)
+                    if journal:
+                        journal.record(f, LOADED, commit=load_commit)
+                    logger.info('--- Migrating to latest and dumping back to fixture file.')
+                    run_migrate_and_dump(f, canonical=canonical, db_index=db_index)
+                    strip_base_rows(f, canonical=canonical)
+                    if journal:
+                        journal.record(f, DUMPED, file_hash=fixture_file_hash(f))
+                    if compile_fixtures:
+                        run_compile_fixture(f, db_index=db_index)
+            except Exception as ex:
+                logger.error('{}: failed to migrate:\n{}'.format(f, ex))
+                if journal:
+                    journal.record(f, FAILED, commit=load_commit)
+                failed_fixtures.append(f)
+                if debug and not query_yes_no('Continue with the remaining fixtures?'):
+                    failed_fixtures.extend(fixture_paths[i + 1:])
+                    break
+                continue
+            successful_fixtures.append(f)
+
+    return (successful_fixtures, failed_fixtures)
 
-    return (successful_fixtures, failed_fixtures, skip_fixtures)
 
+def split_groups(groups, jobs):
+    """ @brief: Splits the load commit \a groups so none is much bigger than an even share of
+            the fixtures among \a jobs, biggest first.
+        @author: Jivan
+        @since: 2014-06-25
+        @param groups: @see group_fixtures_by_load_commit()
+        @note: Fixtures stay grouped by load commit where that doesn't leave jobs idle.
+    """
+    total = sum(len(fixtures) for commit, fixtures in groups)
+    share = max(1, -(-total // jobs))
+    pieces = []
+    for commit, fixtures in groups:
+        for i in range(0, len(fixtures), share):
+            pieces.append((commit, fixtures[i:i + share]))
+    pieces.sort(key=lambda piece: len(piece[1]), reverse=True)
+    return pieces
+
+
+def migrate_groups_in_parallel(groups, jobs, debug=False, canonical=False, journal=None,
+                               compile_fixtures=False, validate=False):
+    """ @brief: Migrates the fixtures in load commit \a groups, \a jobs at a time.
+        @author: Jivan
+        @since: 2014-06-25
+        @param groups: @see group_fixtures_by_load_commit()
+        @param journal: @see migrate_fixture_group()
+        @param compile_fixtures: @see migrate_fixture_group()
+        @param validate: @see migrate_fixture_group()
+        @return: ([<successful fixture>, ...], [<failed fixture>, ...])
+        @note: Each job has a thread with its own scratch database, fixture_tools_db_<job>
+            (@see settings_migrator), its own migrate & dump worker and the worktree of the
+            group it's working on.  Jobs working on the same commit share its worktree.
+    """
+    from django.conf import settings
+    from django_fixture_tools.scratch_db import provision_scratch_db
+    available = getattr(settings, 'FIXTURE_TOOLS_SCRATCH_DBS', 0)
+    if jobs > available:
+        raise Exception('{} jobs need {} scratch databases, FIXTURE_TOOLS_SCRATCH_DBS is {}'\
+                        .format(jobs, jobs, available))
+    for db_index in range(jobs):
+        provision_scratch_db('fixture_tools_db_{}'.format(db_index))
 
-def migrate_fixture(fixture_path, database='fixture_tools_db', load_commit=None, debug=False):
+    pieces = Queue()
+    for piece in split_groups(groups, jobs):
+        pieces.put(piece)
+    results_lock = threading.Lock()
+    successful_fixtures = []
+    failed_fixtures = []
+
+    def work(db_index):
+        while True:
+            try:
+                commit, fixtures = pieces.get_nowait()
+            except Empty:
+                return
+            logger.info('[{}] {} fixture(s) to load at {}'.format(
+                        db_index, len(fixtures), commit[:8]))
+            try:
+                success, fail = migrate_fixture_group(commit, fixtures, debug=debug,
+                                                      canonical=canonical, db_index=db_index,
+                                                      journal=journal,
+                                                      compile_fixtures=compile_fixtures,
+                                                      validate=validate)
+            except Exception as ex:
+                logger.error('[{}] failed to migrate fixtures at {}:\n{}'.format(
+                             db_index, commit[:8], ex))
+                success, fail = [], fixtures
+            with results_lock:
+                successful_fixtures.extend(success)
+                failed_fixtures.extend(fail)
+
+    threads = [threading.Thread(target=work, args=(db_index,)) for db_index in range(jobs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return (successful_fixtures, failed_fixtures)
+
+
+def migrate_fixture(fixture_path, database='fixture_tools_db', load_commit=None, debug=False,
+                    canonical=False, fast_path=True, compile_fixtures=False):
     """ @brief: Migrates \a fixture_path from the commit it was last modified to the current
             state of South migrations.
         @author: Jivan
         @since: 2014-05-23
         @param load_commit: If not None, this commit will be used to load \a fixture_path
             instead of the commit in which it was most recently modified commit.
+        @param canonical: Dump \a fixture_path in canonical form (@see shared.dumpdata()).
+        @param fast_path: If True and all pending migrations are schema-only, rewrite the
+            fixture's json directly instead of going through a database.
+            @see schema_only.migrate_fixture_json()
+        @param compile_fixtures: If the fixture is migrated through the scratch database, also
+            compile it for test suites, @see run_compile_fixture()
     """
-    fms = get_latest_fixture_migrations(fixture_path)
+    status, pending = plan_fixture(fixture_path)
     # If there is no migration history in the fixture, exit with warning
-    if len(fms) == 0:
+    if status == UNINITIALISED:
         logger.info('There is no South migration history in this fixture.  You need to '\
                     'initialize the fixture before attempting to migrate it.')
         ret = False
+    elif status == UP_TO_DATE:
+        logger.info('Fixture is up to date, nothing to migrate.')
+        ret = True
+    elif load_commit is None and fast_path and \
+            migrate_fixture_json(fixture_path, canonical=canonical):
+        ret = True
     else:
-        logger.info('--- Finding commit when fixture was last modified.')
-        original_branch, load_commit = \
-            identify_and_check_out_last_modified_commit(
-                fixture_path, debug=debug, commit=load_commit
-            )
+        if load_commit is None:
+            logger.info('--- Finding commit when fixture was last modified.')
+            load_commit = get_last_modified_commit(fixture_path)
         logger.info('Using commit: {} to load fixture.'.format(load_commit[:8]))
 
-        logger.info('--- Creating compatible database.')
-        # Prevents 'another session is using the database' errors due to lingering connections.
-        django.db.close_connection()
-        clear_south_migration_caches()
-        reset_db(database=database)
-        if debug:
-            if not query_yes_no('Database reset, continue?'):
-                check_out_branch(original_branch, debug=debug)
-                return False
-        sync_all(database=database)
-        if debug:
-            if not query_yes_no('Empty database created, continue?'):
-                check_out_branch(original_branch, debug=debug)
-                return False
-
         logger.info('--- Loading fixture.')
         logger.info('Fixture name: {}'.format(fixture_path))
-        load_fixture(fixture_path, database=database)
-    
-        logger.info('--- Checking out original commit.')
-        check_out_branch(original_branch, debug=debug)
+        load_fixture_at_commit(fixture_path, load_commit, database=database)
+        if debug:
+            if not query_yes_no('Fixture loaded, continue?'):
+                return False
 
-        # This is performed in a subprocess because the django model caching gets too confused
-        #    by checking out a different commit to do it in this process.
         logger.info('--- Migrating to latest and dumping back to fixture file.')
-        migrate_and_dump_cmd = ' '.join(['python','../django_fixture_tools/shared.py',
-                                 'migrate_and_dump', fixture_path])
-        migrate_and_dump_out = check_output(migrate_and_dump_cmd, shell=True)
+        run_migrate_and_dump(fixture_path, canonical=canonical)
+        strip_base_rows(fixture_path, canonical=canonical)
+        if compile_fixtures:
+            run_compile_fixture(fixture_path)
         ret = True
     return ret
 
@@ -125,21 +465,66 @@ if __name__ == '__main__':
         help='Turn on debugging features')
     parser.add_argument('-c', '--commit', nargs=1, default=None,
         help='Use this commit instead of last modified commit')
+    parser.add_argument('-C', '--canonical', default=False, action='store_true',
+        help='Dump fixtures in canonical (stable) order, leaving unchanged fixtures untouched')
+    parser.add_argument('--no-fast-path', dest='fast_path', default=True, action='store_false',
+        help="Always migrate through a database, even for schema-only migrations")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+        help='Migrate this many fixtures at once when scanning, each with its own scratch '\
+             'database (fixture_tools_db_0, fixture_tools_db_1, ...)')
+    parser.add_argument('--since', default=None,
+        help='When scanning, only migrate fixtures with data for apps that gained migrations '\
+             'since this commit')
+    parser.add_argument('--no-bump', dest='bump_history', default=True, action='store_false',
+        help="With --since, leave other fixtures' South history alone instead of recording "\
+             "the new migrations in it")
+    parser.add_argument('--resume', default=False, action='store_true',
+        help='When scanning, carry on from where the last run over the same path stopped')
+    parser.add_argument('--compile', dest='compile_fixtures', default=False, action='store_true',
+        help='Also compile the fixtures migrated through the scratch database into bulk load '\
+             'artifacts for test suites (@see fixture_cache.py)')
+    parser.add_argument('--validate', default=False, action='store_true',
+        help='When scanning, check the references of the fixtures loaded through the scratch '\
+             'database before loading them & fail those that are missing rows')
+    parser.add_argument('--trace', default=None, metavar='PATH',
+        help='Time each phase of the run, write the trace to PATH in Chrome trace event format '\
+             '(& as plain json beside it) and print a summary of the slowest fixtures & phases')
+    parser.add_argument('--plan', default=False, action='store_true',
+        help='Only report which fixtures are up to date, need migrating or are uninitialised')
     args = parser.parse_args()
 
     debug = args.debug
-    commit = args.commit
+    commit = args.commit[0] if args.commit else None
+    canonical = args.canonical
+    fast_path = args.fast_path
+    if args.trace:
+        get_tracer().enabled = True
 
     if args.scan_path and args.fixture_path:
         msg = 'Please use only one of -s / -f'
         print(msg)
+    elif args.plan:
+        if args.scan_path:
+            fs = scan_filesystem_for_fixtures(args.scan_path[0], exclude_dirs=['build', 'sandbox'])
+        else:
+            fs = args.fixture_path or []
+        print(describe_plan(plan_fixtures(fs)))
     elif args.scan_path:
         exclude_dirs = ['build', 'sandbox']
         skip_fixtures = []
         scan_path = args.scan_path[0]
         migrate_all_fixtures(scan_path, debug=debug, load_commit=commit,
-                             skip_fixtures=skip_fixtures, exclude_dirs=exclude_dirs)
+                             skip_fixtures=skip_fixtures, exclude_dirs=exclude_dirs,
+                             canonical=canonical, fast_path=fast_path, jobs=args.jobs,
+                             since=args.since, bump_history=args.bump_history,
+                             resume=args.resume, compile_fixtures=args.compile_fixtures,
+                             validate=args.validate)
     elif args.fixture_path:
         fixture_path = args.fixture_path[0]
-        migrate_fixture(fixture_path, debug=args.debug, load_commit=commit)
+        migrate_fixture(fixture_path, debug=args.debug, load_commit=commit, canonical=canonical,
+                        fast_path=fast_path, compile_fixtures=args.compile_fixtures)
+
+    if args.trace:
+        write_trace(args.trace)
+        print(get_tracer().summary())
     
\ No newline at end of file
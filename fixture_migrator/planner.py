@@ -0,0 +1,179 @@
+"""
+@since: 2014-06-26
+@author: Jivan
+@brief: Pre-flight planning for fixture migration.  Compares the latest South migration of each
+    app in a fixture's history with the latest in the codebase, without git or a database, so
+    fixtures that are already up to date are skipped entirely.
+    The history heads of each fixture (and the apps it has data for) are kept in an index on
+    disk and only re-read from a fixture when its size or modification time changes.
+"""
+import logging
+import os
+
+import simplejson as json
+
+from django_fixture_tools.fixture_dedupe import get_fixture_bases
+from django_fixture_tools.fixture_io import iter_fixture_objects
+from django_fixture_tools.migration_inventory import get_migration_inventory
+from django_fixture_tools.shared import get_latest_fixture_migrations, get_codebase_migrations,\
+    get_pending_migrations
+
+
+logger = logging.getLogger(__name__)
+
+UP_TO_DATE = 'up_to_date'
+NEEDS_MIGRATION = 'needs_migration'
+UNINITIALISED = 'uninitialised'
+
+HISTORY_MODEL = 'south.migrationhistory'
+
+
+def scan_fixture(fixture_path):
+    """ @brief: Reads the South history heads and the apps with data in \a fixture_path in one
+            pass over its objects.
+        @author: Jivan
+        @since: 2014-06-27
+        @return: ({<app_label>: <latest migration>, ...}, set([<app_label>, ...]))
+    """
+    heads = {}
+    apps = set()
+    for o in iter_fixture_objects(fixture_path):
+        if o['model'] == HISTORY_MODEL:
+            app, migration = o['fields']['app_name'], o['fields']['migration']
+            if migration > heads.get(app, ''):
+                heads[app] = migration
+        else:
+            apps.add(o['model'].split('.')[0])
+    return (heads, apps)
+
+
+class FixtureHeadsIndex(object):
+    """ @brief: Caches the latest South migration of each app in fixtures' history.
+        @author: Jivan
+        @since: 2014-06-26
+    """
+    filename = 'fixture_heads.json'
+
+    def __init__(self, cache_dir=None):
+        if cache_dir is None:
+            from django_fixture_tools.scratch_db import get_cache_dir
+            cache_dir = get_cache_dir()
+        self.path = os.path.join(cache_dir, self.filename)
+        # {<fixture realpath>: [<size>, <mtime>, {<app_label>: <latest migration>, ...},
+        #                       [<app_label with data>, ...]], ...}
+        try:
+            with open(self.path) as hf:
+                self.entries = json.load(hf)
+        except (IOError, ValueError):
+            self.entries = {}
+        self.dirty = False
+
+    def _entry(self, fixture_path):
+        key = os.path.realpath(fixture_path)
+        st = os.stat(fixture_path)
+        entry = self.entries.get(key)
+        if not (entry and len(entry) == 4 and entry[0] == st.st_size and entry[1] == st.st_mtime):
+            heads, apps = scan_fixture(fixture_path)
+            entry = [st.st_size, st.st_mtime, heads, sorted(apps)]
+            self.entries[key] = entry
+            self.dirty = True
+        return entry
+
+    def heads(self, fixture_path):
+        """ @brief: Returns the latest migration of each app in \a fixture_path's South history.
+            @author: Jivan
+            @since: 2014-06-26
+            @see shared.get_latest_fixture_migrations()
+        """
+        return self._entry(fixture_path)[2]
+
+    def apps(self, fixture_path):
+        """ @brief: Returns the labels of the apps \a fixture_path has data for, not counting
+                South history.  Rows of its base fixtures count (@see fixture_dedupe), they're
+                loaded & migrated with it.
+            @author: Jivan
+            @since: 2014-06-27
+        """
+        apps = set(self._entry(fixture_path)[3])
+        for base_path in get_fixture_bases(fixture_path):
+            apps.update(self._entry(base_path)[3])
+        return apps
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as hf:
+            json.dump(self.entries, hf)
+        os.rename(tmp_path, self.path)
+        self.dirty = False
+
+
+def plan_fixture(fixture_path, codebase_migrations=None, index=None):
+    """ @brief: Works out what migrating \a fixture_path would involve.
+        @author: Jivan
+        @since: 2014-06-26
+        @param codebase_migrations: @see shared.get_codebase_migrations(), looked up if None.
+        @param index: FixtureHeadsIndex to read the fixture's history from.
+        @return: (<status>, [<pending migration>, ...]) where status is one of UP_TO_DATE,
+            NEEDS_MIGRATION or UNINITIALISED & pending migrations are as returned by
+            shared.get_pending_migrations().
+    """
+    if codebase_migrations is None:
+        codebase_migrations = get_codebase_migrations()
+    heads = index.heads(fixture_path) if index else get_latest_fixture_migrations(fixture_path)
+    if not heads:
+        return (UNINITIALISED, [])
+    pending = get_pending_migrations(heads, codebase_migrations)
+    if pending:
+        return (NEEDS_MIGRATION, pending)
+    return (UP_TO_DATE, [])
+
+
+def plan_fixtures(fixture_paths, index=None):
+    """ @brief: plan_fixture() for each of \a fixture_paths.
+        @author: Jivan
+        @since: 2014-06-26
+        @param index: FixtureHeadsIndex to use, one is loaded (& saved afterwards) if None.
+        @return: {<fixture path>: (<status>, [<pending migration>, ...]), ...}
+    """
+    codebase_migrations = get_codebase_migrations()
+    own_index = index is None
+    if own_index:
+        index = FixtureHeadsIndex()
+    try:
+        return dict((f, plan_fixture(f, codebase_migrations, index)) for f in fixture_paths)
+    finally:
+        if own_index:
+            index.save()
+
+
+def get_affected_apps(since_commit):
+    """ @brief: Returns the labels of the apps that gained South migrations between
+            \a since_commit and the working tree.
+        @author: Jivan
+        @since: 2014-06-27
+    """
+    before = get_migration_inventory(since_commit)
+    affected = set()
+    for app_label, migrations in get_migration_inventory().items():
+        known = set(name for name, path in before.get(app_label, []))
+        if any(name not in known for name, path in migrations):
+            affected.add(app_label)
+    return affected
+
+
+def describe_plan(plan):
+    """ @return: A human readable summary of \a plan, @see plan_fixtures() """
+    lines = []
+    for status in (UP_TO_DATE, NEEDS_MIGRATION, UNINITIALISED):
+        fixtures = sorted(f for f, (s, pending) in plan.items() if s == status)
+        lines.append('{} ({}):'.format(status, len(fixtures)))
+        for f in fixtures:
+            pending = plan[f][1]
+            if pending:
+                lines.append('    {}: {}'.format(
+                    f, ', '.join('{}.{}'.format(app, name) for app, name, path in pending)))
+            else:
+                lines.append('    {}'.format(f))
+    return '\n'.join(lines)
@@ -0,0 +1,328 @@
+"""
+@since: 2014-06-09
+@author: Jivan
+@brief: Migrates fixtures by rewriting their json directly when every pending South migration
+    is a schema-only change the fixture data can follow without a database.
+    Recognised operations are adding a nullable or defaulted column, dropping a column,
+    creating or dropping a table and index/constraint housekeeping.  Anything else (data
+    migrations, column alterations, renames, ...) makes the fixture ineligible and it is
+    migrated the usual way through a database.
+"""
+import ast
+from collections import OrderedDict
+import datetime
+import logging
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from django_fixture_tools.fixture_io import read_fixture, write_fixture, write_fixture_text,\
+    canonical_fixture_text
+from django_fixture_tools.shared import get_latest_fixture_migrations, get_codebase_migrations,\
+    get_pending_migrations, get_unordered_fields
+
+
+logger = logging.getLogger(__name__)
+sh = logging.StreamHandler()
+logger.addHandler(sh)
+logger.setLevel(logging.DEBUG)
+
+# South db operations that don't touch the data in existing rows.
+DATA_NEUTRAL_OPERATIONS = set([
+    'create_table', 'create_index', 'delete_index', 'delete_unique', 'delete_foreign_key',
+    'delete_primary_key', 'send_create_signal',
+])
+
+
+class UnsupportedMigration(Exception):
+    pass
+
+
+def _literal(node):
+    """ @brief: Evaluates a python literal from a migration file, including the
+            datetime.datetime(...) & datetime.date(...) defaults South writes.
+    """
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+            and isinstance(node.func.value, ast.Name) and node.func.value.id == 'datetime' \
+            and node.func.attr in ('datetime', 'date'):
+        args = [ast.literal_eval(a) for a in node.args]
+        return getattr(datetime, node.func.attr)(*args)
+    return ast.literal_eval(node)
+
+
+def _serialize_default(value):
+    """ @brief: Returns \a value the way Django's json serializer writes it to a fixture. """
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return DjangoJSONEncoder().default(value)
+    return value
+
+
+def _analyse_add_column(call):
+    """ @return: (<field name>, <default value for existing rows>) for db.add_column(). """
+    if len(call.args) < 3:
+        raise UnsupportedMigration('add_column without a field definition')
+    table = _literal(call.args[0])
+    field_name = _literal(call.args[1])
+    # self.gf('django.db.models.fields.CharField')(default='', max_length=10, null=True)
+    field = call.args[2]
+    if not isinstance(field, ast.Call):
+        raise UnsupportedMigration('add_column with unrecognised field definition')
+    kwargs = dict((k.arg, k.value) for k in field.keywords)
+    if 'default' in kwargs:
+        try:
+            default = _serialize_default(_literal(kwargs['default']))
+        except (ValueError, TypeError):
+            raise UnsupportedMigration('add_column with a non-literal default')
+    elif 'null' in kwargs and _literal(kwargs['null']) is True:
+        default = None
+    else:
+        raise UnsupportedMigration('add_column without null=True or a default')
+    return (table, field_name, default)
+
+
+def _parse_migration_class(migration_path):
+    """ @return: The ast of the Migration class in the South migration at \a migration_path. """
+    with open(migration_path) as mf:
+        tree = ast.parse(mf.read(), migration_path)
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == 'Migration':
+            return node
+    return None
+
+
+def _frozen_models(migration_class):
+    """ @return: The frozen 'models' dictionary of \a migration_class. """
+    for node in migration_class.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 \
+                and getattr(node.targets[0], 'id', None) == 'models':
+            try:
+                return ast.literal_eval(node.value)
+            except ValueError:
+                pass
+    return {}
+
+
+def analyse_migration(migration_path):
+    """ @brief: Lists the operations in the forwards() of the South migration at
+            \a migration_path.
+        @author: Jivan
+        @since: 2014-06-09
+        @return: ([<operation>, ...], <frozen models>) where each operation is one of
+            ('add_column', <table>, <field name>, <default>),
+            ('delete_column', <table>, <column name>),
+            ('delete_table', <table>)
+            and <frozen models> is the migration's 'models' dictionary.
+        @raise UnsupportedMigration: If forwards() does anything other than recognised
+            schema-only operations.
+    """
+    migration_class = _parse_migration_class(migration_path)
+    if migration_class is None:
+        raise UnsupportedMigration('no Migration class')
+
+    forwards = None
+    for node in migration_class.body:
+        if isinstance(node, ast.FunctionDef) and node.name == 'forwards':
+            forwards = node
+    if forwards is None:
+        raise UnsupportedMigration('no forwards()')
+    frozen_models = _frozen_models(migration_class)
+
+    operations = []
+    for statement in forwards.body:
+        if isinstance(statement, ast.Pass):
+            continue
+        if not isinstance(statement, ast.Expr):
+            raise UnsupportedMigration('unrecognised statement on line {}'.format(statement.lineno))
+        call = statement.value
+        if isinstance(call, ast.Str):
+            # Docstring
+            continue
+        if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Attribute)
+                and isinstance(call.func.value, ast.Name) and call.func.value.id == 'db'):
+            raise UnsupportedMigration('unrecognised statement on line {}'.format(statement.lineno))
+
+        operation = call.func.attr
+        try:
+            if operation in DATA_NEUTRAL_OPERATIONS:
+                continue
+            elif operation == 'add_column':
+                operations.append(('add_column',) + _analyse_add_column(call))
+            elif operation == 'delete_column':
+                operations.append(('delete_column', _literal(call.args[0]), _literal(call.args[1])))
+            elif operation == 'delete_table':
+                operations.append(('delete_table', _literal(call.args[0])))
+            else:
+                raise UnsupportedMigration('db.{}()'.format(operation))
+        except (ValueError, IndexError):
+            raise UnsupportedMigration('db.{}() with non-literal arguments on line {}'\
+                                       .format(operation, statement.lineno))
+
+    return (operations, frozen_models)
+
+
+def _tables_by_model(frozen_models, table_models):
+    """ @brief: Adds the table names of the models in a migration's frozen \a frozen_models to
+            \a table_models, {<table>: <model label>, ...}.
+    """
+    for label, definition in frozen_models.items():
+        meta = definition.get('Meta', {})
+        if 'db_table' in meta:
+            table = ast.literal_eval(meta['db_table'])
+        else:
+            table = label.replace('.', '_')
+        table_models[table] = label
+
+
+def analyse_pending_migrations(pending_migrations, applied_migration_paths=()):
+    """ @brief: Checks whether every migration in \a pending_migrations can be applied to a
+            fixture's json directly.
+        @author: Jivan
+        @since: 2014-06-09
+        @param pending_migrations: @see shared.get_pending_migrations()
+        @param applied_migration_paths: Paths of the fixture's latest applied migrations.  Their
+            frozen models identify tables that the pending migrations drop.
+        @return: [(<app_label>, <migration name>, [<operation>, ...]), ...]
+            @see analyse_migration()
+        @raise UnsupportedMigration: If any pending migration can't be applied to json.
+    """
+    table_models = {}
+    for path in applied_migration_paths:
+        migration_class = _parse_migration_class(path)
+        if migration_class is not None:
+            _tables_by_model(_frozen_models(migration_class), table_models)
+
+    analysed = []
+    for app_label, name, path in pending_migrations:
+        try:
+            operations, frozen_models = analyse_migration(path)
+        except UnsupportedMigration as ex:
+            raise UnsupportedMigration('{}.{}: {}'.format(app_label, name, ex))
+        _tables_by_model(frozen_models, table_models)
+        analysed.append((app_label, name, operations))
+
+    # Resolve the tables in each operation to the model labels used in fixtures.
+    resolved = []
+    for app_label, name, operations in analysed:
+        resolved_operations = []
+        for operation in operations:
+            table = operation[1]
+            model = table_models.get(table)
+            if model is None:
+                # Dropped tables must be known models, they may be m2m tables whose data
+                #    lives in another model's fields.
+                if operation[0] == 'delete_table' or not table.startswith('{}_'.format(app_label)):
+                    raise UnsupportedMigration('{}.{}: unknown table {}'.format(app_label, name, table))
+                # Fall back to django's default table naming: <app_label>_<model name>
+                model = '{}.{}'.format(app_label, table[len(app_label) + 1:])
+            resolved_operations.append((operation[0], model) + operation[2:])
+        resolved.append((app_label, name, resolved_operations))
+    return resolved
+
+
+def apply_operations(fixture_objects, analysed_migrations):
+    """ @brief: Applies the operations in \a analysed_migrations to \a fixture_objects and
+            appends South migration history for them.
+        @author: Jivan
+        @since: 2014-06-09
+        @param analysed_migrations: @see analyse_pending_migrations()
+        @return: The migrated fixture objects.
+    """
+    for app_label, name, operations in analysed_migrations:
+        for operation in operations:
+            kind, model = operation[:2]
+            if kind == 'delete_table':
+                fixture_objects = [o for o in fixture_objects if o['model'] != model]
+                continue
+            for o in fixture_objects:
+                if o['model'] != model:
+                    continue
+                fields = o['fields']
+                if kind == 'add_column':
+                    field_name, default = operation[2:]
+                    fields.setdefault(field_name, default)
+                elif kind == 'delete_column':
+                    column = operation[2]
+                    if column in fields:
+                        del fields[column]
+                    elif column.endswith('_id') and column[:-3] in fields:
+                        # Foreign keys are serialized by field name, not column name.
+                        del fields[column[:-3]]
+
+    # --- Record the migrations in the fixture's South history.
+    history_indices = [i for i, o in enumerate(fixture_objects)
+                           if o['model'] == 'south.migrationhistory']
+    next_pk = max([fixture_objects[i]['pk'] for i in history_indices] + [0]) + 1
+    insert_at = history_indices[-1] + 1 if history_indices else len(fixture_objects)
+    applied = _serialize_default(timezone.now().replace(microsecond=0))
+    new_history = []
+    for app_label, name, operations in analysed_migrations:
+        new_history.append(OrderedDict([
+            ('pk', next_pk),
+            ('model', 'south.migrationhistory'),
+            ('fields', OrderedDict([
+                ('app_name', app_label), ('migration', name), ('applied', applied),
+            ])),
+        ]))
+        next_pk += 1
+    fixture_objects[insert_at:insert_at] = new_history
+
+    return fixture_objects
+
+
+def migrate_fixture_json(fixture_path, canonical=False):
+    """ @brief: Migrates \a fixture_path without a database if all the pending migrations
+            between its South history and the codebase are schema-only.
+        @author: Jivan
+        @since: 2014-06-09
+        @param canonical: Write \a fixture_path in canonical form (@see shared.dumpdata()).
+        @return: True if \a fixture_path was migrated (or was already up to date), False if a
+            database migration is needed.
+    """
+    fms = get_latest_fixture_migrations(fixture_path)
+    codebase_migrations = get_codebase_migrations()
+    pending = get_pending_migrations(fms, codebase_migrations)
+    if not pending:
+        logger.info('No pending migrations for fixture: {}'.format(fixture_path))
+        return True
+
+    applied_paths = [
+        path for app_label, migrations in codebase_migrations.items()
+            for name, path in migrations if fms.get(app_label) == name
+    ]
+    try:
+        analysed = analyse_pending_migrations(pending, applied_migration_paths=applied_paths)
+    except UnsupportedMigration as ex:
+        logger.info('Fixture needs a database migration: {}'.format(ex))
+        return False
+
+    logger.info('Migrating fixture json directly ({} schema-only migrations).'.format(len(pending)))
+    fixture_objects = apply_operations(read_fixture(fixture_path, ordered=True), analysed)
+    _write_fixture_objects(fixture_path, fixture_objects, canonical)
+    return True
+
+
+def _write_fixture_objects(fixture_path, fixture_objects, canonical):
+    if canonical:
+        write_fixture_text(
+            fixture_path,
+            canonical_fixture_text(fixture_objects, unordered_fields=get_unordered_fields()),
+            skip_unchanged=True)
+    else:
+        write_fixture(fixture_path, fixture_objects)
+
+
+def record_migrations(fixture_path, migrations, canonical=False):
+    """ @brief: Adds \a migrations to the South history of \a fixture_path without changing its
+            data, for migrations of apps the fixture has no data for.
+        @author: Jivan
+        @since: 2014-06-27
+        @param migrations: [(<app_label>, <migration name>, <migration file path>), ...]
+            @see shared.get_pending_migrations()
+        @param canonical: Write \a fixture_path in canonical form (@see shared.dumpdata()).
+    """
+    logger.info('Recording {} migrations in fixture history: {}'.format(
+                len(migrations), fixture_path))
+    fixture_objects = apply_operations(
+                          read_fixture(fixture_path, ordered=True),
+                          [(app_label, name, []) for app_label, name, path in migrations])
+    _write_fixture_objects(fixture_path, fixture_objects, canonical)
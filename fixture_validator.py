@@ -0,0 +1,253 @@
+"""
+@since: 2014-07-05
+@author: Jivan
+@brief: Checks fixtures' references without a database, so a broken fixture is found before a
+    worktree, scratch database & load are spent on it.
+    A fixture (with its base fixtures, @see fixture_dedupe) is streamed once, indexing the pks
+    of each model's rows (and the fields foreign keys with a to_field reference) and collecting
+    every foreign key, one-to-one, many-to-many & parent model reference.  References to rows
+    that aren't in the fixture are reported, unless their model is one the database provides
+    itself (content types & permissions, created by syncdb).
+    Natural keys are matched against the natural keys of the fixture's rows where they can be
+    worked out from the row alone, references to models whose natural keys can't be aren't
+    checked.
+    Relations are those of the installed models, fields a fixture doesn't have (or that the
+    models no longer have) aren't checked.
+    Fixtures are checked in parallel, one process each.  With --validate, initialize_fixtures.py
+    and migrate_fixtures.py check the fixtures they're about to load first & fail those with
+    missing references straight away.  migrate_fixtures.py checks them with the models of the
+    commit they're loaded at, one at a time in that commit's zygote
+    (@see worker_pool.commit_zygote()), and fails them all if that can't be done.
+
+Usage:
+    python fixture_validator.py -s <scan path> [-j <processes>] [--external <model label> ...]
+    python fixture_validator.py -p <fixture path>
+    Run with DJANGO_SETTINGS_MODULE=django_fixture_tools.settings_migrator, relations are read
+    from the project's models.
+Settings:
+    FIXTURE_TOOLS_EXTERNAL_MODELS: Models whose rows fixtures may reference without including
+        them (default contenttypes.contenttype & auth.permission).
+"""
+import argparse
+import logging
+import multiprocessing
+
+from django_fixture_tools.fixture_io import iter_fixture_objects
+from django_fixture_tools.fixture_dedupe import get_reference_fields, get_target_fields,\
+    get_fixture_bases, row_key, row_value_keys, _hashable
+from django_fixture_tools.tracing import span
+
+
+logger = logging.getLogger(__name__)
+sh = logging.StreamHandler()
+logger.addHandler(sh)
+logger.setLevel(logging.DEBUG)
+
+EXTERNAL_MODELS = ('contenttypes.contenttype', 'auth.permission')
+# Missing references listed per fixture, the rest are only counted.
+MAX_LISTED = 10
+
+
+def get_external_models():
+    from django.conf import settings
+    return tuple(getattr(settings, 'FIXTURE_TOOLS_EXTERNAL_MODELS', EXTERNAL_MODELS))
+
+
+def get_natural_key_models():
+    """ @brief: Returns the labels of the installed models with natural keys.
+        @author: Jivan
+        @since: 2014-07-05
+    """
+    from django.db.models import get_models
+    return set(unicode(model._meta) for model in get_models(include_auto_created=True)
+                   if hasattr(model, 'natural_key'))
+
+
+def natural_key(obj):
+    """ @brief: Returns the natural key of fixture object \a obj, worked out from its own fields.
+        @author: Jivan
+        @since: 2014-07-05
+        @return: The key as a tuple, None if it can't be worked out without the database
+            (Ex: it includes a related row's natural key).
+    """
+    from django.db.models import get_model
+    model = get_model(*obj['model'].split('.'))
+    values = dict((f.attname, obj['fields'][f.name]) for f in model._meta.local_fields
+                      if f.rel is None and f.name in obj['fields'])
+    try:
+        return _hashable(list(model(**values).natural_key()))
+    except Exception:
+        return None
+
+
+def validate_fixture(fixture_path, reference_fields=None, external_models=None,
+                     natural_key_models=None):
+    """ @brief: Checks that the rows \a fixture_path references are in it or its base
+            fixtures.
+        @author: Jivan
+        @since: 2014-07-05
+        @param reference_fields: @see fixture_dedupe.get_reference_fields()
+        @param external_models: Models that needn't be in the fixture, @see get_external_models()
+        @param natural_key_models: @see get_natural_key_models()
+        @return: {'fixture': <fixture_path>, 'rows': <rows checked>, 'missing': <count>,
+                  'examples': [[<model>, <pk>, <field>, <target model>, <target key>], ...]}
+    """
+    if reference_fields is None:
+        reference_fields = get_reference_fields()
+    if external_models is None:
+        external_models = get_external_models()
+    if natural_key_models is None:
+        natural_key_models = get_natural_key_models()
+
+    target_fields = get_target_fields(reference_fields)
+    rows = set()
+    # set([(<model label>, <field>, <value>), ...]) for references with a to_field.
+    values = set()
+    # {<model label>: set([<natural key>, ...]), ...}  Models with a row whose natural key
+    #    can't be worked out are None.
+    natural_keys = {}
+    # [(<referencing row key>, <field>, <target model>, <target field, None for the pk>,
+    #   <target key>, <is natural key>), ...]
+    references = []
+    count = 0
+    with span('validate_fixture', fixture=fixture_path) as trace:
+        for path in get_fixture_bases(fixture_path) + [fixture_path]:
+            for obj in iter_fixture_objects(path):
+                count += 1
+                key = row_key(obj)
+                rows.add(key)
+                values.update(row_value_keys(obj, target_fields))
+                if obj['model'] in natural_key_models:
+                    model_keys = natural_keys.setdefault(obj['model'], set())
+                    if model_keys is not None:
+                        nk = natural_key(obj)
+                        if nk is None:
+                            natural_keys[obj['model']] = None
+                        else:
+                            model_keys.add(nk)
+
+                fields, parents = reference_fields.get(obj['model'], ({}, []))
+                for parent in parents:
+                    references.append((key, 'pk', parent, None, key[1], False))
+                for name, (target, many, target_field) in fields.items():
+                    value = obj['fields'].get(name)
+                    if value is None:
+                        continue
+                    for v in (value if many else [value]):
+                        references.append((key, name, target, target_field, _hashable(v),
+                                           isinstance(v, list)))
+
+        missing = []
+        for key, name, target, target_field, target_key, natural in references:
+            if target in external_models:
+                continue
+            if natural:
+                if target in natural_keys and natural_keys[target] is None:
+                    # Can't be checked.
+                    continue
+                ok = target_key in natural_keys.get(target, ())
+            elif target_field is not None:
+                ok = (target, target_field, target_key) in values
+            else:
+                ok = (target, target_key) in rows
+            if not ok:
+                missing.append([key[0], key[1], name, target,
+                                list(target_key) if natural else target_key])
+        trace['rows'] = count
+        trace['missing'] = len(missing)
+
+    return {'fixture': fixture_path, 'rows': count, 'missing': len(missing),
+            'examples': missing[:MAX_LISTED]}
+
+
+def _validate_fixture(args):
+    fixture_path, reference_fields, external_models, natural_key_models = args
+    try:
+        return validate_fixture(fixture_path, reference_fields, external_models,
+                                natural_key_models)
+    except Exception as ex:
+        # Unreadable, Ex: not valid json.
+        return {'fixture': fixture_path, 'rows': 0, 'missing': 0, 'examples': [],
+                'error': '{}: {}'.format(type(ex).__name__, ex)}
+
+
+def validate_fixtures(fixture_paths, jobs=None, external_models=None):
+    """ @brief: Checks each of \a fixture_paths with validate_fixture(), \a jobs at a time.
+        @author: Jivan
+        @since: 2014-07-05
+        @param jobs: Number of processes, default one per CPU.
+        @return: [<validate_fixture() report>, ...] in the order of \a fixture_paths.  Fixtures
+            that couldn't be read have an 'error' in their report.
+        @note: The processes are forked, so they share the models already loaded.
+    """
+    reference_fields = get_reference_fields()
+    if external_models is None:
+        external_models = get_external_models()
+    natural_key_models = get_natural_key_models()
+    args = [(f, reference_fields, external_models, natural_key_models) for f in fixture_paths]
+    jobs = min(jobs or multiprocessing.cpu_count(), len(fixture_paths))
+    with span('validate_fixtures', fixtures=len(fixture_paths), jobs=jobs):
+        if jobs <= 1:
+            return [_validate_fixture(a) for a in args]
+        pool = multiprocessing.Pool(jobs)
+        try:
+            return pool.map(_validate_fixture, args, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+
+def describe_report(report):
+    """ @brief: Returns a human readable description of a validate_fixture() \a report. """
+    if 'error' in report:
+        return '{fixture}: unreadable, {error}'.format(**report)
+    lines = ['{fixture}: {missing} missing references in {rows} rows'.format(**report)]
+    for model, pk, field, target, target_key in report['examples']:
+        lines.append('    {} {} {} -> {} {}'.format(model, pk, field, target, target_key))
+    if report['missing'] > len(report['examples']):
+        lines.append('    ...')
+    return '\n'.join(lines)
+
+
+def find_invalid_fixtures(fixture_paths, jobs=None):
+    """ @brief: Pre-flight check for batch runs, logs the problems found in
+            \a fixture_paths.
+        @author: Jivan
+        @since: 2014-07-05
+        @return: set([<fixture path with missing references or that can't be read>, ...])
+    """
+    invalid = set()
+    for report in validate_fixtures(fixture_paths, jobs=jobs):
+        if report['missing'] or 'error' in report:
+            logger.error(describe_report(report))
+            invalid.add(report['fixture'])
+    logger.info('Validated {} fixtures, {} invalid'.format(len(fixture_paths), len(invalid)))
+    return invalid
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                description="Check fixtures' references without a database.")
+    parser.add_argument('-s', '--scan_path', nargs=1,
+        help='path to scan for fixtures to check')
+    parser.add_argument('-p', '--fixture_path', nargs=1,
+        help='path to fixture to check')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+        help='check this many fixtures at once (default one per CPU)')
+    parser.add_argument('--external', action='append', default=None, metavar='MODEL',
+        help='model whose rows fixtures needn\'t include (default {}), may be repeated'.format(
+             ', '.join(EXTERNAL_MODELS)))
+    args = parser.parse_args()
+
+    if args.scan_path:
+        from django_fixture_tools.shared import scan_filesystem_for_fixtures
+        fs = scan_filesystem_for_fixtures(args.scan_path[0], exclude_dirs=['build', 'sandbox'])
+    else:
+        fs = args.fixture_path or []
+    reports = validate_fixtures(fs, jobs=args.jobs, external_models=args.external)
+    invalid = 0
+    for report in reports:
+        if report['missing'] or 'error' in report:
+            invalid += 1
+            print(describe_report(report))
+    print('{} fixtures, {} invalid'.format(len(reports), invalid))
@@ -0,0 +1,294 @@
+"""
+@since: 2014-06-16
+@author: Jivan
+@brief: Indexes of the git history so questions such as 'which commits modified this fixture'
+    are answered in memory instead of by running git once per fixture.
+    The index is built from a single 'git log --name-only' walk, saved in the repository's git
+    directory keyed by the HEAD commit, and brought up to date incrementally as HEAD moves on.
+    The commit graph is likewise read once so ancestry questions are answered in memory.
+"""
+import logging
+import os
+from subprocess import check_output, call, CalledProcessError
+
+import simplejson as json
+
+from django_fixture_tools.fixture_io import is_fixture_filename
+
+
+logger = logging.getLogger(__name__)
+
+# Starts each commit's header in 'git log -z' output, where paths are NUL separated.
+COMMIT_MARKER = '\x01'
+
+
+def git_output(args, cwd=None):
+    """ @brief: Runs git with \a args and returns its output, stripped.
+        @author: Jivan
+        @since: 2014-06-16
+    """
+    return check_output(['git', '--no-pager'] + list(args), cwd=cwd).strip()
+
+
+def is_fixture_path(path):
+    """ @brief: True if \a path looks like a fixture by the rules of
+            shared.scan_filesystem_for_fixtures().
+        @author: Jivan
+        @since: 2014-06-16
+    """
+    directory, filename = os.path.split(path)
+    return 'fixture' in directory and is_fixture_filename(filename)
+
+
+class FileHistoryIndex(object):
+    """ @brief: Maps fixture paths (relative to the top of the repository) to the commits that
+            modified them, newest first.
+        @author: Jivan
+        @since: 2014-06-16
+    """
+    # Renamed whenever what's indexed changes, so older indexes are rebuilt.
+    cache_filename = 'fixture_tools_file_history.2.json'
+
+    def __init__(self, repo_dir=None, path_filter=is_fixture_path):
+        self.repo_dir = os.path.abspath(repo_dir or os.getcwd())
+        self.path_filter = path_filter
+        self.toplevel = git_output(['rev-parse', '--show-toplevel'], cwd=self.repo_dir)
+        self.git_dir = os.path.join(
+            self.repo_dir, git_output(['rev-parse', '--git-dir'], cwd=self.repo_dir))
+        self.head = None
+        self.paths = {}
+        self._load()
+
+    @property
+    def cache_path(self):
+        return os.path.join(self.git_dir, self.cache_filename)
+
+    def _load(self):
+        try:
+            with open(self.cache_path) as cf:
+                cached = json.load(cf)
+            self.head, self.paths = cached['head'], cached['paths']
+        except (IOError, ValueError, KeyError):
+            self.head, self.paths = None, {}
+
+    def _save(self):
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'w') as cf:
+            json.dump({'head': self.head, 'paths': self.paths}, cf)
+        os.rename(tmp_path, self.cache_path)
+
+    def _read_head(self):
+        """ @return: The commit HEAD points to, read from the git directory without forking git. """
+        try:
+            with open(os.path.join(self.git_dir, 'HEAD')) as hf:
+                head = hf.read().strip()
+            if not head.startswith('ref: '):
+                return head
+            ref = head[len('ref: '):]
+            ref_path = os.path.join(self.git_dir, ref)
+            if os.path.exists(ref_path):
+                with open(ref_path) as rf:
+                    return rf.read().strip()
+            with open(os.path.join(self.git_dir, 'packed-refs')) as pf:
+                for line in pf:
+                    parts = line.split()
+                    if len(parts) == 2 and parts[1] == ref:
+                        return parts[0]
+        except IOError:
+            pass
+        return git_output(['rev-parse', 'HEAD'], cwd=self.repo_dir)
+
+    def _walk(self, revision_range):
+        """ @return: {<path>: [<commit>, ...]} for commits in \a revision_range, newest first.
+            @note: Merges are listed for the paths they changed from all of their parents (-c),
+                Ex: conflict resolutions, as 'git log -- <path>' lists them.  Paths are NUL
+                separated (-z) so they're never quoted.
+        """
+        out = git_output(['log', '--name-only', '-c', '-z',
+                          '--format={}%H'.format(COMMIT_MARKER), revision_range],
+                         cwd=self.repo_dir)
+        paths = {}
+        commit = None
+        for item in out.split('\x00'):
+            # Each commit's paths follow its header after a newline (a NUL for merges).
+            item = item.lstrip('\n')
+            if item.startswith(COMMIT_MARKER):
+                commit = item[len(COMMIT_MARKER):]
+            elif item and commit and self.path_filter(item):
+                paths.setdefault(item, []).append(commit)
+        return paths
+
+    def update(self):
+        """ @brief: Brings the index up to date with HEAD.
+            @author: Jivan
+            @since: 2014-06-16
+        """
+        head = self._read_head()
+        if head == self.head:
+            return
+
+        if self.head and call(['git', 'merge-base', '--is-ancestor', self.head, head],
+                              cwd=self.repo_dir) == 0:
+            logger.debug('Updating file history index {}..{}'.format(self.head[:8], head[:8]))
+            for path, commits in self._walk('{}..{}'.format(self.head, head)).items():
+                self.paths[path] = commits + self.paths.get(path, [])
+        else:
+            logger.debug('Building file history index at {}'.format(head[:8]))
+            self.paths = self._walk(head)
+        self.head = head
+        self._save()
+
+    def relative_path(self, file_path):
+        """ @return: \a file_path relative to the top of the repository. """
+        return os.path.relpath(os.path.realpath(file_path), os.path.realpath(self.toplevel))
+
+    def commits(self, file_path):
+        """ @brief: Returns the commits that modified \a file_path, newest first.
+            @author: Jivan
+            @since: 2014-06-16
+        """
+        self.update()
+        return list(self.paths.get(self.relative_path(file_path), []))
+
+
+_file_history_indexes = {}
+
+
+def get_file_history_index(repo_dir=None):
+    """ @brief: Returns the (per process) FileHistoryIndex for the repository at \a repo_dir.
+        @author: Jivan
+        @since: 2014-06-16
+    """
+    repo_dir = os.path.abspath(repo_dir or os.getcwd())
+    if repo_dir not in _file_history_indexes:
+        _file_history_indexes[repo_dir] = FileHistoryIndex(repo_dir)
+    return _file_history_indexes[repo_dir]
+
+
+class AncestryIndex(object):
+    """ @brief: The commit graph of the repository at \a repo_dir, held in memory so ancestry
+            questions don't need a 'git merge-base' each.
+        @author: Jivan
+        @since: 2014-06-22
+        @note: Built from one 'git rev-list --topo-order --parents --all'.  Each commit gets a
+            generation number (1 for root commits, otherwise one more than its highest
+            parent), an ancestor always has a lower generation than its descendants so most
+            searches stop early.
+    """
+    def __init__(self, repo_dir=None):
+        self.repo_dir = os.path.abspath(repo_dir or os.getcwd())
+        # {<commit>: [<parent commit>, ...], ...}
+        self.parents = {}
+        # {<commit>: <generation>, ...}
+        self.generations = {}
+        # {<commit>: <position>, ...}, parents always come before their children.
+        self.positions = {}
+        self._abbreviations = {}
+        self._build()
+
+    def _build(self):
+        out = git_output(['rev-list', '--topo-order', '--parents', '--all'], cwd=self.repo_dir)
+        self.parents = {}
+        order = []
+        for line in out.split('\n'):
+            commits = line.split()
+            if commits:
+                self.parents[commits[0]] = commits[1:]
+                order.append(commits[0])
+        # rev-list lists children before their parents.
+        order.reverse()
+        self.positions = dict((commit, i) for i, commit in enumerate(order))
+        self.generations = {}
+        for commit in order:
+            self.generations[commit] = 1 + max(
+                [self.generations[p] for p in self.parents[commit]] + [0])
+        self._abbreviations = {}
+
+    def resolve(self, commit):
+        """ @brief: Returns the full id of \a commit, which may be abbreviated or any revision
+                git understands (Ex: HEAD, a branch, a tag, <commit>~1).  The index is rebuilt
+                once if \a commit isn't in it (new commits since it was built).
+            @author: Jivan
+            @since: 2014-06-22
+        """
+        if commit in self.parents:
+            return commit
+        if commit in self._abbreviations:
+            return self._abbreviations[commit]
+        try:
+            full_commit = git_output(
+                ['rev-parse', '--verify', '-q', '{}^{{commit}}'.format(commit)], cwd=self.repo_dir)
+        except CalledProcessError:
+            raise Exception('Unknown or ambiguous commit: {}'.format(commit))
+        if full_commit not in self.parents:
+            self._build()
+            if full_commit not in self.parents:
+                raise Exception('Commit {} is not on any branch or tag'.format(commit))
+        # Only abbreviations always refer to the same commit.
+        if full_commit.startswith(commit):
+            self._abbreviations[commit] = full_commit
+        return full_commit
+
+    def is_ancestor(self, ancestor, descendant):
+        """ @brief: True if \a ancestor is \a descendant or one of its ancestors.
+            @author: Jivan
+            @since: 2014-06-22
+        """
+        ancestor, descendant = self.resolve(ancestor), self.resolve(descendant)
+        ancestor_generation = self.generations[ancestor]
+        seen = set()
+        to_visit = [descendant]
+        while to_visit:
+            commit = to_visit.pop()
+            if commit == ancestor:
+                return True
+            if commit in seen or self.generations[commit] <= ancestor_generation:
+                continue
+            seen.add(commit)
+            to_visit.extend(self.parents[commit])
+        return False
+
+    def compare(self, commita, commitb):
+        """ @brief: Compares \a commita with \a commitb by ancestry.
+            @author: Jivan
+            @since: 2014-06-22
+            @return: 0 if they're the same commit, 1 if \a commita is an ancestor of
+                \a commitb, -1 if \a commitb is an ancestor of \a commita.
+            @raise Exception: If neither is an ancestor of the other.
+        """
+        if self.resolve(commita) == self.resolve(commitb):
+            return 0
+        elif self.is_ancestor(commita, commitb):
+            return 1
+        elif self.is_ancestor(commitb, commita):
+            return -1
+        raise Exception('Commit {} not an ancestor of {} and vice-versa'.format(commita, commitb))
+
+    def sort(self, commits):
+        """ @brief: Returns \a commits in topological order, ancestors before descendants.
+            @author: Jivan
+            @since: 2014-06-22
+        """
+        return sorted(commits, key=lambda c: self.positions[self.resolve(c)])
+
+
+_ancestry_indexes = {}
+
+
+def get_ancestry_index(repo_dir=None):
+    """ @brief: Returns the (per process) AncestryIndex for the repository at \a repo_dir.
+        @author: Jivan
+        @since: 2014-06-22
+    """
+    repo_dir = os.path.abspath(repo_dir or os.getcwd())
+    if repo_dir not in _ancestry_indexes:
+        _ancestry_indexes[repo_dir] = AncestryIndex(repo_dir)
+    return _ancestry_indexes[repo_dir]
+
+
+def order_commits(commits, repo_dir=None):
+    """ @brief: Returns \a commits ordered oldest to newest, ancestors before descendants.
+        @author: Jivan
+        @since: 2014-06-18
+    """
+    return get_ancestry_index(repo_dir).sort(set(commits))
@@ -0,0 +1,167 @@
+"""
+@since: 2014-06-20
+@author: Jivan
+@brief: Reads files as they were at any commit without checking the commit out.
+    Blobs are read through one long-lived 'git cat-file --batch' process instead of a git
+    process per file, and the file listing of each commit ('git ls-tree -r') is cached.
+    Listings are keyed by paths relative to the top of the repository, other methods take paths
+    as they are given to open().
+"""
+import logging
+import os
+from subprocess import Popen, PIPE
+import threading
+
+from django_fixture_tools.git_history import git_output
+
+
+logger = logging.getLogger(__name__)
+
+
+class GitObjectReader(object):
+    """ @brief: Reads trees & blobs from the repository at \a repo_dir.
+        @author: Jivan
+        @since: 2014-06-20
+    """
+    def __init__(self, repo_dir=None):
+        self.repo_dir = os.path.abspath(repo_dir or os.getcwd())
+        self.toplevel = git_output(['rev-parse', '--show-toplevel'], cwd=self.repo_dir)
+        self.git_dir = os.path.join(
+            self.repo_dir, git_output(['rev-parse', '--git-common-dir'], cwd=self.repo_dir))
+        # The worktree's own git directory, with its HEAD.
+        self.head_dir = os.path.join(
+            self.repo_dir, git_output(['rev-parse', '--git-dir'], cwd=self.repo_dir))
+        self._process = None
+        self._lock = threading.Lock()
+        # {<commit>: {<path>: <blob sha>, ...}, ...}
+        self._trees = {}
+        # {<revision>: <commit>, ...} for revisions which are commit ids, names can move.
+        self._commits = {}
+        # (<state of HEAD>, <commit>), @see head()
+        self._head = None
+
+    def _batch(self):
+        if self._process is None or self._process.poll() is not None:
+            self._process = Popen(['git', 'cat-file', '--batch'], cwd=self.repo_dir,
+                                  stdin=PIPE, stdout=PIPE)
+        return self._process
+
+    def _request(self, object_name):
+        """ @return: (<type>, <contents>) of \a object_name, (None, None) if it's missing. """
+        with self._lock:
+            process = self._batch()
+            process.stdin.write('{}\n'.format(object_name).encode('utf-8'))
+            process.stdin.flush()
+            header = process.stdout.readline().decode('utf-8').split()
+            if len(header) != 3:
+                # '<object name> missing' or '<object name> ambiguous'
+                return (None, None)
+            sha, object_type, size = header
+            contents = process.stdout.read(int(size))
+            # Each object is followed by a newline.
+            process.stdout.read(1)
+        return (object_type, contents)
+
+    def resolve(self, revision):
+        """ @brief: Returns the full commit id \a revision (Ex: 'HEAD', a branch or a short id)
+                refers to.
+            @author: Jivan
+            @since: 2014-06-20
+        """
+        if revision in self._commits:
+            return self._commits[revision]
+        commit = git_output(['rev-parse', '--verify', '{}^{{commit}}'.format(revision)],
+                            cwd=self.repo_dir)
+        if commit.startswith(revision):
+            self._commits[revision] = commit
+        return commit
+
+    def _head_state(self):
+        """ @return: The contents of HEAD & of the ref it points to, or the size & modification
+                time of packed-refs if the ref is packed.  None if they can't be read.
+        """
+        try:
+            with open(os.path.join(self.head_dir, 'HEAD')) as hf:
+                head = hf.read().strip()
+            if not head.startswith('ref: '):
+                return (head,)
+            ref = head[len('ref: '):]
+            for git_dir in (self.head_dir, self.git_dir):
+                ref_path = os.path.join(git_dir, ref)
+                if os.path.exists(ref_path):
+                    with open(ref_path) as rf:
+                        return (head, rf.read().strip())
+            st = os.stat(os.path.join(self.git_dir, 'packed-refs'))
+            return (head, st.st_size, st.st_mtime)
+        except (IOError, OSError):
+            return None
+
+    def head(self):
+        """ @brief: Returns the commit checked out, resolve('HEAD') without running git unless
+                HEAD or the branch it's on has moved since it was last resolved.
+            @author: Jivan
+            @since: 2014-06-28
+        """
+        state = self._head_state()
+        if state is None or self._head is None or self._head[0] != state:
+            self._head = (state, self.resolve('HEAD'))
+        return self._head[1]
+
+    def tree(self, revision):
+        """ @brief: Returns the files in commit \a revision.
+            @author: Jivan
+            @since: 2014-06-20
+            @return: {<path>: <blob sha>, ...}
+        """
+        commit = self.resolve(revision)
+        if commit not in self._trees:
+            out = git_output(['ls-tree', '-r', '-z', '--full-tree', commit], cwd=self.repo_dir)
+            files = {}
+            for entry in out.split('\x00'):
+                if not entry:
+                    continue
+                # '<mode> <type> <sha>\t<path>'
+                info, path = entry.split('\t', 1)
+                mode, object_type, sha = info.split()
+                if object_type == 'blob':
+                    files[path] = sha
+            self._trees[commit] = files
+        return self._trees[commit]
+
+    def read(self, revision, path):
+        """ @brief: Returns the contents of \a path at commit \a revision.
+            @author: Jivan
+            @since: 2014-06-20
+            @raise IOError: If \a path doesn't exist at \a revision.
+        """
+        sha = self.tree(revision).get(self.relative_path(path))
+        if sha is None:
+            raise IOError('{} does not exist at {}'.format(path, revision[:8]))
+        object_type, contents = self._request(sha)
+        return contents
+
+    def relative_path(self, path):
+        """ @return: \a path (absolute or relative to the current directory) relative to the
+                top of the repository.
+        """
+        return os.path.relpath(os.path.realpath(path), os.path.realpath(self.toplevel))
+
+    def close(self):
+        if self._process is not None and self._process.poll() is None:
+            self._process.stdin.close()
+            self._process.wait()
+        self._process = None
+
+
+_object_readers = {}
+
+
+def get_object_reader(repo_dir=None):
+    """ @brief: Returns the (per process) GitObjectReader for the repository at \a repo_dir.
+        @author: Jivan
+        @since: 2014-06-20
+    """
+    repo_dir = os.path.abspath(repo_dir or os.getcwd())
+    if repo_dir not in _object_readers:
+        _object_readers[repo_dir] = GitObjectReader(repo_dir)
+    return _object_readers[repo_dir]
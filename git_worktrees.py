@@ -0,0 +1,200 @@
+"""
+@since: 2014-06-19
+@author: Jivan
+@brief: Materialises historical commits in cached 'git worktree' directories so fixtures can
+    be loaded with the models of an old commit without checking it out in the working tree
+    the tools are run from.
+    Each commit gets its own detached worktree in the repository's git directory.  Worktrees
+    are reused for later fixtures at the same commit and the least recently used are removed
+    once there are more than max_worktrees.  Code for an old commit is run by a zygote rooted
+    in its worktree, @see worker_pool.commit_zygote().
+    Worktrees in use are pinned by a marker file inside them naming the process using them.
+    Creating, pinning & evicting worktrees is done under a lock on the cache, so concurrent
+    runs never remove a worktree another process is using.  Markers of processes that have
+    died are ignored.
+"""
+import logging
+import os
+import shutil
+from subprocess import check_call, CalledProcessError
+import threading
+import uuid
+
+from django_fixture_tools.file_lock import file_lock, process_exists
+from django_fixture_tools.git_history import git_output
+from django_fixture_tools.tracing import span
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKTREES = 4
+# Directory (in the git directory) worktrees are kept in.
+WORKTREE_DIRNAME = 'fixture_tools_worktrees'
+# Directory (in each worktree) of the markers pinning it, one per cache using it named
+#    <process id>.<cache id>.
+PIN_DIRNAME = '.fixture_tools_pins'
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+# Put on the path of worktree interpreters so the tools themselves always come from the
+#    current working tree.
+TOOLS_PARENT_DIR = os.path.dirname(TOOLS_DIR)
+
+
+class WorktreeCache(object):
+    """ @brief: Detached worktrees of the repository at \a repo_dir, one per commit.
+        @author: Jivan
+        @since: 2014-06-19
+    """
+    def __init__(self, repo_dir=None, max_worktrees=DEFAULT_MAX_WORKTREES):
+        self.repo_dir = os.path.abspath(repo_dir or os.getcwd())
+        self.max_worktrees = max_worktrees
+        self.toplevel = git_output(['rev-parse', '--show-toplevel'], cwd=self.repo_dir)
+        git_common_dir = git_output(['rev-parse', '--git-common-dir'], cwd=self.repo_dir)
+        self.root = os.path.join(self.repo_dir, git_common_dir, WORKTREE_DIRNAME)
+        self._lock = threading.Lock()
+        # {<worktree path>: <number of users>} in this process, @see pin_marker()
+        self._pinned = {}
+        self._pid = os.getpid()
+        self._id = uuid.uuid4().hex[:8]
+
+    def path(self, commit):
+        return os.path.join(self.root, commit)
+
+    @property
+    def lock_path(self):
+        return self.root + '.lock'
+
+    def pin_marker(self, path):
+        """ @return: The path of the marker pinning worktree \a path for this cache. """
+        if os.getpid() != self._pid:
+            # Forked, the parent's pins are its own.
+            self._pid = os.getpid()
+            self._pinned = {}
+        return os.path.join(path, PIN_DIRNAME, '{}.{}'.format(self._pid, self._id))
+
+    def is_pinned(self, path):
+        """ @brief: True if a live process has worktree \a path pinned.
+            @author: Jivan
+            @since: 2014-07-06
+        """
+        pin_dir = os.path.join(path, PIN_DIRNAME)
+        if not os.path.isdir(pin_dir):
+            return False
+        for marker in os.listdir(pin_dir):
+            try:
+                if process_exists(int(marker.split('.')[0])):
+                    return True
+            except ValueError:
+                pass
+        return False
+
+    def _git(self, *args):
+        with open(os.devnull, 'w') as devnull:
+            check_call(['git'] + list(args), cwd=self.repo_dir, stdout=devnull)
+
+    def checkout(self, commit, pin=False):
+        """ @brief: Returns the path of a worktree with \a commit checked out, creating it if
+                there isn't one already.
+            @author: Jivan
+            @since: 2014-06-19
+            @param pin: If True the worktree isn't evicted until unpin() is called for it.
+        """
+        commit = git_output(['rev-parse', '--verify', '{}^{{commit}}'.format(commit)],
+                            cwd=self.repo_dir)
+        path = self.path(commit)
+        with self._lock, file_lock(self.lock_path):
+            if os.path.exists(os.path.join(path, '.git')):
+                # The modification time records when the worktree was last used.
+                os.utime(path, None)
+            else:
+                if os.path.exists(path):
+                    # Left over from an interrupted run.
+                    shutil.rmtree(path)
+                    self._git('worktree', 'prune')
+                logger.debug('Creating worktree for {}'.format(commit[:8]))
+                with span('git_checkout', commit=commit):
+                    self._git('worktree', 'add', '--detach', path, commit)
+            if pin:
+                marker = self.pin_marker(path)
+                self._pinned[path] = self._pinned.get(path, 0) + 1
+                if self._pinned[path] == 1:
+                    if not os.path.isdir(os.path.dirname(marker)):
+                        os.makedirs(os.path.dirname(marker))
+                    open(marker, 'w').close()
+            self._evict()
+        return path
+
+    def unpin(self, path):
+        with self._lock:
+            marker = self.pin_marker(path)
+            self._pinned[path] -= 1
+            if self._pinned[path] == 0:
+                del self._pinned[path]
+                if os.path.exists(marker):
+                    os.remove(marker)
+
+    def _evict(self):
+        if not os.path.isdir(self.root):
+            return
+        worktrees = [os.path.join(self.root, d) for d in os.listdir(self.root)]
+        worktrees.sort(key=os.path.getmtime, reverse=True)
+        for path in worktrees[self.max_worktrees:]:
+            if self.is_pinned(path):
+                continue
+            logger.debug('Evicting worktree {}'.format(os.path.basename(path)[:8]))
+            try:
+                self._git('worktree', 'remove', '--force', path)
+            except CalledProcessError:
+                shutil.rmtree(path, ignore_errors=True)
+                self._git('worktree', 'prune')
+
+    def clear(self):
+        """ @brief: Removes all the worktrees.
+            @author: Jivan
+            @since: 2014-06-19
+        """
+        max_worktrees, self.max_worktrees = self.max_worktrees, 0
+        try:
+            with self._lock, file_lock(self.lock_path):
+                self._evict()
+        finally:
+            self.max_worktrees = max_worktrees
+
+    def project_dir(self, worktree_path, project_dir=None):
+        """ @return: The directory in \a worktree_path corresponding to \a project_dir (the
+                current directory by default) in the working tree.
+        """
+        project_dir = os.path.realpath(project_dir or os.getcwd())
+        relative = os.path.relpath(project_dir, os.path.realpath(self.toplevel))
+        return os.path.normpath(os.path.join(worktree_path, relative))
+
+
+_worktree_caches = {}
+
+
+def get_worktree_cache(repo_dir=None):
+    """ @brief: Returns the (per process) WorktreeCache for the repository at \a repo_dir.
+        @author: Jivan
+        @since: 2014-06-19
+        @note: The number of worktrees kept is settings.FIXTURE_TOOLS_MAX_WORKTREES.
+    """
+    from django.conf import settings
+    repo_dir = os.path.abspath(repo_dir or os.getcwd())
+    if repo_dir not in _worktree_caches:
+        max_worktrees = getattr(settings, 'FIXTURE_TOOLS_MAX_WORKTREES', DEFAULT_MAX_WORKTREES)
+        _worktree_caches[repo_dir] = WorktreeCache(repo_dir, max_worktrees=max_worktrees)
+    return _worktree_caches[repo_dir]
+
+
+def tools_environment(project_dir):
+    """ @brief: Returns the environment for an interpreter running the tools with the project's
+            code from \a project_dir (the working tree's or a worktree's).
+        @author: Jivan
+        @since: 2014-06-19
+    """
+    env = dict(os.environ)
+    python_path = [project_dir, TOOLS_PARENT_DIR]
+    if env.get('PYTHONPATH'):
+        python_path.append(env['PYTHONPATH'])
+    env['PYTHONPATH'] = os.pathsep.join(python_path)
+    return env
+
@@ -0,0 +1,141 @@
+"""
+@since: 2014-06-29
+@author: Jivan
+@brief: Checkpoint journal for batch runs over a fixture tree, so a run that dies part way
+    through (a database problem, a bad fixture, Ctrl-C) can be resumed instead of started over.
+    Each step a fixture gets through is appended to the journal as a line of json along with
+    the commit & fixture hashes involved, and flushed straight away.  A resumed run skips
+    fixtures whose last step finished them, provided the fixture still has the hash it was left
+    with, and retries the rest.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import simplejson as json
+
+from django_fixture_tools.fixture_io import fixture_file_hash
+
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIRNAME = 'journals'
+
+# Fixture states, in the order a fixture goes through them.
+PLANNED = 'planned'
+LOADED = 'loaded'
+# Rewritten in place without a database (@see schema_only).
+MIGRATED = 'migrated'
+DUMPED = 'dumped'
+COMMITTED = 'committed'
+# Finished without anything to commit.
+DONE = 'done'
+FAILED = 'failed'
+
+# The fixture file holds the result of the run.
+WRITTEN_STATES = (MIGRATED, DUMPED)
+FINISHED_STATES = (COMMITTED, DONE)
+
+
+class RunJournal(object):
+    """ @brief: Journal of a \a kind of run (Ex: 'migrate') over the fixtures beneath
+            \a scan_path.
+        @author: Jivan
+        @since: 2014-06-29
+        @param resume: If True the previous run's journal is read & added to, otherwise it's
+            replaced.
+    """
+    def __init__(self, kind, scan_path, resume=False, journal_dir=None):
+        if journal_dir is None:
+            from django_fixture_tools.scratch_db import get_cache_dir
+            journal_dir = os.path.join(get_cache_dir(), JOURNAL_DIRNAME)
+        if not os.path.isdir(journal_dir):
+            os.makedirs(journal_dir)
+        path_id = hashlib.sha1(os.path.realpath(scan_path).encode('utf-8')).hexdigest()[:12]
+        self.path = os.path.join(journal_dir, '{}_{}.jsonl'.format(kind, path_id))
+        self._lock = threading.Lock()
+        # {<fixture realpath>: {<state>: <entry>, ...}, ...}, plus the latest under None.
+        self.entries = {}
+        if resume:
+            self._read()
+        self._file = open(self.path, 'a' if resume else 'w')
+        if resume and self._file.tell() > 0:
+            with open(self.path, 'rb') as jf:
+                jf.seek(-1, os.SEEK_END)
+                if jf.read(1) != b'\n':
+                    # Finish the line the last run was cut short writing.
+                    self._file.write('\n')
+
+    def _read(self):
+        try:
+            with open(self.path) as jf:
+                for line in jf:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Cut short when the last run died.
+                        continue
+                    states = self.entries.setdefault(entry['fixture'], {})
+                    states[entry['state']] = states[None] = entry
+        except IOError:
+            pass
+        logger.info('Resuming from {} ({} fixtures)'.format(self.path, len(self.entries)))
+
+    def record(self, fixture_path, state, commit=None, file_hash=None):
+        """ @brief: Appends \a state for \a fixture_path to the journal.
+            @author: Jivan
+            @since: 2014-06-29
+            @param commit: The commit the fixture was loaded at or committed in.
+            @param file_hash: @see fixture_io.fixture_file_hash() of the fixture in this state.
+        """
+        entry = {'fixture': os.path.realpath(fixture_path), 'state': state, 'time': time.time()}
+        if commit is not None:
+            entry['commit'] = commit
+        if file_hash is not None:
+            entry['hash'] = file_hash
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            states = self.entries.setdefault(entry['fixture'], {})
+            states[state] = states[None] = entry
+
+    def last(self, fixture_path, state=None):
+        """ @return: The latest journal entry for \a fixture_path (in \a state if given), None if
+                there isn't one.
+        """
+        return self.entries.get(os.path.realpath(fixture_path), {}).get(state)
+
+    def _unchanged(self, fixture_path, entry):
+        return entry is not None and 'hash' in entry and \
+               fixture_file_hash(fixture_path) == entry['hash']
+
+    def is_finished(self, fixture_path):
+        """ @brief: Returns True if an earlier run finished \a fixture_path and it hasn't
+                changed since.
+            @author: Jivan
+            @since: 2014-06-29
+        """
+        entry = self.last(fixture_path)
+        return entry is not None and entry['state'] in FINISHED_STATES and \
+               self._unchanged(fixture_path, entry)
+
+    def written_from(self, fixture_path):
+        """ @brief: If an earlier run got as far as writing its result to \a fixture_path (and
+                it hasn't changed since) returns the fixture's hash before that run, otherwise
+                None.
+            @author: Jivan
+            @since: 2014-06-29
+        """
+        entry = self.last(fixture_path)
+        planned = self.last(fixture_path, PLANNED)
+        if entry is None or entry['state'] not in WRITTEN_STATES or planned is None or \
+                not self._unchanged(fixture_path, entry):
+            return None
+        return planned.get('hash')
+
+    def close(self):
+        with self._lock:
+            self._file.close()
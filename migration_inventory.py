@@ -0,0 +1,188 @@
+"""
+@since: 2014-06-21
+@author: Jivan
+@brief: Lists the South migrations of every app in the project, either in the working tree or
+    at any commit, without importing migration modules or reloading South.
+    Inventories of commits never change, so they are cached on disk in the git directory.
+    The working tree's inventory is cached for the life of the process.
+    Installed apps outside the project root (Ex: in site-packages) are found from their
+    migrations package, @see get_installed_app_migrations().
+
+Settings:
+    FIXTURE_TOOLS_PROJECT_ROOT: Directory apps are searched for beneath (default: the current
+        directory).
+    SOUTH_MIGRATION_MODULES: South's own setting, apps listed keep their migrations in the
+        given package instead of <app>/migrations.
+"""
+import hashlib
+from importlib import import_module
+import logging
+import os
+import re
+
+import simplejson as json
+
+from django_fixture_tools.git_objects import get_object_reader
+
+
+logger = logging.getLogger(__name__)
+
+# South migration modules, @see south.migration.base.Migrations
+MIGRATION_FILENAME = re.compile(r'^(?!__init__)\w+\.py$')
+CACHE_DIRNAME = 'fixture_tools_migrations'
+
+# {<project root>: <inventory>, ...} for the working tree.
+_working_tree_inventories = {}
+# {(<commit>, <project root>): <inventory>, ...}
+_commit_inventories = {}
+# {<app name>: [(<migration name>, <migration file path>), ...], ...}
+_installed_app_migrations = {}
+
+
+def get_project_root(project_root=None):
+    """ @brief: Returns the absolute path of the directory apps are searched for beneath.
+        @author: Jivan
+        @since: 2014-06-21
+    """
+    if project_root is None:
+        from django.conf import settings
+        project_root = getattr(settings, 'FIXTURE_TOOLS_PROJECT_ROOT', None) or os.getcwd()
+    return os.path.realpath(project_root)
+
+
+def _migration_module_dirs():
+    """ @return: {<migrations directory relative to the project root>: <app_label>, ...} for
+            apps in settings.SOUTH_MIGRATION_MODULES.
+    """
+    from django.conf import settings
+    module_dirs = {}
+    for app_label, module in getattr(settings, 'SOUTH_MIGRATION_MODULES', {}).items():
+        module_dirs[module.replace('.', '/')] = app_label
+    return module_dirs
+
+
+def build_inventory(file_paths, project_root):
+    """ @brief: Finds the South migrations among \a file_paths.
+        @author: Jivan
+        @since: 2014-06-21
+        @param file_paths: Paths relative to \a project_root of all the project's files.
+        @return: {<app_label>: [(<migration name>, <migration file path>), ...], ...} with each
+            app's migrations in the order South applies them.  Paths are absolute.
+    """
+    file_paths = set(file_paths)
+    module_dirs = _migration_module_dirs()
+    inventory = {}
+    for path in file_paths:
+        migrations_dir, filename = os.path.split(path)
+        if not MIGRATION_FILENAME.match(filename) or \
+                '{}/__init__.py'.format(migrations_dir) not in file_paths:
+            continue
+        if migrations_dir in module_dirs:
+            app_label = module_dirs[migrations_dir]
+        elif os.path.basename(migrations_dir) == 'migrations':
+            app_label = os.path.basename(os.path.dirname(migrations_dir))
+            if app_label in module_dirs.values():
+                # This app's migrations are elsewhere.
+                continue
+        else:
+            continue
+        inventory.setdefault(app_label, []).append(
+            (filename[:-3], os.path.join(project_root, path)))
+
+    for migrations in inventory.values():
+        migrations.sort()
+    return inventory
+
+
+def _working_tree_files(project_root):
+    for root, dirs, files in os.walk(project_root):
+        # Skip hidden directories
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        relative_root = os.path.relpath(root, project_root)
+        if relative_root == '.':
+            relative_root = ''
+        for f in files:
+            if f.endswith('.py'):
+                yield os.path.join(relative_root, f)
+
+
+def _commit_files(reader, commit, project_root):
+    prefix = reader.relative_path(project_root)
+    prefix = '' if prefix == '.' else prefix + '/'
+    for path in reader.tree(commit):
+        if path.startswith(prefix) and path.endswith('.py'):
+            yield path[len(prefix):]
+
+
+def _cache_path(reader, commit, project_root):
+    root_id = hashlib.sha1(reader.relative_path(project_root).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(reader.git_dir, CACHE_DIRNAME, '{}_{}.json'.format(commit, root_id))
+
+
+def get_migration_inventory(commit=None, project_root=None):
+    """ @brief: Returns the South migrations of every app beneath the project root, in the
+            working tree or at \a commit.
+        @author: Jivan
+        @since: 2014-06-21
+        @param commit: If None, the working tree is searched.  Otherwise migrations are read
+            from git & paths are where the files would be in the working tree, read them
+            with shared.read_file_at_commit().
+        @return: @see build_inventory()
+        @note: Apps without South migrations aren't included, nor is anything about whether
+            an app is installed.
+    """
+    project_root = get_project_root(project_root)
+    if commit is None:
+        if project_root not in _working_tree_inventories:
+            _working_tree_inventories[project_root] = \
+                build_inventory(_working_tree_files(project_root), project_root)
+        return _working_tree_inventories[project_root]
+
+    reader = get_object_reader()
+    commit = reader.resolve(commit)
+    key = (commit, project_root)
+    if key not in _commit_inventories:
+        cache_path = _cache_path(reader, commit, project_root)
+        try:
+            with open(cache_path) as cf:
+                inventory = dict((app_label, [tuple(m) for m in migrations])
+                                     for app_label, migrations in json.load(cf).items())
+        except (IOError, ValueError):
+            inventory = build_inventory(_commit_files(reader, commit, project_root),
+                                        project_root)
+            if not os.path.isdir(os.path.dirname(cache_path)):
+                os.makedirs(os.path.dirname(cache_path))
+            with open(cache_path + '.tmp', 'w') as cf:
+                json.dump(inventory, cf)
+            os.rename(cache_path + '.tmp', cache_path)
+        _commit_inventories[key] = inventory
+    return _commit_inventories[key]
+
+
+def get_installed_app_migrations(app_name):
+    """ @brief: Lists the South migrations of installed app \a app_name (Ex: 'taggit') from its
+            migrations package, wherever the app is installed.
+        @author: Jivan
+        @since: 2014-07-06
+        @return: [(<migration name>, <migration file path>), ...] in the order South applies
+            them, [] if the app has no South migrations.
+        @note: Only the migrations package is imported, not the migrations.  Its directory is
+            listed the way South lists it.
+    """
+    if app_name not in _installed_app_migrations:
+        from django.conf import settings
+        app_label = app_name.split('.')[-1]
+        module_name = getattr(settings, 'SOUTH_MIGRATION_MODULES', {}).get(
+                          app_label, '{}.migrations'.format(app_name))
+        migrations = []
+        try:
+            module = import_module(module_name)
+        except ImportError:
+            module = None
+        if module is not None and getattr(module, '__file__', None):
+            migrations_dir = os.path.dirname(os.path.realpath(module.__file__))
+            migrations = sorted((filename[:-3], os.path.join(migrations_dir, filename))
+                                    for filename in os.listdir(migrations_dir)
+                                        if MIGRATION_FILENAME.match(filename))
+        _installed_app_migrations[app_name] = migrations
+    return _installed_app_migrations[app_name]
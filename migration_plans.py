@@ -0,0 +1,149 @@
+"""
+@since: 2014-06-28
+@author: Jivan
+@brief: Works out the South migrations that take a database from a fixture's history heads to the
+    latest migrations in the codebase, and applies them without 'manage.py migrate'.
+    Resolving dependencies means importing every migration, so plans are cached on disk keyed
+    by the starting heads, the commit checked out & the contents of the codebase's migrations
+    (an edited migration may change its dependencies).
+    Fixtures that share heads (most of them) share a plan.
+    As with shared.get_pending_migrations(), every migration of an app up to its head in the
+    fixture is taken to be applied.
+"""
+import hashlib
+import logging
+import os
+
+import simplejson as json
+
+import south.db
+from south.migration import all_migrations
+from south.migration.base import Migrations
+from south.migration.migrators import Forwards, FakeMigrator
+from south.signals import pre_migrate, post_migrate
+
+from django_fixture_tools.git_objects import get_object_reader
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIRNAME = 'migration_plans'
+
+# {<plan key>: <plan>, ...}
+_plans = {}
+# {<migration file path>: (<size>, <mtime>, <sha1 of contents>), ...}
+_file_hashes = {}
+
+
+def compute_migration_plan(heads):
+    """ @brief: Resolves the South migrations needed to bring a database with history \a heads up
+            to date, in the order 'manage.py migrate' would apply them.
+        @author: Jivan
+        @since: 2014-06-28
+        @param heads: {<app_label>: <latest applied migration>, ...}
+            @see shared.get_latest_fixture_migrations()
+        @return: {'migrations': [[<app_label>, <migration name>], ...],
+                  'unchanged_apps': [<app_label with nothing to apply>, ...]}
+    """
+    Migrations.calculate_dependencies()
+    app_migrations = list(all_migrations())
+    applied = set()
+    for migrations in app_migrations:
+        app_label = migrations.app_label()
+        head = heads.get(app_label, '')
+        applied.update((app_label, m.name()) for m in migrations if m.name() <= head)
+
+    plan = []
+    planned = set()
+    # Like 'migrate', each app is migrated to its latest migration in turn, along with whatever
+    #    it depends on.
+    for migrations in app_migrations:
+        if not migrations:
+            continue
+        for m in migrations[-1].forwards_plan():
+            key = (m.app_label(), m.name())
+            if key not in applied and key not in planned:
+                planned.add(key)
+                plan.append(list(key))
+
+    migrated_apps = set(app_label for app_label, name in plan)
+    unchanged_apps = sorted(m.app_label() for m in app_migrations
+                                if m.app_label() not in migrated_apps)
+    return {'migrations': plan, 'unchanged_apps': unchanged_apps}
+
+
+def _file_hash(path):
+    """ @brief: Returns the sha1 of \a path's contents, only re-read when its size or
+            modification time changes.
+    """
+    st = os.stat(path)
+    cached = _file_hashes.get(path)
+    if cached is None or cached[:2] != (st.st_size, st.st_mtime):
+        with open(path, 'rb') as mf:
+            cached = (st.st_size, st.st_mtime, hashlib.sha1(mf.read()).hexdigest())
+        _file_hashes[path] = cached
+    return cached[2]
+
+
+def _plan_key(heads):
+    # Imported here, shared uses this module.
+    from django_fixture_tools.shared import get_codebase_migrations
+    codebase = sorted((app_label, [(name, _file_hash(path)) for name, path in migrations])
+                          for app_label, migrations in get_codebase_migrations().items())
+    key = json.dumps([sorted(heads.items()), get_object_reader().head(), codebase])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def get_migration_plan(heads):
+    """ @brief: Returns compute_migration_plan(\a heads), from the cache if it's been worked
+            out before.
+        @author: Jivan
+        @since: 2014-06-28
+    """
+    from django_fixture_tools.scratch_db import get_cache_dir
+    key = _plan_key(heads)
+    if key not in _plans:
+        cache_path = os.path.join(get_cache_dir(), CACHE_DIRNAME, '{}.json'.format(key))
+        try:
+            with open(cache_path) as pf:
+                _plans[key] = json.load(pf)
+        except (IOError, ValueError):
+            plan = compute_migration_plan(heads)
+            if not os.path.isdir(os.path.dirname(cache_path)):
+                os.makedirs(os.path.dirname(cache_path))
+            # Written under a unique name first, other processes may be planning the same heads.
+            tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+            with open(tmp_path, 'w') as pf:
+                json.dump(plan, pf)
+            os.rename(tmp_path, cache_path)
+            _plans[key] = plan
+    return _plans[key]
+
+
+def apply_migration_plan(plan, database='default', fake=False, verbosity=0):
+    """ @brief: Applies the migrations in \a plan to \a database, recording them in its South
+            history.
+        @author: Jivan
+        @since: 2014-06-28
+        @param plan: @see compute_migration_plan()
+        @param fake: Only record the migrations, @see shared.fake_migrations()
+    """
+    if not plan['migrations']:
+        return
+    Migrations.calculate_dependencies()
+    south.db.db = south.db.dbs[database]
+    migrations = [Migrations(app_label).migration(name) for app_label, name in plan['migrations']]
+    app_labels = []
+    for app_label, name in plan['migrations']:
+        if app_label not in app_labels:
+            app_labels.append(app_label)
+
+    for app_label in app_labels:
+        pre_migrate.send(None, app=app_label, verbosity=verbosity, interactive=False, db=database)
+    migrator = Forwards(verbosity=verbosity, interactive=False)
+    if fake:
+        migrator = FakeMigrator(migrator=migrator)
+    if migrator.migrate_many(migrations[-1], migrations, database) is False:
+        raise Exception('Applying the migration plan to {} failed'.format(database))
+    for app_label in app_labels:
+        post_migrate.send(None, app=app_label, verbosity=verbosity, interactive=False, db=database)
@@ -0,0 +1,473 @@
+"""
+@since: 2014-06-11
+@author: Jivan
+@brief: Prepares the scratch database ('fixture_tools_db') used to load, migrate and dump
+    fixtures with an empty schema matching the current models.
+    Building the schema with syncdb is slow, so on Postgres the synced database is saved as a
+    template database keyed by a fingerprint of the models & migrations it was built from.
+    Later resets with the same fingerprint clone the template (CREATE DATABASE ... TEMPLATE)
+    instead of syncing again.  On SQLite the database file is snapshotted instead, and resets
+    with the same fingerprint copy the snapshot back into place.
+    The fingerprint is also recorded in the scratch database itself, so when it already has the
+    schema that is needed (consecutive fixtures at one commit) only the tables holding data are
+    emptied and no DDL runs at all.
+    Templates are shared by concurrent jobs & runs: the registry of templates is updated under
+    a file lock, and each template is only copied by one of them at a time.
+
+Requirements:
+    The fixture_tools_db user needs the CREATEDB privilege to create & drop templates.
+Settings:
+    FIXTURE_TOOLS_SCHEMA_CACHE: Set False to always reset & sync (default True).
+    FIXTURE_TOOLS_TRUNCATE_RESET: Set False to never reuse the schema already in the scratch
+        database (default True).
+    FIXTURE_TOOLS_MAX_TEMPLATES: Number of template databases / SQLite snapshots to keep
+        (default 8).
+    FIXTURE_TOOLS_CACHE_DIR: Where cache bookkeeping is kept
+        (default ~/.cache/django_fixture_tools).
+"""
+from contextlib import contextmanager
+import hashlib
+from importlib import import_module
+import logging
+import os
+import shutil
+from subprocess import check_output, CalledProcessError, STDOUT
+import time
+
+import django.db
+from django.conf import settings
+from django.db import connections, transaction, DatabaseError
+
+import simplejson as json
+
+from django_fixture_tools.file_lock import file_lock
+from django_fixture_tools.shared import reset_db, sync_all, fake_migrations, query_yes_no
+from django_fixture_tools.tracing import span
+
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_PREFIX = 'fixture_tools_tpl_'
+# Table in the scratch database recording the fingerprint of the schema it was built with.
+FINGERPRINT_TABLE = 'fixture_tools_schema'
+# Attempts at cloning a template that another session is connected to.
+CLONE_ATTEMPTS = 5
+
+
+def get_cache_dir():
+    """ @brief: Returns the directory fixture tools caches are kept in, creating it if needed.
+        @author: Jivan
+        @since: 2014-06-11
+    """
+    cache_dir = getattr(settings, 'FIXTURE_TOOLS_CACHE_DIR',
+                        os.path.expanduser('~/.cache/django_fixture_tools'))
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    return cache_dir
+
+
+def is_postgres(database):
+    return 'postg' in settings.DATABASES[database]['ENGINE']
+
+
+def is_sqlite(database):
+    return 'sqlite' in settings.DATABASES[database]['ENGINE']
+
+
+def _schema_files(app_name):
+    """ @brief: Returns the paths of the models & South migration files for the app
+            \a app_name, or an empty list if it can't be imported at this commit.
+    """
+    try:
+        app_dir = os.path.dirname(import_module(app_name).__file__)
+    except ImportError:
+        return []
+
+    paths = []
+    models_file = os.path.join(app_dir, 'models.py')
+    if os.path.isfile(models_file):
+        paths.append(models_file)
+    for package in ('models', 'migrations'):
+        package_dir = os.path.join(app_dir, package)
+        if os.path.isdir(package_dir):
+            paths.extend(os.path.join(package_dir, f)
+                             for f in sorted(os.listdir(package_dir)) if f.endswith('.py'))
+    return paths
+
+
+def compute_schema_fingerprint(database):
+    """ @brief: Returns a hash identifying the schema a synced \a database would have with the
+            models & migrations currently on disk.
+        @author: Jivan
+        @since: 2014-06-11
+    """
+    sha = hashlib.sha1()
+    sha.update(settings.DATABASES[database]['ENGINE'].encode('utf-8'))
+    for app_name in sorted(settings.INSTALLED_APPS):
+        sha.update(app_name.encode('utf-8'))
+        for path in _schema_files(app_name):
+            sha.update(os.path.basename(path).encode('utf-8'))
+            with open(path, 'rb') as sf:
+                sha.update(sf.read())
+    return sha.hexdigest()
+
+
+def _pg_command(database, *args):
+    """ @brief: Runs the postgres client program args[0] (createdb, dropdb, ...) with the
+            connection settings of \a database.
+    """
+    db = settings.DATABASES[database]
+    cmd = [args[0]]
+    if db.get('HOST'):
+        cmd.extend(['-h', db['HOST']])
+    if db.get('PORT'):
+        cmd.extend(['-p', str(db['PORT'])])
+    if db.get('USER'):
+        cmd.extend(['-U', db['USER']])
+    cmd.extend(args[1:])
+    env = dict(os.environ, PGPASSWORD=db.get('PASSWORD', ''))
+    return check_output(cmd, env=env, stderr=STDOUT)
+
+
+def _commit(database):
+    # Only needed on django versions without autocommit.
+    if hasattr(transaction, 'commit_unless_managed'):
+        transaction.commit_unless_managed(using=database)
+
+
+def read_schema_fingerprint(database):
+    """ @brief: Returns the schema fingerprint recorded in \a database, None if there isn't one.
+        @author: Jivan
+        @since: 2014-06-12
+    """
+    try:
+        connection = connections[database]
+        if FINGERPRINT_TABLE not in connection.introspection.table_names():
+            return None
+        cursor = connection.cursor()
+        cursor.execute('SELECT fingerprint FROM {}'.format(FINGERPRINT_TABLE))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    except DatabaseError:
+        # The database doesn't exist yet or isn't reachable.
+        return None
+    finally:
+        django.db.close_connection()
+
+
+def write_schema_fingerprint(database, fingerprint):
+    """ @brief: Records \a fingerprint as the schema fingerprint of \a database.
+        @author: Jivan
+        @since: 2014-06-12
+    """
+    cursor = connections[database].cursor()
+    cursor.execute('DROP TABLE IF EXISTS {}'.format(FINGERPRINT_TABLE))
+    cursor.execute('CREATE TABLE {} (fingerprint varchar(40))'.format(FINGERPRINT_TABLE))
+    cursor.execute('INSERT INTO {} VALUES (%s)'.format(FINGERPRINT_TABLE), [fingerprint])
+    _commit(database)
+
+
+def clear_schema_fingerprint(database):
+    """ @brief: Forgets the schema fingerprint of \a database, for use after its schema has been
+            changed by something other than prepare_scratch_db() (a South migration, ...).
+        @author: Jivan
+        @since: 2014-06-12
+    """
+    cursor = connections[database].cursor()
+    cursor.execute('DROP TABLE IF EXISTS {}'.format(FINGERPRINT_TABLE))
+    _commit(database)
+
+
+def truncate_tables(database):
+    """ @brief: Empties the tables in \a database that contain data and resets their sequences.
+        @author: Jivan
+        @since: 2014-06-12
+        @return: True if \a database was emptied, False if its backend isn't supported.
+        @note: Only tables belonging to installed models are touched, so tables such as
+            PostGIS's spatial_ref_sys are left alone.
+    """
+    connection = connections[database]
+    if not (is_postgres(database) or is_sqlite(database)):
+        return False
+
+    qn = connection.ops.quote_name
+    cursor = connection.cursor()
+    tables = []
+    for table in sorted(connection.introspection.django_table_names(only_existing=True)):
+        cursor.execute('SELECT 1 FROM {} LIMIT 1'.format(qn(table)))
+        if cursor.fetchone():
+            tables.append(table)
+
+    if tables:
+        logger.debug('Emptying tables: {}'.format(', '.join(tables)))
+        if is_postgres(database):
+            cursor.execute('TRUNCATE {} RESTART IDENTITY CASCADE'\
+                           .format(', '.join(qn(t) for t in tables)))
+        else:
+            for table in tables:
+                cursor.execute('DELETE FROM {}'.format(qn(table)))
+            if 'sqlite_sequence' in connection.introspection.table_names():
+                cursor.execute('DELETE FROM sqlite_sequence WHERE name IN ({})'\
+                               .format(', '.join(['%s'] * len(tables))), tables)
+        _commit(database)
+    return True
+
+
+def template_name(fingerprint, fake_history=False):
+    history = 'h' if fake_history else 'n'
+    return '{}{}{}'.format(TEMPLATE_PREFIX, history, fingerprint[:16])
+
+
+def _registry_path():
+    return os.path.join(get_cache_dir(), 'templates.json')
+
+
+def _load_registry():
+    """ @return: {<template name>: <last used timestamp>, ...} """
+    try:
+        with open(_registry_path()) as rf:
+            return json.load(rf)
+    except (IOError, ValueError):
+        return {}
+
+
+def _save_registry(registry):
+    # Written under a unique name first, other processes may be saving it too.
+    tmp_path = '{}.{}.tmp'.format(_registry_path(), os.getpid())
+    with open(tmp_path, 'w') as rf:
+        json.dump(registry, rf)
+    os.rename(tmp_path, _registry_path())
+
+
+@contextmanager
+def _locked_registry():
+    """ @brief: Yields the template registry for updating, & saves it afterwards.  Other
+            processes wait to update it until then.
+        @author: Jivan
+        @since: 2014-07-06
+    """
+    with file_lock(_registry_path() + '.lock'):
+        registry = _load_registry()
+        yield registry
+        _save_registry(registry)
+
+
+def _template_lock(name):
+    """ @return: A lock held while template \a name is created, copied or dropped.  Postgres
+            refuses to copy a database another session is connected to, even another copy.
+    """
+    return file_lock(os.path.join(get_cache_dir(), 'locks', '{}.lock'.format(name)))
+
+
+def save_template(database, fingerprint, fake_history=False):
+    """ @brief: Saves the current contents of \a database as the template for \a fingerprint.
+        @author: Jivan
+        @since: 2014-06-11
+    """
+    name = template_name(fingerprint, fake_history)
+    dbname = settings.DATABASES[database]['NAME']
+    # Postgres refuses to copy a database with open connections.
+    django.db.close_connection()
+    with _template_lock(name):
+        if name in _load_registry():
+            # Saved by a concurrent job building the same schema.
+            logger.debug('Schema template {} already saved'.format(name))
+        else:
+            try:
+                _pg_command(database, 'dropdb', '--if-exists', name)
+                _pg_command(database, 'createdb', '--template={}'.format(dbname), name)
+            except CalledProcessError as ex:
+                logger.warning('Unable to save schema template {}: {}'.format(name, ex.output))
+                return False
+
+    with _locked_registry() as registry:
+        registry[name] = time.time()
+    evict_templates(database)
+    return True
+
+
+def clone_template(database, fingerprint, fake_history=False):
+    """ @brief: Replaces \a database with a copy of the template saved for \a fingerprint.
+        @author: Jivan
+        @since: 2014-06-11
+        @return: True if the template was cloned, False if there is no usable template.
+        @note: A template another session is connected to is retried CLONE_ATTEMPTS times,
+            then left for later resets while this one rebuilds the schema.
+    """
+    name = template_name(fingerprint, fake_history)
+    if name not in _load_registry():
+        return False
+
+    dbname = settings.DATABASES[database]['NAME']
+    django.db.close_connection()
+    for attempt in range(1, CLONE_ATTEMPTS + 1):
+        try:
+            with _template_lock(name):
+                _pg_command(database, 'dropdb', '--if-exists', dbname)
+                _pg_command(database, 'createdb', '--template={}'.format(name), dbname)
+            break
+        except CalledProcessError as ex:
+            if 'being accessed by other users' not in ex.output:
+                # The template has gone missing, forget about it and rebuild instead.
+                logger.warning('Unable to clone schema template {}: {}'.format(name, ex.output))
+                with _locked_registry() as registry:
+                    registry.pop(name, None)
+                return False
+            if attempt == CLONE_ATTEMPTS:
+                logger.warning('Schema template {} is busy, rebuilding instead'.format(name))
+                return False
+            time.sleep(0.2 * attempt)
+
+    with _locked_registry() as registry:
+        registry[name] = time.time()
+    return True
+
+
+def evict_templates(database, keep=None):
+    """ @brief: Drops all but the \a keep most recently used template databases.
+        @author: Jivan
+        @since: 2014-06-11
+    """
+    if keep is None:
+        keep = getattr(settings, 'FIXTURE_TOOLS_MAX_TEMPLATES', 8)
+    with _locked_registry() as registry:
+        by_last_use = sorted(registry, key=registry.get, reverse=True)
+        for name in by_last_use[keep:]:
+            logger.debug('Evicting schema template {}'.format(name))
+            try:
+                with _template_lock(name):
+                    _pg_command(database, 'dropdb', '--if-exists', name)
+            except CalledProcessError as ex:
+                logger.warning('Unable to drop schema template {}: {}'.format(name, ex.output))
+                continue
+            del registry[name]
+
+
+def _snapshot_path(database, fingerprint, fake_history=False):
+    """ @return: Path of the SQLite snapshot for \a fingerprint.  Snapshots are kept next to
+            the scratch database so copies stay on the same (ideally tmpfs) filesystem.
+    """
+    db_dir = os.path.dirname(os.path.abspath(settings.DATABASES[database]['NAME']))
+    snapshot_dir = os.path.join(db_dir, 'fixture_tools_snapshots')
+    if not os.path.isdir(snapshot_dir):
+        os.makedirs(snapshot_dir)
+    return os.path.join(snapshot_dir, '{}.sqlite3'.format(template_name(fingerprint, fake_history)))
+
+
+def _copy_file(src, dest):
+    # Copy beside the destination then rename, so dest is never left half written.  The copy's
+    #    name is unique, concurrent jobs may be saving the same snapshot.
+    tmp_path = '{}.{}.tmp'.format(dest, os.getpid())
+    shutil.copyfile(src, tmp_path)
+    os.rename(tmp_path, dest)
+
+
+def save_snapshot(database, fingerprint, fake_history=False):
+    """ @brief: Saves a copy of the SQLite file of \a database as the snapshot for \a fingerprint.
+        @author: Jivan
+        @since: 2014-06-13
+    """
+    django.db.close_connection()
+    _copy_file(settings.DATABASES[database]['NAME'],
+               _snapshot_path(database, fingerprint, fake_history))
+    evict_snapshots(database)
+
+
+def restore_snapshot(database, fingerprint, fake_history=False):
+    """ @brief: Replaces the SQLite file of \a database with the snapshot for \a fingerprint.
+        @author: Jivan
+        @since: 2014-06-13
+        @return: True if the snapshot was restored, False if there is no snapshot.
+    """
+    snapshot_path = _snapshot_path(database, fingerprint, fake_history)
+    if not os.path.exists(snapshot_path):
+        return False
+    django.db.close_connection()
+    _copy_file(snapshot_path, settings.DATABASES[database]['NAME'])
+    # The modification time records when the snapshot was last used.
+    os.utime(snapshot_path, None)
+    return True
+
+
+def evict_snapshots(database, keep=None):
+    """ @brief: Removes all but the \a keep most recently used SQLite snapshots.
+        @author: Jivan
+        @since: 2014-06-13
+    """
+    if keep is None:
+        keep = getattr(settings, 'FIXTURE_TOOLS_MAX_TEMPLATES', 8)
+    snapshot_dir = os.path.dirname(_snapshot_path(database, ''))
+    snapshots = [os.path.join(snapshot_dir, f)
+                     for f in os.listdir(snapshot_dir) if f.startswith(TEMPLATE_PREFIX)]
+    snapshots.sort(key=os.path.getmtime, reverse=True)
+    for path in snapshots[keep:]:
+        logger.debug('Evicting schema snapshot {}'.format(path))
+        os.remove(path)
+
+
+def provision_scratch_db(database):
+    """ @brief: Creates \a database if it doesn't exist yet.
+        @author: Jivan
+        @since: 2014-06-25
+        @note: SQLite databases are created when they're first connected to.
+    """
+    if not is_postgres(database):
+        return
+    dbname = settings.DATABASES[database]['NAME']
+    try:
+        _pg_command(database, 'createdb', dbname)
+        logger.info('Created scratch database {}'.format(dbname))
+    except CalledProcessError as ex:
+        if 'already exists' not in ex.output:
+            raise
+
+
+def prepare_scratch_db(database, fake_history=False, debug=False):
+    """ @brief: Empties \a database and gives it the schema of the current models.
+        @author: Jivan
+        @since: 2014-06-11
+        @param fake_history: Also record the current South migrations as applied.
+        @note: This replaces the reset_db(), sync_all() [, fake_migrations()] sequence.
+            In order of preference the schema is: kept & its tables emptied, cloned from a
+            template (Postgres) or snapshot (SQLite), or built from scratch.
+    """
+    with span('prepare_scratch_db', database=database) as trace:
+        trace['method'] = _prepare_scratch_db(database, fake_history, debug)
+
+
+def _prepare_scratch_db(database, fake_history, debug):
+    """ @return: How the schema was prepared, 'truncated', 'cloned', 'restored' or 'built'. """
+    # Prevents 'another session is using the database' errors due to lingering connections.
+    django.db.close_connection()
+    fingerprint = compute_schema_fingerprint(database)
+
+    if getattr(settings, 'FIXTURE_TOOLS_TRUNCATE_RESET', True) \
+            and read_schema_fingerprint(database) == fingerprint and truncate_tables(database):
+        logger.debug('Schema unchanged, emptied scratch database tables.')
+        # South history was emptied with everything else.
+        if fake_history:
+            fake_migrations(database=database)
+        return 'truncated'
+
+    use_cache = getattr(settings, 'FIXTURE_TOOLS_SCHEMA_CACHE', True)
+    if use_cache and is_postgres(database) and clone_template(database, fingerprint, fake_history):
+        logger.debug('Cloned schema template {}'.format(template_name(fingerprint, fake_history)))
+        return 'cloned'
+    if use_cache and is_sqlite(database) and restore_snapshot(database, fingerprint, fake_history):
+        logger.debug('Restored schema snapshot {}'.format(template_name(fingerprint, fake_history)))
+        return 'restored'
+
+    reset_db(database=database, debug=debug)
+    if debug:
+        if not query_yes_no('Database reset, continue?'):
+            exit()
+    sync_all(database=database, debug=debug)
+    if fake_history:
+        fake_migrations(database=database)
+    write_schema_fingerprint(database, fingerprint)
+
+    if use_cache and is_postgres(database):
+        save_template(database, fingerprint, fake_history)
+    elif use_cache and is_sqlite(database):
+        save_snapshot(database, fingerprint, fake_history)
+    return 'built'
@@ -3,7 +3,15 @@
 @author: Jivan
 @brief: Adds settings needed by fixture migrator to project settings.
 """
-from dowant.settings import *
+from importlib import import_module
+import os
+import tempfile
+
+# FIXTURE_TOOLS_PROJECT_SETTINGS in the environment names the project settings module to extend.
+_project_settings = import_module(os.environ.get('FIXTURE_TOOLS_PROJECT_SETTINGS',
+                                                 'dowant.settings'))
+globals().update((_name, _value) for _name, _value in vars(_project_settings).items()
+                     if not _name.startswith('_'))
 
 # Hide the default database so:
 #  1. We work around syncdb issues with auth & contenttypes
@@ -17,5 +25,22 @@ DATABASES['fixture_tools_db'] = {
     'USER': 'fixture_tools',
 }
 
+# FIXTURE_TOOLS_SCRATCH_BACKEND=sqlite in the environment puts the scratch database in a SQLite
+#    file on tmpfs instead, no database server needed.  Only for projects without
+#    PostGIS-specific columns.
+if os.environ.get('FIXTURE_TOOLS_SCRATCH_BACKEND') == 'sqlite':
+    sqlite_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    DATABASES['fixture_tools_db'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(sqlite_dir, 'fixture_tools_db.sqlite3'),
+    }
+
+# Keep synced schemas as Postgres template databases and clone them for later resets with the
+#    same models & migrations (@see scratch_db).  Needs the CREATEDB privilege.
+FIXTURE_TOOLS_SCHEMA_CACHE = True
+FIXTURE_TOOLS_MAX_TEMPLATES = 8
+# Reuse the scratch database schema when it is unchanged, emptying only tables holding data.
+FIXTURE_TOOLS_TRUNCATE_RESET = True
+
 # Allows an extra check to make sure you don't clobber your existing database.
 FIXTURE_MAKER_SETTINGS_FILE = True
@@ -3,7 +3,15 @@
 @author: Jivan
 @brief: Adds settings needed by fixture migrator to project settings.
 """
-from dowant.settings import *
+from importlib import import_module
+import os
+import tempfile
+
+# FIXTURE_TOOLS_PROJECT_SETTINGS in the environment names the project settings module to extend.
+_project_settings = import_module(os.environ.get('FIXTURE_TOOLS_PROJECT_SETTINGS',
+                                                 'dowant.settings'))
+globals().update((_name, _value) for _name, _value in vars(_project_settings).items()
+                     if not _name.startswith('_'))
 
 # Hide the default database so:
 #  1. We work around syncdb issues with auth & contenttypes
@@ -15,9 +23,53 @@ DATABASES['default'] = {
     'HOST': 'localhost',
     'USER': 'fixture_tools',
 }
+
+# FIXTURE_TOOLS_SCRATCH_BACKEND=sqlite in the environment puts the scratch database in a SQLite
+#    file on tmpfs instead, no database server needed.  Only for projects without
+#    PostGIS-specific columns.
+if os.environ.get('FIXTURE_TOOLS_SCRATCH_BACKEND') == 'sqlite':
+    sqlite_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(sqlite_dir, 'fixture_tools_db.sqlite3'),
+    }
+
+# Scratch databases fixture_tools_db_0 .. fixture_tools_db_<N - 1> for parallel runs, one per
+#    job (@see fixture_migrator/migrate_fixtures.py --jobs).
+FIXTURE_TOOLS_SCRATCH_DBS = 8
+for _i in range(FIXTURE_TOOLS_SCRATCH_DBS):
+    _db = dict(DATABASES['default'])
+    if 'sqlite3' in _db['ENGINE']:
+        _db['NAME'] = '{}_{}.sqlite3'.format(os.path.splitext(_db['NAME'])[0], _i)
+    else:
+        _db['NAME'] = '{}_{}'.format(_db['NAME'], _i)
+    DATABASES['fixture_tools_db_{}'.format(_i)] = _db
+# FIXTURE_TOOLS_DB_INDEX=<i> in the environment makes fixture_tools_db_<i> the scratch database
+#    of this process.
+if os.environ.get('FIXTURE_TOOLS_DB_INDEX'):
+    DATABASES['default'] = DATABASES['fixture_tools_db_{}'.format(os.environ['FIXTURE_TOOLS_DB_INDEX'])]
 DATABASES['fixture_tools_db'] = DATABASES['default']
 
 INSTALLED_APPS += ('django_extensions','south')
 
+# Keep synced schemas as Postgres template databases and clone them for later resets with the
+#    same models & migrations (@see scratch_db).  Needs the CREATEDB privilege.
+FIXTURE_TOOLS_SCHEMA_CACHE = True
+FIXTURE_TOOLS_MAX_TEMPLATES = 8
+# Directory the project's apps (& their South migrations) are beneath, None for the directory
+#    the tools are run from (@see migration_inventory).
+FIXTURE_TOOLS_PROJECT_ROOT = None
+# Number of git worktrees of old commits to keep for loading fixtures (@see git_worktrees).
+FIXTURE_TOOLS_MAX_WORKTREES = 4
+# Fixtures a migrate & dump worker process handles before it's replaced (@see worker_pool).
+FIXTURE_TOOLS_WORKER_MAX_JOBS = 20
+# Compiled fixtures to keep for test suites (@see fixture_cache).
+FIXTURE_TOOLS_MAX_COMPILED = 1000
+# Models fixtures may reference without including their rows, syncdb creates them
+#    (@see fixture_validator).
+FIXTURE_TOOLS_EXTERNAL_MODELS = ('contenttypes.contenttype', 'auth.permission')
+# Reuse the scratch database schema when it is unchanged, emptying only tables holding data.
+FIXTURE_TOOLS_TRUNCATE_RESET = True
+
 # Allows an extra check to make sure you don't clobber your existing database.
 FIXTURE_MIGRATOR_SETTINGS_FILE = True
@@ -22,9 +22,6 @@ from django.core.exceptions import ImproperlyConfigured
 from django.core.management import call_command
 from django.core.management.commands.dumpdata import Command as DumpDataCommand
 from django.core.management.commands.loaddata import Command as LoadDataCommand
-from django.db.models.loading import AppCache
-from django.utils.datastructures import SortedDict
-from django.utils.functional import empty
 from south.exceptions import NoMigrations
 from south.management.commands import SyncCommand
 from south.management.commands.migrate import Command as MigrateCommand
@@ -35,6 +32,16 @@ from south.models import MigrationHistory
 
 import simplejson as json
 
+from django_fixture_tools.git_history import get_file_history_index, get_ancestry_index
+from django_fixture_tools.git_objects import get_object_reader
+from django_fixture_tools.migration_inventory import get_migration_inventory,\
+    get_installed_app_migrations
+from django_fixture_tools.migration_plans import apply_migration_plan, get_migration_plan
+from django_fixture_tools.tracing import span
+from django_fixture_tools.fixture_dedupe import write_base_data
+from django_fixture_tools.fixture_io import iter_fixture_objects, is_fixture_filename,\
+    as_plain_json, write_fixture_text, canonical_fixture_text, parse_fixture_data
+
 
 logger = logging.getLogger(__name__)
 sh = logging.StreamHandler()
@@ -50,26 +57,13 @@ def get_last_modified_commit(file_path, ignore_commits=None):
     """ @brief: Returns the git commit \a file_path was last modified in.
         @author: Jivan
         @since: 2014-04-15
+        @param ignore_commits: Commits to skip over, the most recent modification in another
+            commit is returned instead.
     """
-    # --- Get the commit that \a fixture_path was last modified.
-#     cmd = ['git', '--no-pager', 'log', '-1', '--pretty=oneline', '--follow {}'.format(file_path)]
-    if not ignore_commits:
-        cmd = ['git', '--no-pager', 'log', '-1', '--pretty=oneline', '{}'.format(file_path)]
-    else:
-        cmd = ['git', '--no-pager', 'log', '--pretty=oneline', '{}'.format(file_path)]
-
-    cmd = ' '.join(cmd)
-    o = subprocess.check_output(cmd, shell=True)
-    o = o.strip()
-
-    if not ignore_commits:
-        outs = o.split()
-        last_modified_commit = outs[0]
-    else:
-        outlines = o.split('\n')
-        commits = [l.split()[0] for l in outlines]
+    commits = get_commits_when_file_modified(file_path)
+    if ignore_commits:
         commits = [c for c in commits if c not in ignore_commits]
-        last_modified_commit = commits[0]
+    last_modified_commit = commits[0]
     
     return last_modified_commit
 
@@ -112,6 +106,12 @@ def get_commits_when_file_modified(file_path, max_results=None):
         @author: Jivan
         @since: 2014-04-16
     """
+    # --- Fixtures are looked up in the history index, built once for all fixtures.
+    index = get_file_history_index()
+    if index.path_filter(index.relative_path(file_path)):
+        commits = index.commits(file_path)
+        return commits[:max_results] if max_results else commits
+
     # --- Make external call to git to get the commits that \a fixture_path was last modified.
 #     cmd = ['git', '--no-pager', 'log', '-{}'.format(max_results), '--pretty=oneline', '--follow {}'.format(file_path)]
     if max_results:
@@ -121,7 +121,8 @@ def get_commits_when_file_modified(file_path, max_results=None):
 
     cmd = ' '.join(cmd)
  
-    o = subprocess.check_output(cmd, shell=True)
+    with span('git_log', fixture=file_path):
+        o = subprocess.check_output(cmd, shell=True)
     
     # --- Parse the output from the git call.
     o = o.strip()
@@ -135,25 +136,11 @@ def get_commits_when_file_modified(file_path, max_results=None):
 
 
 def git_commit_compare(commita, commitb):
-    #git merge-base --is-ancestor <commit a> <commit b>
-    # 0 if <commit a> is ancestor of <commit b>
-    # 1 if <commit a> is not an ancestor of <commit b>
-    # Errors signaled by numbers not in [0, 1]
-    cmd_args = ['git', 'merge-base', commita, commitb]
-    cmd = ' '.join(cmd_args)
-    o = subprocess.check_output(cmd, shell=True)
-    o = o.strip()
-    if o == commita:
-        resp = 1
-    elif o == commitb:
-        resp = -1
-    elif commita == commitb:
-        resp = 0
-    else:
-        print('merge base: {}'.format(o))
-        raise Exception('Commit {} not an ancestor of {} and vice-versa'.format(commita, commitb))
-
-    return resp
+    """ @brief: Compares commits by ancestry, @see git_history.AncestryIndex.compare()
+        @return: 0 if they're the same commit, 1 if \a commita is an ancestor of \a commitb,
+            -1 if \a commitb is an ancestor of \a commita.
+    """
+    return get_ancestry_index().compare(commita, commitb)
 
 
 def get_latest_fixture_migrations(fixture_path):
@@ -162,15 +149,14 @@ def get_latest_fixture_migrations(fixture_path):
         @since: 2014-04-15
         @return: {<app_name>: <latest migration>, ...}
     """
-    with open(fixture_path, 'r') as ff:
-        fixture_contents = json.load(ff)
-        fixture_migrations = {
-            i['fields']['app_name']: i['fields']['migration']
-                for i in fixture_contents if i['model'] == 'south.migrationhistory'
-        }
+    fixture_contents = iter_fixture_objects(fixture_path, contains='south.migrationhistory')
+    fixture_migrations = [
+        (i['fields']['app_name'], i['fields']['migration'])
+            for i in fixture_contents if i['model'] == 'south.migrationhistory'
+    ]
 
     fixture_latest_migrations = defaultdict(unicode)
-    for app, migration in fixture_migrations.items():
+    for app, migration in fixture_migrations:
         latest_migration = fixture_latest_migrations[app]
         if latest_migration == '' or migration > latest_migration:
             fixture_latest_migrations[app] = migration
@@ -178,24 +164,68 @@ def get_latest_fixture_migrations(fixture_path):
     return fixture_latest_migrations
 
 
-def get_migration_paths_by_label(migration_labels):
-    """ @brief: Returns a dictionary keying \a migration_labels to paths for files for each
-            migration.
+def read_file_at_commit(file_path, commit):
+    """ @brief: Returns the contents of \a file_path as it was in \a commit.
         @author: Jivan
-        @since: 2014-04-21
+        @since: 2014-06-20
+        @raise IOError: If \a file_path doesn't exist in \a commit.
     """
-    migration_filenames = [ '{}.py'.format(m) for m in migration_labels ]
-    migration_paths_by_label = {}
-    for root, dirs, files in os.walk("/home/jivan/.projects/DeliveryHeroChina/"):      # *** Working directory should be setable explicitly.
-        # Skip hidden directories
-        dirs = [d for d in dirs if not d.startswith('.')]
-        # Limit files to migrations requested in \a migrations.
-        files = [f for f in files if f in migration_filenames ]
-        for file in files:
-            path = os.path.join(root, file)
-            migration_paths_by_label.update({file[:-3]: path})
+    return get_object_reader().read(commit, file_path)
+
 
-    return(migration_paths_by_label)
+def get_codebase_migrations():
+    """ @brief: Returns the South migrations available in the current codebase for each
+            installed app.
+        @author: Jivan
+        @since: 2014-06-09
+        @return: {<app_label>: [(<migration name>, <migration file path>), ...], ...} with each
+            app's migrations in the order South applies them.
+        @note: Migrations are listed from the files in the working tree, South isn't reloaded.
+            Apps outside the project root are listed from where they're installed.
+            @see migration_inventory.get_migration_inventory(),
+            migration_inventory.get_installed_app_migrations()
+    """
+    inventory = get_migration_inventory()
+    codebase_migrations = {}
+    for app_name in settings.INSTALLED_APPS:
+        app_label = app_name.split('.')[-1]
+        if app_label in inventory:
+            codebase_migrations[app_label] = inventory[app_label]
+        else:
+            migrations = get_installed_app_migrations(app_name)
+            if migrations:
+                codebase_migrations[app_label] = migrations
+    return codebase_migrations
+
+
+def get_pending_migrations(fixture_migrations, codebase_migrations):
+    """ @brief: Returns the migrations in \a codebase_migrations that haven't been applied to a
+            fixture whose latest migrations are \a fixture_migrations.
+        @author: Jivan
+        @since: 2014-06-09
+        @param fixture_migrations: {<app_label>: <latest migration>, ...}
+            @see get_latest_fixture_migrations()
+        @param codebase_migrations: @see get_codebase_migrations()
+        @return: [(<app_label>, <migration name>, <migration file path>), ...] in the order
+            South's forwards plan applies them, so depends_on/needed_by are honoured.
+            @see migration_plans.get_migration_plan()
+        @note: Apps without history in the fixture have all of their migrations pending.
+    """
+    paths = {}
+    for app_label, migrations in codebase_migrations.items():
+        latest = fixture_migrations.get(app_label, '')
+        paths.update(((app_label, name), path) for name, path in migrations if name > latest)
+    if not paths:
+        return []
+
+    pending = []
+    for app_label, name in get_migration_plan(fixture_migrations)['migrations']:
+        if (app_label, name) in paths:
+            pending.append((app_label, name, paths.pop((app_label, name))))
+    # Migrations South doesn't know about (Ex: an app it couldn't load) go last.
+    pending.extend((app_label, name, paths[(app_label, name)])
+                       for app_label, name in sorted(paths))
+    return pending
 
 
 def git_get_current_branch():
@@ -218,17 +248,18 @@ def git_get_current_branch():
 
 
 def git_checkout_commit(commit):
-    # --- Clean working directory (checkout won't work if previous checkout left untracked files)
-    cmd = ['git', 'clean', '-f', '-q']
-    cmd = ' '.join(cmd)
-    o = subprocess.check_output(cmd, shell=True)
-    logger.debug(o)
+    with span('git_checkout', commit=commit):
+        # --- Clean working directory (checkout won't work if previous checkout left untracked files)
+        cmd = ['git', 'clean', '-f', '-q']
+        cmd = ' '.join(cmd)
+        o = subprocess.check_output(cmd, shell=True)
+        logger.debug(o)
     
-    # --- Check out commit.
-    cmd = ['git', 'checkout', '--quiet', commit]
-    cmd = ' '.join(cmd)
-    o = subprocess.check_output(cmd, shell=True)
-    logger.debug(o)
+        # --- Check out commit.
+        cmd = ['git', 'checkout', '--quiet', commit]
+        cmd = ' '.join(cmd)
+        o = subprocess.check_output(cmd, shell=True)
+        logger.debug(o)
 
 
 def git_commit_all(msg='Autocommit: No message specified'):
@@ -236,10 +267,21 @@ def git_commit_all(msg='Autocommit: No message specified'):
         @author: Jivan
         @since: 2014-06-03
     """
-    cmd = ['git', 'commit', '-a', '-m', '"{}"'.format(msg)]
-    cmd = ' '.join(cmd)
-    o = subprocess.check_output(cmd, shell=True)
-    logger.debug(o)
+    with span('commit'):
+        cmd = ['git', 'commit', '-a', '-m', '"{}"'.format(msg)]
+        cmd = ' '.join(cmd)
+        o = subprocess.check_output(cmd, shell=True)
+        logger.debug(o)
+
+
+def git_commit_file(file_path, msg='Autocommit: No message specified'):
+    """ @brief: Commits the changes to \a file_path alone with message \a msg.
+        @author: Jivan
+        @since: 2014-06-18
+    """
+    with span('commit', fixture=file_path):
+        o = subprocess.check_output(['git', 'commit', '-m', msg, '--', file_path])
+        logger.debug(o)
 
 
 def pg_reset_db(dbname):
@@ -261,7 +303,8 @@ def reset_db(database=None, debug=False):
     
     # call_command() failed to correctly use 'noinput' argument, used command directly instead.
     from django_extensions.management.commands.reset_db import Command as ResetDBCommand
-    ResetDBCommand().execute(dbname=dbname, router=dbname, noinput=True, verbosity=verbosity)
+    with span('reset_db', database=database):
+        ResetDBCommand().execute(dbname=dbname, router=dbname, noinput=True, verbosity=verbosity)
 
 def sync_all(database=None, debug=False):
     """ @brief: Performs a django 'sync --all'  command on \a database.
@@ -272,21 +315,8 @@ def sync_all(database=None, debug=False):
     """
     if database is None:
         raise Exception('database is a required parameter')
-    SyncCommand().execute(migrate_all=True, migrate=False, verbosity=0, database=database)
-
-
-def clear_south_migration_caches():
-    """ @brief: Makes South look again at state of migrations on disk.
-        @author: Jivan
-        @since: 2014-05-23
-        This is important because we switch commits resulting in migrations changing.
-    """
-    # This South module caches the file names of migrations read from disk, so must be reloaded
-    #    since migrations change when we check out different commits.
-    reload(south.migration.base)
-    # This South module is somehow caching migration data resulting in the failure to
-    #    recognize all the migrations that need to be applied.
-    reload(south.migration)
+    with span('sync_all', database=database):
+        SyncCommand().execute(migrate_all=True, migrate=False, verbosity=0, database=database)
 
 
 def recreate_database(debug=False, postgres=False, database=None):
@@ -302,7 +332,6 @@ def recreate_database(debug=False, postgres=False, database=None):
     # This is necessary to prevent 'another session is using the database' errors due to lingering
     #    connections.
     django.db.close_connection()
-    clear_south_migration_caches()
 
     # --- Remove all tables from database.
     reset_db(database=database)
@@ -321,50 +350,69 @@ def fake_migrations(database=None):
     if database is None:
         database = 'origin'
 
-    # This South module caches the file names of migrations read from disk, so must be reloaded
-    #    since migrations change when we check out different commits.
-    reload(south.migration.base)
-    # This South module is somehow caching migration data resulting in the failure to
-    #    recognize all the migrations that need to be applied.
-    reload(south.migration)
-
     # --- Update South migration history to match current state of database.
     logger.debug('Executing migrate --fake')
-    call_command('migrate', database=database, fake=True, verbosity=0)
+    with span('migrate', database=database, fake=True):
+        call_command('migrate', database=database, fake=True, verbosity=0)
 
 
-def load_fixture(fixture_path, database=None):
+def load_fixture(fixture_path, database=None, bases=None):
+    """ @brief: Loads \a fixture_path into \a database, after its base fixtures.
+        @param bases: Plain json files of the rows of the fixture's base fixtures to load first,
+            by default they're read from the working tree.  @see fixture_dedupe
+    """
     if database is None:
         raise Exception('database is a required argument')
+    if bases is None:
+        bases = write_base_data(fixture_path)
+        try:
+            return load_fixture(fixture_path, database=database, bases=bases)
+        finally:
+            for base_path in bases:
+                os.remove(base_path)
+    for base_path in bases:
+        load_fixture(base_path, database=database, bases=[])
+
     ldc = LoadDataCommand()
+    # loaddata only understands plain json, other formats are loaded from a temporary copy.
+    load_path, is_temporary = as_plain_json(fixture_path)
     from cStringIO import StringIO
     original_stderr = sys.stderr
     sys.stderr = my_stderr = StringIO()
-    ldc.execute(fixture_path, database=database, verbosity=1)
-    sys.stderr = original_stderr
+    try:
+        with span('load_fixture', fixture=fixture_path, database=database,
+                  bytes=os.path.getsize(fixture_path)) as trace:
+            ldc.execute(load_path, database=database, verbosity=1)
+            trace['rows'] = getattr(ldc, 'loaded_object_count', None)
+    finally:
+        sys.stderr = original_stderr
+        if is_temporary:
+            os.remove(load_path)
     ret = my_stderr.getvalue()
     if 'Problem installing fixture' in ret:
         raise Exception(ret)
 
 
-def south_migrate(dblabel=None, app=None, target=None, fake=False, verbosity=0):
+def south_migrate(dblabel=None, app=None, target=None, fake=False, verbosity=0, plan=None):
     """ @brief: Migrate \a app to \a target if specified, or migrate all to
             latest migrations in codebase if not.
         @author: Jivan
         @since: 2014-04-30
+        @param plan: Apply this precomputed plan instead of having South work out what to migrate,
+            @see migration_plans.get_migration_plan()
     """
     if dblabel is None: raise Exception('Missing dblabel paramater')
     if bool(app) != bool(target): raise Exception('app & target must be used together')
+    if plan is not None and app: raise Exception('plan & app can not be used together')
     
     try:
         django.db.close_connection()
 
-        # This South module caches the file names of migrations read from disk, so must be reloaded
-        #    since migrations change when we check out different commits.
-        reload(south.migration.base)
-        # This South module is somehow caching migration data resulting in the failure to
-        #    recognize all the migrations that need to be applied.
-        reload(south.migration)
+        if plan is not None:
+            with span('migrate', database=dblabel, fake=fake,
+                      migrations=len(plan['migrations'])):
+                apply_migration_plan(plan, database=dblabel, fake=fake, verbosity=verbosity)
+            return
 
         # Shared migrate params.
         migrate_params = ['migrate']
@@ -378,11 +426,13 @@ def south_migrate(dblabel=None, app=None, target=None, fake=False, verbosity=0):
             # Additional migrate params for only doing an app migration.
             migrate_params.append(app)
             migrate_params.append(target)
-            call_command(*migrate_params)
+            with span('migrate', database=dblabel, app=app, target=target):
+                call_command(*migrate_params)
         else:
             # Additional migrate params for migrating all applications.
 #             migrate_params.update({'all_apps': True})
-            call_command(*migrate_params, **migrate_kw_params)
+            with span('migrate', database=dblabel, fake=fake):
+                call_command(*migrate_params, **migrate_kw_params)
 #         mc.execute(**migrate_params)
     except Exception as ex:
         msg = 'Error attempting to migrate database forward to latest migrations.  '\
@@ -392,98 +442,80 @@ def south_migrate(dblabel=None, app=None, target=None, fake=False, verbosity=0):
         raise Exception(msg)
 
 
-def dumpdata(database=None, fixture_path=None):
+def get_unordered_fields():
+    """ @brief: Returns the many-to-many field names of each installed model, keyed by the
+            model label used in fixtures.
+        @author: Jivan
+        @since: 2014-06-06
+        @return: {<app_label>.<model_name>: set([<m2m field name>, ...]), ...}
+    """
+    from django.db.models import get_models
+    unordered_fields = {}
+    for model in get_models(include_auto_created=True):
+        m2m_names = set(f.name for f in model._meta.many_to_many)
+        if m2m_names:
+            unordered_fields[unicode(model._meta)] = m2m_names
+    return unordered_fields
+
+
+def dumpdata(database=None, fixture_path=None, canonical=False):
     """ @brief: Dumps data from \a database to \a fixture_path.
         @since: 2014-05-29
         @author: Jivan
         If fixture_path isn't provided, dumps to stdout.
+        The format fixture_path is written in follows its extension (@see fixture_io).
+        @param canonical: Dump with a stable order of models, pks, keys and m2m lists so the
+            same data always produces the same file.  If the result is identical to the
+            existing contents of \a fixture_path the file is left untouched.
+        @return: True if \a fixture_path was written, False if it was left unchanged.
     """
     if database is None: raise Exception('dblabel is a required argument')
 
     ddc = DumpDataCommand()
 
     # If fixture_path has been specified, steal output from stdout.
-    if fixture_path:
+    if fixture_path or canonical:
         from cStringIO import StringIO
         old_stdout = sys.stdout
         sys.stdout = mystdout = StringIO()
 
     exclude = ['auth.permission', 'contenttypes']
-    ddc.execute(format='json', natural=True, exclude=exclude, indent=4, database=database)
-
-    # If fixture_path has been specified, dump the stolen output into it.
-    if fixture_path:
-        sys.stdout = old_stdout
-        with open(fixture_path, 'w') as f:
-            f.write(mystdout.getvalue())
-            f.write('\n')
-            mystdout.close()
-
-
-def reload_models():
-    import os
-    from django.db.models.loading import AppCache
-    cache = AppCache()
-    
-    curdir = os.getcwd()
-    
-    for app in cache.get_apps():
-        f = app.__file__
-        if f.startswith(curdir) and f.endswith('.pyc'):
-            os.remove(f)
-        __import__(app.__name__)
-        reload(app)
-    
-    from django.utils.datastructures import SortedDict
-    cache.app_store = SortedDict()
-    cache.app_models = SortedDict()
-    cache.app_errors = {}
-    cache.handled = {}
-    cache.loaded = False
+    try:
+        with span('dumpdata', fixture=fixture_path, database=database):
+            ddc.execute(format='json', natural=True, exclude=exclude, indent=4, database=database)
+    finally:
+        if fixture_path or canonical:
+            sys.stdout = old_stdout
+
+    written = True
+    if fixture_path or canonical:
+        dumped = mystdout.getvalue() + '\n'
+        mystdout.close()
+        if canonical:
+            with span('canonicalise', fixture=fixture_path):
+                dumped = canonical_fixture_text(
+                             json.loads(dumped), unordered_fields=get_unordered_fields())
+        if fixture_path:
+            # If fixture_path has been specified, dump the stolen output into it.
+            with span('write_fixture', fixture=fixture_path, bytes=len(dumped),
+                      rows=dumped.count('"model": ')) as trace:
+                written = write_fixture_text(fixture_path, dumped, skip_unchanged=canonical)
+                trace['written'] = written
+            if not written:
+                logger.info('Fixture unchanged, not rewriting: {}'.format(fixture_path))
+        else:
+            sys.stdout.write(dumped)
 
+    return written
 
-def clear_django_model_cache():
-    """ @brief: Sets the django model cache to reload model definitions & collects the current
-            settings.INSTALLED_APPS content.
-        @author: Jivan
-        @since: 2014-05-06
-    """
-    cache = django.db.models.loading.cache
-    cache.app_store = SortedDict()
-    cache.app_labels = {}
-#     cache.app_models = SortedDict()
-    cache.app_errors = {}
-    cache.loaded = False
-    cache.handled = {}
-    cache.postponed = []
-    cache.nesting_level = 0
-#     cache.write_lock = threading.RLock()
-    cache._get_models_cache = {}
-
-#     django.db.models.loading.cache.loaded = False
-#     django.db.models.loading.cache.handled = {}
-#     # *** Do we also need to clear cache.app_store?
-#     django.db.models.loading.cache.app_store = SortedDict()
-    from django.conf import settings
-    settings._wrapped = empty
-
-
-def clear_south_migration_cache():
-    """ @brief: Sets the south migration cache to re-check the filesystem for migrations.
-        @author: Jivan
-        @since: 2014-05-06
-    """
-    # This South module caches the file names of migrations read from disk, so must be reloaded
-    #    since migrations change when we check out different commits.
-    reload(south.migration.base)
-    # This South module is somehow caching migration data resulting in the failure to
-    #    recognize all the migrations that need to be applied.
-    reload(south.migration)
 
 def identify_and_check_out_last_modified_commit(fixture_path, debug=False, commit=None):
     """ @brief: identify comit \a fixture_path was last modified and check it out.
         @author: Jivan
         @since: 2014-05-07
+        @note: Models & migrations this process has already imported aren't reloaded, use the
+            checked out code from a fresh process (@see worker_pool.commit_zygote() to avoid
+            checking out at all).
     """
     load_commit = commit if commit else get_last_modified_commit(fixture_path)
 
@@ -491,8 +523,6 @@ def identify_and_check_out_last_modified_commit(fixture_path, debug=False, commi
     original_branch = git_get_current_branch()
 
     git_checkout_commit(load_commit)
-    clear_django_model_cache()
-    clear_south_migration_cache()
 
     if debug:
         stop = not query_yes_no("Checked out commit '{}', continue processing?".format(load_commit))
@@ -526,12 +556,31 @@ def check_out_branch(branch, debug=False):
     git_checkout_commit(branch)
 
 
-def migrate_and_dump(fixture_path, database='default', fake=False, debug=False):
+def migrate_and_dump(fixture_path, database='default', fake=False, debug=False,
+                     canonical=False, plan=None):
     """ @brief: Migrate database to latest migrations and dump to \a fixture_path.
         @author: Jivan
         @since: 2014-05-07
+        @param canonical: @see dumpdata()
+        @param plan: Apply this precomputed plan instead of running 'migrate',
+            @see migration_plans.get_migration_plan()
+        @return: True if \a fixture_path was rewritten, False if its contents were unchanged.
     """
-    call_command('migrate', database=database, fake=fake, verbosity=0)
+    # The scratch database may have been replaced since this process last connected to it.
+    django.db.close_connection()
+    if plan is None:
+        with span('migrate', fixture=fixture_path, database=database, fake=fake):
+            call_command('migrate', database=database, fake=fake, verbosity=0)
+    else:
+        logger.debug('Applying {} planned migrations, nothing to migrate for: {}'.format(
+                     len(plan['migrations']), ', '.join(plan['unchanged_apps']) or 'none'))
+        with span('migrate', fixture=fixture_path, database=database, fake=fake,
+                  migrations=len(plan['migrations'])):
+            apply_migration_plan(plan, database=database, fake=fake)
+    if not fake:
+        # The schema no longer matches the one the scratch database was prepared with.
+        from django_fixture_tools.scratch_db import clear_schema_fingerprint
+        clear_schema_fingerprint(database)
  
     if debug:
         stop = not query_yes_no("Migrated data to latest schema in original branch, continue processing?".format(original_branch))
@@ -539,7 +588,7 @@ def migrate_and_dump(fixture_path, database='default', fake=False, debug=False):
 
 #     logger.info("Sorry, you're going to have to dump the data back to fixture file yourself.")
     logger.info('Dumping migrated data back to fixture file.')
-    dumpdata(DEFAULTDB, fixture_path)
+    return dumpdata(DEFAULTDB, fixture_path, canonical=canonical)
     
 
 def migrate_fixture(fixture_path, dblabel=DEFAULTDB, commit_override=None, debug=False):
@@ -550,38 +599,20 @@ def migrate_fixture(fixture_path, dblabel=DEFAULTDB, commit_override=None, debug
         @param fixture_path: Path to the fixture file to migrate.
         @param commit_override: Use the state of models in this commit to load
             the data in \a fixture_path.  By default an appropriate commit will be guessed.
-        @param try_n_guesses: Try this number of commits to attempt loading the fixture before
-            giving up.
+        @note: @see fixture_migrator.migrate_fixtures.migrate_fixture()
     """
-    # Commit to use when loading the fixture.
-    if commit_override:
-        logger.info('Using commit {}.'.format(commit_override))
-        load_commit = commit_override
-    else:
-        c = get_last_modified_commit(fixture_path)
-        logger.info('Using commit when fixture was last modified: {}.'.format(c[:8]))
-        load_commit = c
-    
-    identify_and_check_out_last_modified_commit(fixture_path)
-    
-    create_compatible_db_and_load_fixture(fixture_path)
+    from django_fixture_tools.fixture_migrator.migrate_fixtures import migrate_fixture as \
+        migrate_fixture_at_commit
+    return migrate_fixture_at_commit(fixture_path, database=dblabel, load_commit=commit_override,
+                                     debug=debug)
 
-    # Restore the original branch
-    git_checkout_commit(original_branch)
-    clear_django_model_cache()
-    clear_south_migration_cache()
-
-    if debug:
-        stop = not query_yes_no("Returned to original branch '{}', continue processing?".format(original_branch))
-        if stop: exit()
- 
-    migrate_and_dump(fixture_path)
 
 def scan_filesystem_for_fixtures(top_dir, exclude_dirs=[], exclude_fixtures=[]):
     """ @brief: Recursively scans directory \a top_dir and returns the paths of fixtures found.
         @author: Jivan
         @since: 2014-04-21
-        @note: Fixtures will be identified as a file ending in '.json' existing beneath
+        @note: Fixtures will be identified as a file ending in one of
+            fixture_io.FIXTURE_EXTENSIONS ('.json', '.jsonl.gz', ...) existing beneath
             a directory with 'fixture' in its name.
         @note: Skips hidden directories (those starting with '.')
         @note: Skips files contained in \a exclude_dirs
@@ -594,7 +625,7 @@ def scan_filesystem_for_fixtures(top_dir, exclude_dirs=[], exclude_fixtures=[]):
         if 'fixture' in root:
             new_fixture_files = [
                 os.path.join(root, f)
-                    for f in files if f.endswith('.json') and f not in exclude_fixtures
+                    for f in files if is_fixture_filename(f) and f not in exclude_fixtures
             ]
             fixture_files.extend(new_fixture_files)
     return fixture_files
@@ -633,15 +664,21 @@ if __name__ == '__main__':
         fixture_path = sys.argv[2]
         original_branch = identify_and_check_out_last_modified_commit(fixture_path, debug=debug)
         print(original_branch)
-    elif len(sys.argv) == 3 and sys.argv[1] == 'load_fixture':
+    elif len(sys.argv) in (3, 4) and sys.argv[1] == 'load_fixture':
+        # Empties the scratch database & loads the fixture with the models of the current
+        #    directory's code, @see worker_pool.commit_zygote()
+        from django_fixture_tools.scratch_db import prepare_scratch_db
         fixture_path = sys.argv[2]
-        create_compatible_db_and_load_fixture(fixture_path, debug=debug)
+        database = sys.argv[3] if len(sys.argv) == 4 else 'fixture_tools_db'
+        prepare_scratch_db(database, debug=debug)
+        load_fixture(fixture_path, database=database)
     elif len(sys.argv) == 3 and sys.argv[1] == 'check_out_branch':
         branch = sys.argv[2]
         check_out_branch(branch, debug=debug)
-    elif len(sys.argv) == 3 and sys.argv[1] == 'migrate_and_dump':
+    elif len(sys.argv) in (3, 4) and sys.argv[1] == 'migrate_and_dump':
         fixture_path = sys.argv[2]
-        migrate_and_dump(fixture_path, debug=debug)
+        canonical = sys.argv[3:] == ['canonical']
+        migrate_and_dump(fixture_path, debug=debug, canonical=canonical)
     elif len(sys.argv) == 2:
         fixture_path = sys.argv[1]
         print('Migrating fixture: {}'.format(fixture_path))
@@ -0,0 +1,17 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of the fixture tools' logic that doesn't need a scratch database.
+
+Usage:
+    From the directory containing django_fixture_tools:
+    python -m unittest discover -s django_fixture_tools/tests -t .
+    Tests needing Django use the settings in tests/settings.py, an in-memory SQLite database
+    & the apps in tests/ (shop & stock).
+"""
+import logging
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_fixture_tools.tests.settings')
+# The tools' warnings are expected in some tests.
+logging.getLogger('django_fixture_tools').addHandler(logging.NullHandler())
@@ -0,0 +1,33 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Django settings for the tests.
+"""
+import os
+import tempfile
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+DATABASES['fixture_tools_db'] = DATABASES['default']
+# A scratch database in a file, which SQLite snapshots need.
+DATABASES['scratch'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': os.path.join(tempfile.gettempdir(), 'fixture_tools_tests', 'scratch.sqlite3'),
+}
+
+INSTALLED_APPS = (
+    'django.contrib.contenttypes',
+    'django.contrib.auth',
+    'south',
+    'django_fixture_tools.tests.shop',
+    'django_fixture_tools.tests.stock',
+)
+
+SECRET_KEY = 'fixture_tools_tests'
+
+FIXTURE_TOOLS_PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_TOOLS_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'fixture_tools_tests')
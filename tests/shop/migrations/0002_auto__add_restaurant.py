@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from south.db import db
+from south.v2 import SchemaMigration
+
+
+class Migration(SchemaMigration):
+
+    # Only so the tests have a dependency between apps to order by.
+    depends_on = (
+        ('stock', '0002_auto__add_field_item_size'),
+    )
+
+    def forwards(self, orm):
+        db.create_table(u'shop_restaurant', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('name', self.gf('django.db.models.fields.CharField')(max_length=100)),
+            ('city', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['shop.City'], to_field='name')),
+        ))
+        db.send_create_signal(u'shop', ['Restaurant'])
+
+    def backwards(self, orm):
+        db.delete_table(u'shop_restaurant')
+
+    models = {
+        u'shop.city': {
+            'Meta': {'object_name': 'City'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '100'})
+        },
+        u'shop.restaurant': {
+            'Meta': {'object_name': 'Restaurant'},
+            'city': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['shop.City']", 'to_field': "'name'"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        }
+    }
+
+    complete_apps = ['shop']
@@ -0,0 +1,11 @@
+from django.db import models
+
+
+class City(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+
+
+class Restaurant(models.Model):
+    name = models.CharField(max_length=100)
+    # By name, so fixtures have a reference that isn't to a pk.
+    city = models.ForeignKey(City, to_field='name')
@@ -0,0 +1,99 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Smoke tests of the benchmark's project generation & reports, which need no database.
+    Running the tools on the project is left to the benchmark itself.
+"""
+import os
+import shutil
+from subprocess import check_output
+import tempfile
+import unittest
+
+import simplejson as json
+
+from django_fixture_tools.benchmark import generate_project, add_migrations, phase_totals,\
+    describe_run, BASE_FIELDS, PROJECT_PACKAGE
+from django_fixture_tools.tracing import FIXTURE_SPAN
+
+
+class GenerateProjectTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.repo_dir = os.path.join(self.tmp, 'repo')
+        os.mkdir(self.repo_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def git(self, *args):
+        return check_output(['git'] + list(args), cwd=self.repo_dir).strip()
+
+    def compile_python(self, path):
+        with open(os.path.join(self.repo_dir, path)) as f:
+            compile(f.read(), path, 'exec')
+
+    def test_generate_project(self):
+        app_labels = generate_project(self.repo_dir, os.path.join(self.tmp, 'cache'), 2, 3, 4)
+        self.assertEqual(app_labels, ['app_0', 'app_1'])
+        self.assertEqual(self.git('status', '--porcelain'), '')
+        files = self.git('ls-files').split()
+        self.compile_python(os.path.join(PROJECT_PACKAGE, 'settings.py'))
+        for app in app_labels:
+            self.compile_python(os.path.join(app, 'models.py'))
+            self.compile_python(os.path.join(app, 'migrations', '0001_initial.py'))
+            fixtures = sorted(f for f in files if f.startswith('{}/fixtures/'.format(app)))
+            self.assertEqual(len(fixtures), 3)
+            with open(os.path.join(self.repo_dir, fixtures[0])) as ff:
+                objects = json.load(ff)
+            self.assertEqual([o['pk'] for o in objects], [1, 2, 3, 4])
+            self.assertEqual(set(o['model'] for o in objects), set(['{}.item'.format(app)]))
+
+    def test_add_migrations(self):
+        app_labels = generate_project(self.repo_dir, os.path.join(self.tmp, 'cache'), 1, 1, 1)
+        fields = add_migrations(self.repo_dir, app_labels, 1, BASE_FIELDS)
+        self.assertEqual([f[0] for f in fields], ['name', 'value', 'extra_1'])
+        # Data migrations leave the models alone.
+        self.assertEqual(add_migrations(self.repo_dir, app_labels, 2, fields, data=True), fields)
+        self.assertEqual(len(self.git('log', '--format=%H').split()), 3)
+        migrations = sorted(os.listdir(os.path.join(self.repo_dir, 'app_0', 'migrations')))
+        self.assertEqual([m for m in migrations if m.endswith('.py')], [
+            '0001_initial.py', '0002_add_extra_1.py', '0003_bump_values_2.py', '__init__.py'])
+        for m in migrations:
+            if m.endswith('.py'):
+                self.compile_python(os.path.join('app_0', 'migrations', m))
+        with open(os.path.join(self.repo_dir, 'app_0', 'models.py')) as mf:
+            self.assertIn('extra_1 = models.IntegerField(default=0)', mf.read())
+
+
+class ReportTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_phase_totals(self):
+        trace_path = os.path.join(self.tmp, 'migrate.trace.json')
+        with open(os.path.join(self.tmp, 'migrate.trace.spans.json'), 'w') as sf:
+            json.dump([
+                {'name': FIXTURE_SPAN, 'duration': 9.0},
+                {'name': 'load', 'duration': 1.5},
+                {'name': 'load', 'duration': 2.5},
+                {'name': 'dump', 'duration': 1.0},
+            ], sf)
+        self.assertEqual(phase_totals(trace_path), {'load': (2, 4.0), 'dump': (1, 1.0)})
+
+    def test_describe_run(self):
+        report = describe_run('migrate_all_fixtures', 6, 12.0,
+                              {'load': (2, 4.0), 'dump': (1, 1.0)})
+        lines = report.split('\n')
+        self.assertEqual(lines[0], 'migrate_all_fixtures: 6 fixtures in 12.0s, 30.0 fixtures/min')
+        self.assertEqual([l.split() for l in lines[1:]], [
+            ['load', '2', '4.00s', '33.3%'],
+            ['dump', '1', '1.00s', '8.3%'],
+        ])
+
+    def test_describe_instant_run(self):
+        self.assertEqual(describe_run('initialize_all_fixtures', 0, 0, {}),
+                         'initialize_all_fixtures: 0 fixtures in 0.0s, 0.0 fixtures/min')
@@ -0,0 +1,44 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of fixture_io's canonical dump order.
+"""
+import unittest
+
+from django_fixture_tools.fixture_io import canonicalize_fixture_objects, canonical_fixture_text
+
+
+class CanonicalizeTest(unittest.TestCase):
+    def objects(self):
+        return [
+            {'model': 'b.tag', 'pk': 10, 'fields': {}},
+            {'model': 'a.item', 'pk': 'x', 'fields': {'tags': [3, 1, 2]}},
+            {'model': 'b.tag', 'pk': 9, 'fields': {}},
+            {'model': 'a.item', 'pk': 2, 'fields': {'tags': [2, 1]}},
+            {'model': 'a.item', 'pk': 10, 'fields': {'tags': None}},
+        ]
+
+    def test_models_keep_first_appearance_and_pks_sort(self):
+        objects = canonicalize_fixture_objects(self.objects())
+        self.assertEqual([(o['model'], o['pk']) for o in objects],
+                         [('b.tag', 9), ('b.tag', 10),
+                          ('a.item', 2), ('a.item', 10), ('a.item', 'x')])
+
+    def test_unordered_fields_are_sorted(self):
+        objects = canonicalize_fixture_objects(self.objects(),
+                                               unordered_fields={'a.item': set(['tags'])})
+        self.assertEqual([o['fields'].get('tags') for o in objects if o['model'] == 'a.item'],
+                         [[1, 2], None, [1, 2, 3]])
+
+    def test_other_fields_keep_their_order(self):
+        objects = canonicalize_fixture_objects(self.objects())
+        self.assertEqual(objects[-1]['fields']['tags'], [3, 1, 2])
+
+    def test_text_is_independent_of_input_order(self):
+        unordered = {'a.item': set(['tags'])}
+        text = canonical_fixture_text(self.objects(), unordered)
+        shuffled = self.objects()
+        shuffled.insert(1, shuffled.pop(3))
+        shuffled[1]['fields']['tags'].reverse()
+        self.assertEqual(canonical_fixture_text(shuffled, unordered), text)
+        self.assertTrue(text.endswith('\n'))
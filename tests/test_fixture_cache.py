@@ -0,0 +1,159 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of compiled fixture artifacts' blocks, as written & read back, and of compiling
+    fixtures through the SQLite file scratch database & loading them back.
+"""
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from django.db import connections
+from django.test.utils import override_settings
+
+import simplejson as json
+
+from django_fixture_tools import fixture_cache
+from django_fixture_tools.fixture_cache import _header_line, _read_blocks, _write_sqlite,\
+    _load_sqlite, compile_fixture, find_compiled_fixture, load_compiled_fixture, HEADER_PREFIX,\
+    COPY_END
+from django_fixture_tools.fixture_io import write_fixture
+from django_fixture_tools.shared import load_fixture
+from django_fixture_tools.tests.test_scratch_db import ScratchDbTestCase, SCRATCH
+
+
+CITY = {'model': 'shop.city', 'table': 'shop_city', 'columns': ['id', 'name'], 'key': 'id'}
+
+
+class ArtifactBlocksTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_header_line(self):
+        line = _header_line(dict(CITY, keys=[1, 2]))
+        self.assertTrue(line.startswith(HEADER_PREFIX))
+        self.assertTrue(line.endswith(u'\n'))
+        # The keys aren't needed to load the block.
+        self.assertEqual(json.loads(line[len(HEADER_PREFIX):]), CITY)
+
+    def test_copy_blocks(self):
+        path = os.path.join(self.tmp, 'artifact.copy')
+        with io.open(path, 'wb') as af:
+            af.write(_header_line(dict(CITY, keys=[1, 2])).encode('utf-8'))
+            af.write(b'1\tLima\n2\tQuito\n')
+            af.write(COPY_END)
+            af.write(_header_line(dict(CITY, table='shop_town', keys=[])).encode('utf-8'))
+            af.write(COPY_END)
+        self.assertEqual(list(_read_blocks(path)),
+                         [(CITY, [b'1\tLima\n', b'2\tQuito\n']),
+                          (dict(CITY, table='shop_town'), [])])
+
+    def test_sql_blocks(self):
+        path = os.path.join(self.tmp, 'artifact.sql')
+        with io.open(path, 'w', encoding='utf-8') as af:
+            af.write(_header_line(dict(CITY, keys=[1])))
+            af.write(u'DELETE FROM "shop_city" WHERE "id" IN (1);\n')
+            # A value over several lines, one looking like a header.
+            af.write(u'INSERT INTO "shop_city" ("id", "name") VALUES (1, \'Lima\n')
+            af.write(u'{}{{}};\n\');\n'.format(HEADER_PREFIX))
+            af.write(_header_line(dict(CITY, table='shop_town', keys=[])))
+        self.assertEqual(list(_read_blocks(path)), [
+            (CITY, [u'DELETE FROM "shop_city" WHERE "id" IN (1);\n',
+                    u'INSERT INTO "shop_city" ("id", "name") VALUES (1, \'Lima\n'
+                    u'{}{{}};\n\');\n'.format(HEADER_PREFIX)]),
+            (dict(CITY, table='shop_town'), [])])
+
+
+class SqliteArtifactTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cursor = connections['default'].cursor()
+        self.cursor.execute('CREATE TABLE shop_city (id integer PRIMARY KEY, name text)')
+
+    def tearDown(self):
+        self.cursor.execute('DROP TABLE shop_city')
+        shutil.rmtree(self.tmp)
+
+    def rows(self):
+        self.cursor.execute('SELECT id, name FROM shop_city ORDER BY id')
+        return [tuple(row) for row in self.cursor.fetchall()]
+
+    def test_round_trip(self):
+        names = [u'Lima', u"O'Higgins\n{}x".format(HEADER_PREFIX), u'Quito']
+        for i, name in enumerate(names):
+            self.cursor.execute('INSERT INTO shop_city (id, name) VALUES (%s, %s)', [i + 1, name])
+        path = os.path.join(self.tmp, 'artifact.sql')
+        with io.open(path, 'w', encoding='utf-8') as af:
+            _write_sqlite('default', [dict(CITY, keys=[1, 2])], af)
+
+        self.cursor.execute('UPDATE shop_city SET name = %s', ['changed'])
+        for header, lines in _read_blocks(path):
+            self.assertEqual(header, CITY)
+            _load_sqlite('default', header, lines)
+        self.assertEqual(self.rows(), [(1, names[0]), (2, names[1]), (3, u'changed')])
+
+
+class CompiledFixtureTest(ScratchDbTestCase):
+    def setUp(self):
+        super(CompiledFixtureTest, self).setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.settings = override_settings(
+                            FIXTURE_TOOLS_COMPILED_DIR=os.path.join(self.tmp, 'compiled'))
+        self.settings.enable()
+        self.schema_files = fixture_cache._schema_files
+        self.fixture = os.path.join(self.tmp, 'fixture.json')
+        write_fixture(self.fixture, [
+            {'model': 'shop.city', 'pk': 1, 'fields': {'name': 'Lima'}},
+            {'model': 'shop.city', 'pk': 2, 'fields': {'name': u"O'Higgins\n-- {}"}},
+            {'model': 'shop.restaurant', 'pk': 1, 'fields': {'name': 'Pizza', 'city': 'Lima'}},
+            {'model': 'shop.restaurant', 'pk': 3, 'fields': {'name': '100%s', 'city': 'Lima'}},
+            {'model': 'stock.item', 'pk': 7, 'fields': {'name': 'Chair', 'size': 2}},
+        ])
+
+    def tearDown(self):
+        fixture_cache._schema_files = self.schema_files
+        self.settings.disable()
+        shutil.rmtree(self.tmp)
+        super(CompiledFixtureTest, self).tearDown()
+
+    def rows(self):
+        return dict((table, self.execute('SELECT * FROM {} ORDER BY id'.format(table)))
+                        for table in ('shop_city', 'shop_restaurant', 'stock_item'))
+
+    def test_round_trip(self):
+        path = compile_fixture(self.fixture, database=SCRATCH)
+        self.assertTrue(path.endswith('.sql'))
+        self.assertEqual(find_compiled_fixture(self.fixture, SCRATCH), path)
+
+        self.prepare()
+        load_fixture(self.fixture, database=SCRATCH, bases=[])
+        loaded = self.rows()
+        self.assertEqual(len(loaded['shop_restaurant']), 2)
+
+        self.prepare()
+        self.assertTrue(load_compiled_fixture(self.fixture, database=SCRATCH))
+        self.assertEqual(self.rows(), loaded)
+
+    def test_changed_schema(self):
+        compile_fixture(self.fixture, database=SCRATCH)
+        migration = os.path.join(self.tmp, '0003_auto__add_field_city_size.py')
+        with open(migration, 'w') as mf:
+            mf.write('class Migration(object):\n    pass\n')
+        # A new migration of one of the fixture's apps.
+        fixture_cache._schema_files = lambda app_name: self.schema_files(app_name) + (
+                                          [migration] if app_name.endswith('.shop') else [])
+        self.assertEqual(find_compiled_fixture(self.fixture, SCRATCH), None)
+
+        self.prepare()
+        self.assertFalse(load_compiled_fixture(self.fixture, database=SCRATCH))
+        self.assertEqual(len(self.rows()['shop_city']), 2)
+
+    def test_changed_fixture(self):
+        compile_fixture(self.fixture, database=SCRATCH)
+        write_fixture(self.fixture, [{'model': 'shop.city', 'pk': 1, 'fields': {'name': 'Quito'}}])
+        self.assertEqual(find_compiled_fixture(self.fixture, SCRATCH), None)
@@ -0,0 +1,162 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of sharing fixtures' repeated rows through base fixtures, against the models in
+    tests/.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import simplejson as json
+
+from django_fixture_tools.fixture_dedupe import get_reference_fields, row_references,\
+    plan_bases, row_hash, strip_base_rows, get_fixture_bases, dedupe_fixtures, write_base_data,\
+    BASES_SUFFIX
+from django_fixture_tools.fixture_io import read_fixture, write_fixture
+
+
+HISTORY = {'model': 'south.migrationhistory', 'pk': 1,
+           'fields': {'app_name': 'shop', 'migration': '0002_auto__add_restaurant',
+                      'applied': '2014-07-06T00:00:00'}}
+
+
+def city(pk, name):
+    return {'model': 'shop.city', 'pk': pk, 'fields': {'name': name}}
+
+
+def restaurant(pk, name, city_name):
+    return {'model': 'shop.restaurant', 'pk': pk, 'fields': {'name': name, 'city': city_name}}
+
+
+class ReferenceFieldsTest(unittest.TestCase):
+    def test_reference_fields(self):
+        reference_fields = get_reference_fields()
+        self.assertEqual(reference_fields['shop.restaurant'],
+                         ({'city': ('shop.city', False, 'name')}, []))
+        fields, parents = reference_fields['auth.permission']
+        self.assertEqual(fields['content_type'], ('contenttypes.contenttype', False, None))
+        fields, parents = reference_fields['auth.user']
+        self.assertEqual(fields['groups'], ('auth.group', True, None))
+        self.assertFalse('shop.city' in reference_fields)
+
+    def test_row_references(self):
+        reference_fields = get_reference_fields()
+        self.assertEqual(row_references(restaurant(1, 'Pizza', 'Lima'), reference_fields),
+                         [('shop.city', 'name', 'Lima', False)])
+        user = {'model': 'auth.user', 'pk': 1, 'fields': {'groups': [1, 2]}}
+        self.assertEqual(sorted(row_references(user, reference_fields)),
+                         [('auth.group', None, 1, False), ('auth.group', None, 2, False)])
+
+
+class PlanBasesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def fixture(self, name, *objects):
+        path = os.path.join(self.tmp, name)
+        write_fixture(path, [HISTORY] + list(objects))
+        return path
+
+    def test_shared_rows(self):
+        a = self.fixture('a.json', city(1, 'Lima'), restaurant(1, 'Pizza', 'Lima'),
+                         restaurant(2, 'Tacos', 'Lima'))
+        b = self.fixture('b.json', city(1, 'Lima'), restaurant(1, 'Pizza', 'Lima'))
+        (fixtures, hashes), = plan_bases([a, b])
+        self.assertEqual(fixtures, [a, b])
+        self.assertEqual(hashes, set([row_hash(city(1, 'Lima')),
+                                      row_hash(restaurant(1, 'Pizza', 'Lima'))]))
+
+    def test_referenced_field_not_shared(self):
+        # The restaurants are the same, but not the cities they reference by name.
+        a = self.fixture('a.json', city(1, 'Lima'), restaurant(1, 'Pizza', 'Lima'))
+        b = self.fixture('b.json', city(2, 'Lima'), restaurant(1, 'Pizza', 'Lima'))
+        self.assertEqual(plan_bases([a, b]), [])
+
+    def test_referenced_row_not_in_fixtures(self):
+        a = self.fixture('a.json', restaurant(1, 'Pizza', 'Lima'), city(2, 'Quito'))
+        b = self.fixture('b.json', restaurant(1, 'Pizza', 'Lima'))
+        (fixtures, hashes), = plan_bases([a, b])
+        self.assertEqual(hashes, set([row_hash(restaurant(1, 'Pizza', 'Lima'))]))
+
+    def test_different_heads(self):
+        a = self.fixture('a.json', city(1, 'Lima'))
+        b = os.path.join(self.tmp, 'b.json')
+        write_fixture(b, [city(1, 'Lima')])
+        self.assertEqual(plan_bases([a, b]), [])
+
+    def test_min_fixtures(self):
+        a = self.fixture('a.json', city(1, 'Lima'))
+        b = self.fixture('b.json', city(1, 'Lima'))
+        self.assertEqual(plan_bases([a, b], min_fixtures=3), [])
+
+
+class DedupeFixturesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.base_dir = os.path.join(self.tmp, 'bases')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def fixture(self, name, *objects):
+        path = os.path.join(self.tmp, name)
+        write_fixture(path, [HISTORY] + list(objects))
+        return path
+
+    def test_base_format(self):
+        # The base takes the format of the first fixture of its group.
+        a = self.fixture('a.jsonl.gz', city(1, 'Lima'), restaurant(1, 'Pizza', 'Lima'))
+        b = self.fixture('b.json', city(1, 'Lima'))
+        self.assertEqual(dedupe_fixtures([a, b], self.base_dir),
+                         {'bases': 1, 'rows': 2, 'fixtures': 2})
+        base, = os.listdir(self.base_dir)
+        self.assertTrue(base.endswith('.jsonl.gz'))
+        base_path = os.path.join(self.base_dir, base)
+        self.assertEqual(read_fixture(base_path), [HISTORY, city(1, 'Lima')])
+        self.assertEqual(get_fixture_bases(a), [base_path])
+        self.assertEqual(get_fixture_bases(b), [base_path])
+        self.assertEqual(read_fixture(a), [HISTORY, restaurant(1, 'Pizza', 'Lima')])
+        self.assertEqual(read_fixture(b), [HISTORY])
+
+        # Loaded from a plain json copy, without its history.
+        copy, = write_base_data(a)
+        try:
+            self.assertTrue(copy.endswith('.json'))
+            self.assertEqual(read_fixture(copy), [city(1, 'Lima')])
+        finally:
+            os.remove(copy)
+
+
+class StripBaseRowsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tmp, 'bases'))
+        self.base = os.path.join(self.tmp, 'bases', 'base.json')
+        write_fixture(self.base, [HISTORY, city(1, 'Lima')])
+        self.fixture = os.path.join(self.tmp, 'fixture.json')
+        with open(self.fixture + BASES_SUFFIX, 'w') as bf:
+            json.dump([os.path.join('bases', 'base.json')], bf)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_bases(self):
+        self.assertEqual(get_fixture_bases(self.fixture), [self.base])
+
+    def test_strip_base_rows(self):
+        # As dumped from a database the base was loaded into.
+        write_fixture(self.fixture, [city(1, 'Lima'), restaurant(1, 'Pizza', 'Lima'), HISTORY])
+        self.assertEqual(strip_base_rows(self.fixture), 1)
+        self.assertEqual(read_fixture(self.fixture),
+                         [restaurant(1, 'Pizza', 'Lima'), HISTORY])
+
+    def test_without_bases(self):
+        os.remove(self.fixture + BASES_SUFFIX)
+        write_fixture(self.fixture, [city(1, 'Lima')])
+        self.assertEqual(strip_base_rows(self.fixture), 0)
+        self.assertEqual(read_fixture(self.fixture), [city(1, 'Lima')])
@@ -0,0 +1,98 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of fixture_io's format detection, readers & writers.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from django_fixture_tools.fixture_io import get_fixture_format, is_fixture_filename,\
+    read_fixture, write_fixture, write_fixture_text, read_fixture_text, parse_fixture_data,\
+    iter_fixture_objects, convert_fixture, as_plain_json, lzma
+
+
+OBJECTS = [
+    {'model': 'restaurants.city', 'pk': 1, 'fields': {'name': u'Z\xfcrich'}},
+    {'model': 'restaurants.restaurant', 'pk': 2, 'fields': {'name': 'Pizza', 'city': 1}},
+    {'model': 'restaurants.restaurant', 'pk': 3, 'fields': {'name': 'Tacos', 'city': 1}},
+]
+
+
+class FixtureFormatTest(unittest.TestCase):
+    def test_formats(self):
+        self.assertEqual(get_fixture_format('a/b.json'), ('json', None))
+        self.assertEqual(get_fixture_format('a/b.jsonl.gz'), ('jsonl', 'gz'))
+        self.assertEqual(get_fixture_format('b.json.xz'), ('json', 'xz'))
+        self.assertRaises(ValueError, get_fixture_format, 'b.yaml')
+        self.assertRaises(ValueError, get_fixture_format, 'b.gz')
+
+    def test_is_fixture_filename(self):
+        self.assertTrue(is_fixture_filename('b.jsonl.xz'))
+        self.assertFalse(is_fixture_filename('b.json.bases'))
+
+
+class FixtureRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def test_round_trip(self):
+        extensions = ['json', 'json.gz', 'jsonl', 'jsonl.gz']
+        if lzma is not None:
+            extensions += ['json.xz', 'jsonl.xz']
+        for ext in extensions:
+            path = self.path('fixture.{}'.format(ext))
+            write_fixture(path, iter(OBJECTS))
+            self.assertEqual(read_fixture(path), OBJECTS, ext)
+            with open(path, 'rb') as f:
+                self.assertEqual(parse_fixture_data(f.read(), path), OBJECTS, ext)
+
+    def test_jsonl_is_one_object_per_line(self):
+        path = self.path('fixture.jsonl')
+        write_fixture(path, OBJECTS)
+        with open(path) as f:
+            self.assertEqual(len(f.read().splitlines()), len(OBJECTS))
+
+    def test_contains_only_filters_jsonl(self):
+        path = self.path('fixture.jsonl')
+        write_fixture(path, OBJECTS)
+        rows = list(iter_fixture_objects(path, contains='restaurants.city'))
+        self.assertEqual(rows, OBJECTS[:1])
+
+    def test_ordered_keeps_key_order(self):
+        path = self.path('fixture.json')
+        with open(path, 'w') as f:
+            f.write('[{"pk": 1, "model": "a.b", "fields": {"z": 1, "a": 2}}]')
+        obj = read_fixture(path, ordered=True)[0]
+        self.assertEqual(list(obj.keys()), ['pk', 'model', 'fields'])
+        self.assertEqual(list(obj['fields'].keys()), ['z', 'a'])
+
+    def test_write_fixture_text_skip_unchanged(self):
+        path = self.path('fixture.jsonl.gz')
+        text = '[{"model": "a.b", "pk": 1, "fields": {}}]'
+        self.assertTrue(write_fixture_text(path, text))
+        self.assertEqual(read_fixture_text(path), '{"model": "a.b", "pk": 1, "fields": {}}\n')
+        self.assertFalse(write_fixture_text(path, text, skip_unchanged=True))
+        self.assertTrue(write_fixture_text(path, text.replace('1', '2'), skip_unchanged=True))
+
+    def test_convert_and_plain_copy(self):
+        src = self.path('fixture.jsonl.gz')
+        dest = self.path('fixture.json')
+        write_fixture(src, OBJECTS)
+        convert_fixture(src, dest)
+        self.assertEqual(read_fixture(dest), OBJECTS)
+
+        self.assertEqual(as_plain_json(dest), (dest, False))
+        plain_path, is_temporary = as_plain_json(src)
+        try:
+            self.assertTrue(is_temporary)
+            self.assertEqual(read_fixture(plain_path), OBJECTS)
+        finally:
+            os.remove(plain_path)
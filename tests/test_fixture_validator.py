@@ -0,0 +1,152 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of checking fixtures' references without a database, against the models in
+    tests/.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import simplejson as json
+
+from django_fixture_tools import fixture_validator
+from django_fixture_tools.fixture_dedupe import BASES_SUFFIX
+from django_fixture_tools.fixture_io import write_fixture
+from django_fixture_tools.fixture_validator import validate_fixture, validate_fixtures
+from django_fixture_tools.fixture_migrator.migrate_fixtures import\
+    find_invalid_fixtures_at_commit
+from django_fixture_tools.worker_pool import JOBS
+
+
+def city(pk, name):
+    return {'model': 'shop.city', 'pk': pk, 'fields': {'name': name}}
+
+
+def restaurant(pk, name, city_name):
+    return {'model': 'shop.restaurant', 'pk': pk, 'fields': {'name': name, 'city': city_name}}
+
+
+def user(pk, groups):
+    return {'model': 'auth.user', 'pk': pk,
+            'fields': {'username': 'user{}'.format(pk), 'groups': groups,
+                       'user_permissions': []}}
+
+
+def group(pk):
+    return {'model': 'auth.group', 'pk': pk, 'fields': {'name': 'group{}'.format(pk)}}
+
+
+class ValidateFixtureTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.fixture = os.path.join(self.tmp, 'fixture.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def validate(self, *objects):
+        write_fixture(self.fixture, objects)
+        return validate_fixture(self.fixture)
+
+    def test_valid(self):
+        report = self.validate(city(1, 'Lima'), restaurant(1, 'Pizza', 'Lima'),
+                               group(1), user(1, [1]))
+        self.assertEqual(report, {'fixture': self.fixture, 'rows': 4, 'missing': 0,
+                                  'examples': []})
+
+    def test_missing_to_field_reference(self):
+        # Quito's pk is there, but restaurants reference cities by name.
+        report = self.validate(city(1, 'Lima'), city(2, 'Quito'),
+                               restaurant(1, 'Pizza', 'Lima'), restaurant(2, 'Tacos', 1))
+        self.assertEqual(report['missing'], 1)
+        self.assertEqual(report['examples'],
+                         [['shop.restaurant', 2, 'city', 'shop.city', 1]])
+
+    def test_missing_many_to_many_reference(self):
+        report = self.validate(group(1), user(1, [1, 2]))
+        self.assertEqual(report['examples'], [['auth.user', 1, 'groups', 'auth.group', 2]])
+
+    def test_natural_keys(self):
+        permission = {'model': 'auth.permission', 'pk': 1,
+                      'fields': {'codename': 'add_city', 'name': 'Can add city',
+                                 'content_type': ['shop', 'city']}}
+        report = self.validate(group(1), user(1, [['group1'], ['group2']]),
+                               permission)
+        # Groups' natural keys are their names, content types are provided by the database.
+        self.assertEqual(report['examples'],
+                         [['auth.user', 1, 'groups', 'auth.group', ['group2']]])
+
+    def test_external_models(self):
+        write_fixture(self.fixture, [restaurant(1, 'Pizza', 'Lima')])
+        self.assertEqual(validate_fixture(self.fixture)['missing'], 1)
+        self.assertEqual(validate_fixture(self.fixture,
+                                          external_models=('shop.city',))['missing'], 0)
+
+    def test_base_fixtures(self):
+        base = os.path.join(self.tmp, 'base.json')
+        write_fixture(base, [city(1, 'Lima')])
+        with open(self.fixture + BASES_SUFFIX, 'w') as bf:
+            json.dump(['base.json'], bf)
+        report = self.validate(restaurant(1, 'Pizza', 'Lima'))
+        self.assertEqual((report['rows'], report['missing']), (2, 0))
+
+    def test_unreadable(self):
+        with open(self.fixture, 'w') as ff:
+            ff.write('[{"model": ')
+        report, = validate_fixtures([self.fixture], jobs=1)
+        self.assertTrue('error' in report)
+
+
+class StubZygote(object):
+    def __init__(self, error=None):
+        self.error = error
+
+    def run(self, job, **kwargs):
+        if self.error:
+            raise self.error
+        return JOBS[job](**kwargs)
+
+
+class InvalidFixturesAtCommitTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.valid = os.path.join(self.tmp, 'valid.json')
+        write_fixture(self.valid, [city(1, 'Lima'), restaurant(1, 'Pizza', 'Lima')])
+        self.invalid = os.path.join(self.tmp, 'invalid.json')
+        write_fixture(self.invalid, [restaurant(1, 'Pizza', 'Lima')])
+        self.cwd = os.getcwd()
+        # Fixture paths relative to the working tree are handed to the zygote absolute.
+        os.chdir(self.tmp)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def test_invalid_fixtures(self):
+        self.assertEqual(find_invalid_fixtures_at_commit(StubZygote(), 'a' * 40,
+                                                         ['valid.json', 'invalid.json']),
+                         set(['invalid.json']))
+
+    def test_checked_serially(self):
+        # The zygotes of a parallel run already run in parallel.
+        validate_fixtures = fixture_validator.validate_fixtures
+        calls = []
+
+        def recorded_validate_fixtures(fixture_paths, jobs=None, external_models=None):
+            calls.append(jobs)
+            return validate_fixtures(fixture_paths, jobs=jobs, external_models=external_models)
+        fixture_validator.validate_fixtures = recorded_validate_fixtures
+        try:
+            find_invalid_fixtures_at_commit(StubZygote(), 'a' * 40, ['valid.json', 'invalid.json'])
+        finally:
+            fixture_validator.validate_fixtures = validate_fixtures
+        self.assertEqual(calls, [1])
+
+    def test_not_validated(self):
+        # None of the group is loaded unchecked.
+        zygote = StubZygote(Exception('No module named models'))
+        self.assertEqual(find_invalid_fixtures_at_commit(zygote, 'a' * 40,
+                                                         ['valid.json', 'invalid.json']),
+                         set(['valid.json', 'invalid.json']))
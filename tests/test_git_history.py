@@ -0,0 +1,136 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of git_history's indexes, against throwaway git repositories.
+"""
+import os
+import shutil
+from subprocess import call, check_output
+import tempfile
+import unittest
+
+from django_fixture_tools.git_history import FileHistoryIndex, AncestryIndex, order_commits
+
+
+class GitRepoTestCase(unittest.TestCase):
+    def setUp(self):
+        self.repo_dir = tempfile.mkdtemp()
+        self.git('init', '-q')
+        self.git('config', 'user.email', 'tests@example.com')
+        self.git('config', 'user.name', 'tests')
+        os.mkdir(os.path.join(self.repo_dir, 'fixtures'))
+
+    def tearDown(self):
+        shutil.rmtree(self.repo_dir)
+
+    def git(self, *args):
+        return check_output(['git'] + list(args), cwd=self.repo_dir).strip()
+
+    def commit(self, message, **files):
+        """ @return: The new commit, after writing \a files {<name in fixtures/>: <contents>}. """
+        for name, contents in files.items():
+            with open(os.path.join(self.repo_dir, 'fixtures', name), 'w') as f:
+                f.write(contents)
+        self.git('add', '-A')
+        self.git('commit', '-q', '--allow-empty', '-m', message)
+        return self.git('rev-parse', 'HEAD')
+
+    def log(self, path):
+        return self.git('log', '--format=%H', '--', path).split()
+
+
+class FileHistoryIndexTest(GitRepoTestCase):
+    def index(self):
+        return FileHistoryIndex(self.repo_dir)
+
+    def test_commits_newest_first(self):
+        first = self.commit('1', **{'a.json': '1', 'b.json': '1'})
+        second = self.commit('2', **{'a.json': '2'})
+        self.commit('3', **{'notes.txt': '3'})
+        path = os.path.join(self.repo_dir, 'fixtures', 'a.json')
+        self.assertEqual(self.index().commits(path), [second, first])
+
+    def test_quoted_paths(self):
+        name = 'caf\xc3\xa9 & "menus".json'
+        self.commit('1', **{name: '1'})
+        path = os.path.join(self.repo_dir, 'fixtures', name)
+        self.assertEqual(self.index().commits(path), self.log(path))
+
+    def test_merges(self):
+        self.commit('1', **{'a.json': '1', 'b.json': '1'})
+        main = self.git('rev-parse', '--abbrev-ref', 'HEAD')
+        self.git('checkout', '-q', '-b', 'side')
+        self.commit('side', **{'a.json': 'side', 'b.json': 'side'})
+        self.git('checkout', '-q', main)
+        self.commit('main', **{'a.json': 'main'})
+        with open(os.devnull, 'w') as devnull:
+            call(['git', 'merge', '-q', '--no-commit', 'side'], cwd=self.repo_dir,
+                 stdout=devnull, stderr=devnull)
+        # a.json conflicted & was resolved to something new, b.json merged cleanly.
+        merge = self.commit('merge', **{'a.json': 'resolved'})
+        index = self.index()
+        for name in ('a.json', 'b.json'):
+            path = os.path.join(self.repo_dir, 'fixtures', name)
+            self.assertEqual(index.commits(path), self.log(path))
+        self.assertEqual(index.commits(os.path.join(self.repo_dir, 'fixtures', 'a.json'))[0],
+                         merge)
+
+    def test_update(self):
+        first = self.commit('1', **{'a.json': '1'})
+        index = self.index()
+        path = os.path.join(self.repo_dir, 'fixtures', 'a.json')
+        self.assertEqual(index.commits(path), [first])
+        second = self.commit('2', **{'a.json': '2'})
+        self.assertEqual(index.commits(path), [second, first])
+        # Rebuilt from the saved index.
+        self.assertEqual(self.index().commits(path), [second, first])
+
+
+class OrderCommitsTest(GitRepoTestCase):
+    def test_ancestors_first(self):
+        commits = [self.commit(str(i)) for i in range(4)]
+        self.assertEqual(order_commits([commits[2], commits[0], commits[3], commits[0]],
+                                       repo_dir=self.repo_dir),
+                         [commits[0], commits[2], commits[3]])
+
+
+class AncestryIndexTest(GitRepoTestCase):
+    def setUp(self):
+        super(AncestryIndexTest, self).setUp()
+        self.root = self.commit('root')
+        self.main = self.git('rev-parse', '--abbrev-ref', 'HEAD')
+        self.git('checkout', '-q', '-b', 'side')
+        self.side = self.commit('side')
+        self.git('checkout', '-q', self.main)
+        self.head = self.commit('main')
+        self.git('tag', 'v1')
+        self.index = AncestryIndex(self.repo_dir)
+
+    def test_resolve(self):
+        self.assertEqual(self.index.resolve(self.head), self.head)
+        self.assertEqual(self.index.resolve(self.side[:7]), self.side)
+        self.assertEqual(self.index.resolve('HEAD'), self.head)
+        self.assertEqual(self.index.resolve('side'), self.side)
+        self.assertEqual(self.index.resolve('v1'), self.head)
+        self.assertEqual(self.index.resolve('HEAD~1'), self.root)
+        self.assertRaises(Exception, self.index.resolve, 'no-such-branch')
+
+    def test_refs_follow_new_commits(self):
+        self.assertEqual(self.index.resolve('HEAD'), self.head)
+        new_head = self.commit('new')
+        self.assertEqual(self.index.resolve('HEAD'), new_head)
+        self.assertTrue(self.index.is_ancestor(self.head, new_head))
+
+    def test_ancestry(self):
+        self.assertTrue(self.index.is_ancestor(self.root, self.head))
+        self.assertTrue(self.index.is_ancestor(self.head, self.head))
+        self.assertFalse(self.index.is_ancestor(self.head, self.root))
+        self.assertFalse(self.index.is_ancestor(self.side, self.head))
+        self.assertEqual(self.index.compare(self.root, 'HEAD'), 1)
+        self.assertEqual(self.index.compare('HEAD', self.root), -1)
+        self.assertEqual(self.index.compare('v1', self.head), 0)
+        self.assertRaises(Exception, self.index.compare, self.side, self.head)
+
+    def test_sort(self):
+        self.assertEqual(self.index.sort(['HEAD', self.root[:7]]), [self.root[:7], 'HEAD'])
+        self.assertEqual(self.index.sort(['side', self.root]), [self.root, 'side'])
@@ -0,0 +1,105 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of git_objects.GitObjectReader, against throwaway git repositories.
+"""
+import os
+
+from django_fixture_tools import git_objects
+from django_fixture_tools.git_objects import GitObjectReader
+from django_fixture_tools.tests.test_git_history import GitRepoTestCase
+
+
+class GitObjectReaderTest(GitRepoTestCase):
+    def setUp(self):
+        super(GitObjectReaderTest, self).setUp()
+        self.reader = GitObjectReader(self.repo_dir)
+
+    def tearDown(self):
+        self.reader.close()
+        super(GitObjectReaderTest, self).tearDown()
+
+    def path(self, name):
+        return os.path.join(self.repo_dir, 'fixtures', name)
+
+    def test_resolve(self):
+        first = self.commit('1', **{'a.json': '1'})
+        second = self.commit('2', **{'a.json': '2'})
+        self.assertEqual(self.reader.resolve(first[:8]), first)
+        self.assertEqual(self.reader.resolve('HEAD'), second)
+        self.assertEqual(self.reader.resolve('HEAD~1'), first)
+
+    def test_head(self):
+        first = self.commit('1', **{'a.json': '1'})
+        self.assertEqual(self.reader.head(), first)
+        second = self.commit('2', **{'a.json': '2'})
+        self.assertEqual(self.reader.head(), second)
+        self.git('checkout', '-q', first)
+        self.assertEqual(self.reader.head(), first)
+        self.git('checkout', '-q', '-b', 'side')
+        self.assertEqual(self.reader.head(), first)
+        third = self.commit('3', **{'a.json': '3'})
+        self.git('pack-refs', '--all')
+        self.assertEqual(self.reader.head(), third)
+        self.git('reset', '-q', '--hard', second)
+        self.assertEqual(self.reader.head(), second)
+
+    def test_head_not_resolved_again(self):
+        first = self.commit('1', **{'a.json': '1'})
+        self.assertEqual(self.reader.head(), first)
+        git_output = git_objects.git_output
+        calls = []
+
+        def counted_git_output(args, cwd=None):
+            calls.append(args)
+            return git_output(args, cwd=cwd)
+        git_objects.git_output = counted_git_output
+        try:
+            self.assertEqual(self.reader.head(), first)
+            self.assertEqual(calls, [])
+            second = self.commit('2', **{'a.json': '2'})
+            self.assertEqual(self.reader.head(), second)
+            self.assertEqual(len(calls), 1)
+        finally:
+            git_objects.git_output = git_output
+
+    def test_tree(self):
+        first = self.commit('1', **{'a.json': '1', 'b.json': '1'})
+        second = self.commit('2', **{'a.json': '2'})
+        os.remove(self.path('b.json'))
+        third = self.commit('3')
+        self.assertEqual(sorted(self.reader.tree(first)), ['fixtures/a.json', 'fixtures/b.json'])
+        self.assertEqual(self.reader.tree(first)['fixtures/b.json'],
+                         self.reader.tree(second)['fixtures/b.json'])
+        self.assertNotEqual(self.reader.tree(first)['fixtures/a.json'],
+                            self.reader.tree(second)['fixtures/a.json'])
+        self.assertEqual(sorted(self.reader.tree(third)), ['fixtures/a.json'])
+
+    def test_read(self):
+        contents = '[{"pk": 1}]\n\n' * 1000
+        first = self.commit('1', **{'a.json': contents, 'b.json': ''})
+        second = self.commit('2', **{'a.json': '2'})
+        # Reads share the one cat-file process, so each has to consume exactly its object.
+        self.assertEqual(self.reader.read(first, self.path('a.json')), contents)
+        self.assertEqual(self.reader.read(second, self.path('a.json')), '2')
+        self.assertEqual(self.reader.read(second, self.path('b.json')), '')
+
+    def test_read_relative_path(self):
+        first = self.commit('1', **{'a.json': '1'})
+        cwd = os.getcwd()
+        os.chdir(os.path.join(self.repo_dir, 'fixtures'))
+        try:
+            self.assertEqual(self.reader.read(first, 'a.json'), '1')
+        finally:
+            os.chdir(cwd)
+
+    def test_read_missing(self):
+        first = self.commit('1', **{'a.json': '1'})
+        self.commit('2', **{'b.json': '2'})
+        self.assertRaises(IOError, self.reader.read, first, self.path('b.json'))
+
+    def test_read_after_close(self):
+        first = self.commit('1', **{'a.json': '1'})
+        self.assertEqual(self.reader.read(first, self.path('a.json')), '1')
+        self.reader.close()
+        self.assertEqual(self.reader.read(first, self.path('a.json')), '1')
@@ -0,0 +1,54 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of git_worktrees' cache & pinning.
+"""
+import os
+from subprocess import Popen
+
+from django_fixture_tools.git_worktrees import WorktreeCache, PIN_DIRNAME
+from django_fixture_tools.tests.test_git_history import GitRepoTestCase
+
+
+class WorktreeCacheTest(GitRepoTestCase):
+    def setUp(self):
+        super(WorktreeCacheTest, self).setUp()
+        self.commits = [self.commit(str(i), **{'a.json': str(i)}) for i in range(3)]
+
+    def cache(self):
+        return WorktreeCache(self.repo_dir, max_worktrees=1)
+
+    def contents(self, path):
+        with open(os.path.join(path, 'fixtures', 'a.json')) as f:
+            return f.read()
+
+    def test_checkout_and_evict(self):
+        cache = self.cache()
+        first = cache.checkout(self.commits[0])
+        self.assertEqual(self.contents(first), '0')
+        second = cache.checkout(self.commits[1][:8])
+        self.assertEqual(second, cache.path(self.commits[1]))
+        self.assertFalse(os.path.exists(first))
+        self.assertEqual(self.contents(second), '1')
+
+    def test_pinned_by_another_cache(self):
+        # Stands in for another process, it has its own pins.
+        other = self.cache()
+        pinned = other.checkout(self.commits[0], pin=True)
+        cache = self.cache()
+        cache.checkout(self.commits[1])
+        cache.checkout(self.commits[2])
+        self.assertTrue(os.path.exists(pinned))
+        other.unpin(pinned)
+        cache.checkout(self.commits[1])
+        self.assertFalse(os.path.exists(pinned))
+
+    def test_pins_of_dead_processes_are_ignored(self):
+        cache = self.cache()
+        path = cache.checkout(self.commits[0])
+        process = Popen(['true'])
+        process.wait()
+        os.mkdir(os.path.join(path, PIN_DIRNAME))
+        open(os.path.join(path, PIN_DIRNAME, '{}.test'.format(process.pid)), 'w').close()
+        cache.checkout(self.commits[1])
+        self.assertFalse(os.path.exists(path))
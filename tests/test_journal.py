@@ -0,0 +1,92 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of resuming batch runs from their journal.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from django_fixture_tools.fixture_io import write_fixture, fixture_file_hash
+from django_fixture_tools.journal import RunJournal, PLANNED, LOADED, DUMPED, COMMITTED, DONE,\
+    FAILED
+
+
+class RunJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.journal_dir = os.path.join(self.tmp, 'journals')
+        self.fixture = os.path.join(self.tmp, 'fixture.json')
+        self.write({'name': 'Lima'})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, fields):
+        write_fixture(self.fixture, [{'model': 'shop.city', 'pk': 1, 'fields': fields}])
+        return fixture_file_hash(self.fixture)
+
+    def journal(self, resume=True):
+        return RunJournal('migrate', self.tmp, resume=resume, journal_dir=self.journal_dir)
+
+    def run_fixture(self, journal, *states):
+        """ Records \a states for the fixture, the last one with the fixture's hash. """
+        journal.record(self.fixture, PLANNED, file_hash=fixture_file_hash(self.fixture))
+        for state in states:
+            journal.record(self.fixture, state, file_hash=fixture_file_hash(self.fixture))
+        journal.close()
+
+    def test_finished_fixture_is_skipped(self):
+        self.run_fixture(self.journal(resume=False), LOADED, DONE)
+        journal = self.journal()
+        self.assertTrue(journal.is_finished(self.fixture))
+        self.assertEqual(journal.last(self.fixture)['state'], DONE)
+        journal.close()
+
+    def test_committed_fixture_is_skipped(self):
+        self.run_fixture(self.journal(resume=False), DUMPED, COMMITTED)
+        self.assertTrue(self.journal().is_finished(self.fixture))
+
+    def test_changed_fixture_is_retried(self):
+        self.run_fixture(self.journal(resume=False), DONE)
+        self.write({'name': 'Quito'})
+        self.assertFalse(self.journal().is_finished(self.fixture))
+
+    def test_failed_fixture_is_retried(self):
+        self.run_fixture(self.journal(resume=False), FAILED)
+        self.assertFalse(self.journal().is_finished(self.fixture))
+
+    def test_not_resumed(self):
+        self.run_fixture(self.journal(resume=False), DONE)
+        journal = self.journal(resume=False)
+        self.assertFalse(journal.is_finished(self.fixture))
+        self.assertEqual(journal.last(self.fixture), None)
+        journal.close()
+
+    def test_written_from(self):
+        journal = self.journal(resume=False)
+        original_hash = fixture_file_hash(self.fixture)
+        journal.record(self.fixture, PLANNED, file_hash=original_hash)
+        journal.record(self.fixture, DUMPED, file_hash=self.write({'name': 'Lima', 'pop': 9}))
+        journal.close()
+        journal = self.journal()
+        # Died before committing: the fixture holds the dump, migrated from the original.
+        self.assertFalse(journal.is_finished(self.fixture))
+        self.assertEqual(journal.written_from(self.fixture), original_hash)
+        journal.close()
+
+        self.write({'name': 'Quito'})
+        self.assertEqual(self.journal().written_from(self.fixture), None)
+
+    def test_line_cut_short(self):
+        self.run_fixture(self.journal(resume=False), DONE)
+        with open(self.journal().path, 'a') as jf:
+            jf.write('{"fixture": "')
+        journal = self.journal()
+        self.assertTrue(journal.is_finished(self.fixture))
+        journal.record(self.fixture, FAILED)
+        journal.close()
+        journal = self.journal()
+        self.assertEqual(journal.last(self.fixture)['state'], FAILED)
+        journal.close()
@@ -0,0 +1,66 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of the migrator's batch scheduling.
+"""
+import os
+import unittest
+
+from django_fixture_tools.fixture_migrator.migrate_fixtures import group_fixtures_by_load_commit,\
+    split_groups
+from django_fixture_tools.tests.test_git_history import GitRepoTestCase
+
+
+class GroupByLoadCommitTest(GitRepoTestCase):
+    def setUp(self):
+        super(GroupByLoadCommitTest, self).setUp()
+        self.cwd = os.getcwd()
+        os.chdir(self.repo_dir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        super(GroupByLoadCommitTest, self).tearDown()
+
+    def path(self, name):
+        return os.path.join(self.repo_dir, 'fixtures', name)
+
+    def test_groups_oldest_first(self):
+        first = self.commit('1', **{'a.json': '1', 'b.json': '1', 'c.json': '1'})
+        second = self.commit('2', **{'b.json': '2'})
+        fixtures = [self.path(name) for name in ('b.json', 'c.json', 'a.json')]
+        self.assertEqual(group_fixtures_by_load_commit(fixtures),
+                         [(first, [self.path('c.json'), self.path('a.json')]),
+                          (second, [self.path('b.json')])])
+
+    def test_load_commit(self):
+        first = self.commit('1', **{'a.json': '1', 'b.json': '1'})
+        self.commit('2', **{'b.json': '2'})
+        fixtures = [self.path('a.json'), self.path('b.json')]
+        self.assertEqual(group_fixtures_by_load_commit(fixtures, load_commit=first),
+                         [(first, fixtures)])
+
+
+class SplitGroupsTest(unittest.TestCase):
+    def test_big_groups_are_split_biggest_first(self):
+        groups = [('a', ['a1', 'a2', 'a3', 'a4', 'a5']), ('b', ['b1']), ('c', ['c1', 'c2'])]
+        self.assertEqual(split_groups(groups, 2),
+                         [('a', ['a1', 'a2', 'a3', 'a4']), ('c', ['c1', 'c2']),
+                          ('a', ['a5']), ('b', ['b1'])])
+
+    def test_groups_kept_when_they_fit(self):
+        groups = [('a', ['a1', 'a2']), ('b', ['b1', 'b2', 'b3'])]
+        self.assertEqual(split_groups(groups, 1), [('b', ['b1', 'b2', 'b3']), ('a', ['a1', 'a2'])])
+
+    def test_more_jobs_than_fixtures(self):
+        groups = [('a', ['a1', 'a2']), ('b', ['b1'])]
+        self.assertEqual(sorted(split_groups(groups, 8)),
+                         [('a', ['a1']), ('a', ['a2']), ('b', ['b1'])])
+
+    def test_every_fixture_once(self):
+        groups = [(str(i), [(i, j) for j in range(i * 3 + 1)]) for i in range(5)]
+        for jobs in range(1, 9):
+            pieces = split_groups(groups, jobs)
+            self.assertEqual(sorted(f for commit, fixtures in pieces for f in fixtures),
+                             sorted(f for commit, fixtures in groups for f in fixtures))
+            self.assertTrue(all(f[0] == int(commit) for commit, fixtures in pieces
+                                    for f in fixtures))
@@ -0,0 +1,69 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of migration_plans' plans & their cache keys, against the apps in tests/.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from django_fixture_tools import migration_plans, shared
+
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class PlanKeyTest(unittest.TestCase):
+    def setUp(self):
+        # The commit checked out is part of the key.
+        self.cwd = os.getcwd()
+        os.chdir(TESTS_DIR)
+        self.tmp = tempfile.mkdtemp()
+        self.migration = os.path.join(self.tmp, '0001_initial.py')
+        self.write_migration('class Migration(object):\n    pass\n')
+        self.get_codebase_migrations = shared.get_codebase_migrations
+        shared.get_codebase_migrations = lambda: {'shop': [('0001_initial', self.migration)]}
+
+    def tearDown(self):
+        shared.get_codebase_migrations = self.get_codebase_migrations
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def write_migration(self, text):
+        with open(self.migration, 'w') as mf:
+            mf.write(text)
+
+    def test_heads(self):
+        self.assertEqual(migration_plans._plan_key({'shop': '0001_initial'}),
+                         migration_plans._plan_key({'shop': '0001_initial'}))
+        self.assertNotEqual(migration_plans._plan_key({'shop': '0001_initial'}),
+                            migration_plans._plan_key({}))
+
+    def test_edited_migration(self):
+        key = migration_plans._plan_key({})
+        self.write_migration('class Migration(object):\n    depends_on = ()\n')
+        self.assertNotEqual(migration_plans._plan_key({}), key)
+
+    def test_touched_migration(self):
+        key = migration_plans._plan_key({})
+        st = os.stat(self.migration)
+        os.utime(self.migration, (st.st_atime + 10, st.st_mtime + 10))
+        self.assertEqual(migration_plans._plan_key({}), key)
+
+
+class MigrationPlanTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        os.chdir(TESTS_DIR)
+        migration_plans._plans.clear()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+
+    def test_plan(self):
+        plan = migration_plans.get_migration_plan({'shop': '0001_initial',
+                                                   'stock': '0001_initial'})
+        self.assertEqual(plan['migrations'], [['stock', '0002_auto__add_field_item_size'],
+                                              ['shop', '0002_auto__add_restaurant']])
+        self.assertEqual(plan['unchanged_apps'], [])
@@ -0,0 +1,122 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of the fixture migration planner and its index of fixtures' history heads & apps,
+    against the migrations of the apps in tests/.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import simplejson as json
+
+from django_fixture_tools.fixture_dedupe import BASES_SUFFIX
+from django_fixture_tools.fixture_io import write_fixture
+from django_fixture_tools.fixture_migrator.planner import FixtureHeadsIndex, plan_fixtures,\
+    describe_plan, UP_TO_DATE, NEEDS_MIGRATION, UNINITIALISED
+
+
+def history(app_name, migration, pk):
+    return {'model': 'south.migrationhistory', 'pk': pk,
+            'fields': {'app_name': app_name, 'migration': migration,
+                       'applied': '2014-07-06T00:00:00'}}
+
+
+class FixtureHeadsIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.fixture = os.path.join(self.tmp, 'fixture.json')
+        write_fixture(self.fixture, [
+            history('shop', '0001_initial', 1), history('shop', '0002_auto__add_restaurant', 2),
+            {'model': 'shop.city', 'pk': 1, 'fields': {'name': 'Lima'}}])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_heads_and_apps(self):
+        index = FixtureHeadsIndex(cache_dir=self.tmp)
+        self.assertEqual(index.heads(self.fixture), {'shop': '0002_auto__add_restaurant'})
+        self.assertEqual(index.apps(self.fixture), set(['shop']))
+
+    def test_apps_of_base_fixtures(self):
+        base = os.path.join(self.tmp, 'bases', 'stock.json')
+        os.mkdir(os.path.dirname(base))
+        write_fixture(base, [{'model': 'stock.item', 'pk': 1, 'fields': {'name': 'Chair'}}])
+        with open(self.fixture + BASES_SUFFIX, 'w') as bf:
+            json.dump([os.path.join('bases', 'stock.json')], bf)
+        self.assertEqual(FixtureHeadsIndex(cache_dir=self.tmp).apps(self.fixture),
+                         set(['shop', 'stock']))
+
+    def test_index_is_saved(self):
+        index = FixtureHeadsIndex(cache_dir=self.tmp)
+        index.heads(self.fixture)
+        index.save()
+        index = FixtureHeadsIndex(cache_dir=self.tmp)
+        self.assertEqual(index.apps(self.fixture), set(['shop']))
+        self.assertFalse(index.dirty)
+
+
+class PlanFixturesTest(unittest.TestCase):
+    def setUp(self):
+        # Migration plans are keyed by the commit checked out.
+        self.cwd = os.getcwd()
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        self.tmp = tempfile.mkdtemp()
+        self.index = FixtureHeadsIndex(cache_dir=self.tmp)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def fixture(self, name, *heads):
+        path = os.path.join(self.tmp, name)
+        write_fixture(path, [history(app, migration, pk)
+                                 for pk, (app, migration) in enumerate(heads, 1)])
+        return path
+
+    def plan(self, *fixture_paths):
+        return dict((f, (status, [(app, name) for app, name, path in pending]))
+                        for f, (status, pending) in plan_fixtures(fixture_paths,
+                                                                  self.index).items())
+
+    def test_statuses(self):
+        current = self.fixture('current.json', ('shop', '0002_auto__add_restaurant'),
+                               ('stock', '0002_auto__add_field_item_size'))
+        stale = self.fixture('stale.json', ('shop', '0001_initial'), ('stock', '0001_initial'))
+        empty = self.fixture('empty.json')
+        self.assertEqual(self.plan(current, stale, empty), {
+            current: (UP_TO_DATE, []),
+            # shop's 0002 depends on stock's.
+            stale: (NEEDS_MIGRATION, [('stock', '0002_auto__add_field_item_size'),
+                                      ('shop', '0002_auto__add_restaurant')]),
+            empty: (UNINITIALISED, []),
+        })
+
+    def test_app_without_history(self):
+        stale = self.fixture('stale.json', ('shop', '0002_auto__add_restaurant'))
+        self.assertEqual(self.plan(stale), {
+            stale: (NEEDS_MIGRATION, [('stock', '0001_initial'),
+                                      ('stock', '0002_auto__add_field_item_size')]),
+        })
+
+    def test_pending_paths(self):
+        stale = self.fixture('stale.json', ('shop', '0001_initial'),
+                             ('stock', '0002_auto__add_field_item_size'))
+        status, pending = plan_fixtures([stale], self.index)[stale]
+        (app, name, path), = pending
+        self.assertEqual(os.path.basename(path), '0002_auto__add_restaurant.py')
+        self.assertTrue(os.path.exists(path))
+
+    def test_describe_plan(self):
+        current = self.fixture('current.json', ('shop', '0002_auto__add_restaurant'),
+                               ('stock', '0002_auto__add_field_item_size'))
+        stale = self.fixture('stale.json', ('shop', '0001_initial'),
+                             ('stock', '0002_auto__add_field_item_size'))
+        self.assertEqual(describe_plan(plan_fixtures([current, stale], self.index)), '\n'.join([
+            '{} (1):'.format(UP_TO_DATE),
+            '    {}'.format(current),
+            '{} (1):'.format(NEEDS_MIGRATION),
+            '    {}: shop.0002_auto__add_restaurant'.format(stale),
+            '{} (0):'.format(UNINITIALISED),
+        ]))
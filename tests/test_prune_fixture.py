@@ -0,0 +1,114 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of pruning fixtures to the rows reachable from root rows, against the models in
+    tests/.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from django_fixture_tools.fixture_dedupe import get_reference_fields
+from django_fixture_tools.fixture_io import read_fixture, write_fixture
+from django_fixture_tools.fixture_maker.prune_fixture import parse_root, matches_root,\
+    build_graph, reachable_rows, prune_fixture
+
+
+HISTORY = {'model': 'south.migrationhistory', 'pk': 1,
+           'fields': {'app_name': 'shop', 'migration': '0002_auto__add_restaurant',
+                      'applied': '2014-07-06T00:00:00'}}
+OBJECTS = [
+    {'model': 'shop.city', 'pk': 1, 'fields': {'name': 'Lima'}},
+    {'model': 'shop.city', 'pk': 2, 'fields': {'name': 'Quito'}},
+    {'model': 'shop.restaurant', 'pk': 1, 'fields': {'name': 'Pizza', 'city': 'Lima'}},
+    {'model': 'shop.restaurant', 'pk': 2, 'fields': {'name': 'Tacos', 'city': 'Quito'}},
+    {'model': 'auth.group', 'pk': 1, 'fields': {'name': 'staff', 'permissions': []}},
+    {'model': 'auth.group', 'pk': 2, 'fields': {'name': 'owners', 'permissions': []}},
+    {'model': 'auth.user', 'pk': 1, 'fields': {'username': 'ana', 'groups': [1, 2],
+                                                'user_permissions': []}},
+    HISTORY,
+]
+
+
+class ParseRootTest(unittest.TestCase):
+    def test_model(self):
+        self.assertEqual(parse_root('Shop.City'), ('shop.city', {}))
+
+    def test_pk(self):
+        self.assertEqual(parse_root('shop.city:2'), ('shop.city', {'pk': (2, '2')}))
+        self.assertEqual(parse_root('shop.city:abc'), ('shop.city', {'pk': ('abc', 'abc')}))
+
+    def test_fields(self):
+        self.assertEqual(parse_root('shop.restaurant:name=Pizza, city="Lima"'),
+                         ('shop.restaurant', {'name': ('Pizza', 'Pizza'),
+                                              'city': ('Lima', '"Lima"')}))
+
+    def test_matches_root(self):
+        pizza = OBJECTS[2]
+        self.assertTrue(matches_root(pizza, parse_root('shop.restaurant')))
+        self.assertTrue(matches_root(pizza, parse_root('shop.restaurant:1')))
+        self.assertTrue(matches_root(pizza, parse_root('shop.restaurant:name=Pizza,city=Lima')))
+        self.assertFalse(matches_root(pizza, parse_root('shop.restaurant:name=Tacos')))
+        self.assertFalse(matches_root(pizza, parse_root('shop.city:1')))
+        # Compared as json & as text.
+        self.assertTrue(matches_root({'model': 'shop.city', 'pk': '1', 'fields': {}},
+                                     parse_root('shop.city:1')))
+
+
+class ReachableRowsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.fixture = os.path.join(self.tmp, 'fixture.json')
+        write_fixture(self.fixture, OBJECTS)
+        self.reference_fields = get_reference_fields()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def graph(self, *roots):
+        return build_graph(self.fixture, [parse_root(r) for r in roots], self.reference_fields)
+
+    def test_graph(self):
+        graph = self.graph('shop.city:1')
+        self.assertEqual(graph['rows'], len(OBJECTS))
+        self.assertEqual(graph['roots'], set([('shop.city', 1)]))
+        # By the city's name, not its pk.
+        self.assertEqual(graph['dependencies'][('shop.restaurant', 2)], [('shop.city', 2)])
+        self.assertEqual(graph['children'][('shop.city', 1)], [('shop.restaurant', 1)])
+        self.assertEqual(sorted(graph['children'][('auth.user', 1)]),
+                         [('auth.group', 1), ('auth.group', 2)])
+
+    def test_dependencies(self):
+        kept = reachable_rows(self.graph('shop.restaurant:2'), child_depth=0)
+        self.assertEqual(kept, set([('shop.restaurant', 2), ('shop.city', 2),
+                                    ('south.migrationhistory', 1)]))
+
+    def test_children(self):
+        kept = reachable_rows(self.graph('shop.city:name=Lima'))
+        self.assertEqual(kept, set([('shop.city', 1), ('shop.restaurant', 1),
+                                    ('south.migrationhistory', 1)]))
+        kept = reachable_rows(self.graph('shop.city:name=Lima'), child_depth=0)
+        self.assertEqual(kept, set([('shop.city', 1), ('south.migrationhistory', 1)]))
+
+    def test_many_to_many_children(self):
+        kept = reachable_rows(self.graph('auth.user'), keep_models=())
+        self.assertEqual(kept, set([('auth.user', 1), ('auth.group', 1), ('auth.group', 2)]))
+
+    def test_prune_fixture(self):
+        output = os.path.join(self.tmp, 'pruned.json')
+        report = prune_fixture(self.fixture, ['auth.group:name=staff', 'shop.restaurant:1'],
+                               output_path=output, reference_fields=self.reference_fields)
+        self.assertEqual(report, {'rows': len(OBJECTS), 'roots': 2, 'kept': 4})
+        self.assertEqual(read_fixture(output), [OBJECTS[0], OBJECTS[2], OBJECTS[4], HISTORY])
+        self.assertEqual(read_fixture(self.fixture), OBJECTS)
+
+    def test_prune_many_to_many_lists(self):
+        prune_fixture(self.fixture, ['auth.user'], child_depth=0,
+                      reference_fields=self.reference_fields)
+        user, history = read_fixture(self.fixture)
+        self.assertEqual(user['fields']['groups'], [])
+
+    def test_no_roots(self):
+        self.assertRaises(Exception, prune_fixture, self.fixture, ['shop.city:3'],
+                          reference_fields=self.reference_fields)
@@ -0,0 +1,134 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of schema_only's classification of South migrations & rewriting of fixture json.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from django_fixture_tools.fixture_migrator.schema_only import analyse_migration,\
+    analyse_pending_migrations, apply_operations, UnsupportedMigration
+
+
+MIGRATION = '''
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        """ Docstrings are fine. """
+{}
+
+    def backwards(self, orm):
+        raise RuntimeError()
+
+    models = {{
+        u'shop.restaurant': {{
+            'Meta': {{'object_name': 'Restaurant', 'db_table': "'restaurants'"}},
+            u'id': ('django.db.models.fields.AutoField', [], {{'primary_key': 'True'}}),
+        }},
+    }}
+'''
+
+
+class AnalyseMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def migration(self, *statements):
+        path = os.path.join(self.dir, '{:04}_test.py'.format(len(os.listdir(self.dir)) + 1))
+        with open(path, 'w') as mf:
+            mf.write(MIGRATION.format('\n'.join('        ' + s for s in statements)))
+        return path
+
+    def operations(self, *statements):
+        return analyse_migration(self.migration(*statements))[0]
+
+    def assertUnsupported(self, *statements):
+        self.assertRaises(UnsupportedMigration, analyse_migration, self.migration(*statements))
+
+    def test_schema_only_operations(self):
+        self.assertEqual(self.operations(
+            "db.add_column('restaurants', 'rating', "
+                "self.gf('django.db.models.fields.IntegerField')(null=True), keep_default=False)",
+            "db.add_column('restaurants', 'open', "
+                "self.gf('django.db.models.fields.BooleanField')(default=True))",
+            "db.add_column('restaurants', 'since', self.gf('django.db.models.fields.DateField')"
+                "(default=datetime.date(2014, 7, 6)))",
+            "db.delete_column('restaurants', 'owner_id')",
+            "db.create_index('restaurants', ['name'])",
+            "db.delete_table('shop_menu')",
+        ), [('add_column', 'restaurants', 'rating', None),
+            ('add_column', 'restaurants', 'open', True),
+            ('add_column', 'restaurants', 'since', '2014-07-06'),
+            ('delete_column', 'restaurants', 'owner_id'),
+            ('delete_table', 'shop_menu')])
+
+    def test_frozen_models(self):
+        frozen_models = analyse_migration(self.migration('pass'))[1]
+        self.assertEqual(list(frozen_models), ['shop.restaurant'])
+
+    def test_unsupported(self):
+        # Required column without a default.
+        self.assertUnsupported("db.add_column('restaurants', 'rating', "
+                               "self.gf('django.db.models.fields.IntegerField')())")
+        # Default that isn't a literal.
+        self.assertUnsupported("db.add_column('restaurants', 'rating', "
+                               "self.gf('django.db.models.fields.IntegerField')(default=f()))")
+        self.assertUnsupported("db.alter_column('restaurants', 'name', None)")
+        self.assertUnsupported("db.rename_column('restaurants', 'name', 'title')")
+        # Data migrations.
+        self.assertUnsupported("for r in orm['shop.Restaurant'].objects.all(): r.save()")
+        self.assertUnsupported("orm['shop.Restaurant'].objects.update(name='')")
+
+    def test_tables_resolve_to_models(self):
+        path = self.migration(
+            "db.add_column('restaurants', 'rating', "
+                "self.gf('django.db.models.fields.IntegerField')(null=True))",
+            "db.delete_column('shop_city', 'code')")
+        self.assertEqual(analyse_pending_migrations([('shop', '0002_test', path)]),
+                         [('shop', '0002_test', [('add_column', 'shop.restaurant', 'rating', None),
+                                                 ('delete_column', 'shop.city', 'code')])])
+
+    def test_unknown_dropped_table(self):
+        path = self.migration("db.delete_table('shop_menu')")
+        self.assertRaises(UnsupportedMigration, analyse_pending_migrations,
+                          [('shop', '0002_test', path)])
+        # Known from the fixture's latest applied migration.
+        applied = self.migration("db.create_table('shop_menu', ())")
+        with open(applied) as mf:
+            text = mf.read().replace("u'shop.restaurant'", "u'shop.menu'")\
+                            .replace(", 'db_table': \"'restaurants'\"", '')
+        with open(applied, 'w') as mf:
+            mf.write(text)
+        self.assertEqual(analyse_pending_migrations([('shop', '0002_test', path)],
+                                                    applied_migration_paths=[applied]),
+                         [('shop', '0002_test', [('delete_table', 'shop.menu')])])
+
+
+class ApplyOperationsTest(unittest.TestCase):
+    def test_apply(self):
+        objects = [
+            {'model': 'south.migrationhistory', 'pk': 4,
+             'fields': {'app_name': 'shop', 'migration': '0001_initial'}},
+            {'model': 'shop.restaurant', 'pk': 1, 'fields': {'name': 'Pizza', 'owner': 3}},
+            {'model': 'shop.menu', 'pk': 1, 'fields': {}},
+        ]
+        migrated = apply_operations(objects, [('shop', '0002_test', [
+            ('add_column', 'shop.restaurant', 'rating', None),
+            ('delete_column', 'shop.restaurant', 'owner_id'),
+            ('delete_table', 'shop.menu'),
+        ])])
+        self.assertEqual([o['model'] for o in migrated],
+                         ['south.migrationhistory', 'south.migrationhistory', 'shop.restaurant'])
+        self.assertEqual(migrated[1]['pk'], 5)
+        self.assertEqual(migrated[1]['fields']['migration'], '0002_test')
+        self.assertEqual(migrated[2]['fields'], {'name': 'Pizza', 'rating': None})
@@ -0,0 +1,302 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of scratch_db's template registry, with the Postgres client programs stubbed out,
+    and of preparing a scratch database in an SQLite file.
+"""
+import multiprocessing
+import os
+import shutil
+from subprocess import CalledProcessError
+import tempfile
+import unittest
+
+import django.db
+from django.conf import settings
+from django.db import connections
+from django.test.utils import override_settings
+
+from django_fixture_tools import scratch_db, shared
+
+
+# The SQLite file database in tests/settings.py.
+SCRATCH = 'scratch'
+
+
+BUSY = 'createdb: database creation failed: ERROR:  source database "{}" is being accessed '\
+       'by other users'
+
+
+def _register(name):
+    with scratch_db._locked_registry() as registry:
+        registry[name] = 1.0
+
+
+class TemplateRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings = override_settings(FIXTURE_TOOLS_CACHE_DIR=self.cache_dir)
+        self.settings.enable()
+        self.pg_command = scratch_db._pg_command
+        self.clone_attempts = scratch_db.CLONE_ATTEMPTS
+        scratch_db.CLONE_ATTEMPTS = 2
+        self.commands = []
+        self.failures = []
+        scratch_db._pg_command = self.fake_pg_command
+        self.name = scratch_db.template_name('f' * 40)
+        _register(self.name)
+
+    def tearDown(self):
+        scratch_db._pg_command = self.pg_command
+        scratch_db.CLONE_ATTEMPTS = self.clone_attempts
+        self.settings.disable()
+        shutil.rmtree(self.cache_dir)
+
+    def fake_pg_command(self, database, *args):
+        self.commands.append(args)
+        if args[0] == 'createdb' and self.failures:
+            raise CalledProcessError(1, args, output=self.failures.pop(0))
+        return ''
+
+    def test_concurrent_updates(self):
+        processes = [multiprocessing.Process(target=_register, args=('tpl_{}'.format(i),))
+                         for i in range(8)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+        self.assertEqual(sorted(scratch_db._load_registry()),
+                         sorted([self.name] + ['tpl_{}'.format(i) for i in range(8)]))
+
+    def test_clone_retries_a_busy_template(self):
+        self.failures = [BUSY.format(self.name)]
+        self.assertTrue(scratch_db.clone_template('default', 'f' * 40))
+        self.assertEqual([c[0] for c in self.commands], ['dropdb', 'createdb'] * 2)
+        self.assertGreater(scratch_db._load_registry()[self.name], 1.0)
+
+    def test_clone_keeps_a_template_that_stays_busy(self):
+        self.failures = [BUSY.format(self.name)] * scratch_db.CLONE_ATTEMPTS
+        self.assertFalse(scratch_db.clone_template('default', 'f' * 40))
+        self.assertIn(self.name, scratch_db._load_registry())
+
+    def test_clone_forgets_a_missing_template(self):
+        self.failures = ['createdb: template database "{}" does not exist'.format(self.name)]
+        self.assertFalse(scratch_db.clone_template('default', 'f' * 40))
+        self.assertNotIn(self.name, scratch_db._load_registry())
+
+    def test_save_keeps_a_template_already_saved(self):
+        self.assertTrue(scratch_db.save_template('default', 'f' * 40))
+        self.assertEqual(self.commands, [])
+
+    def test_evict(self):
+        for i in range(3):
+            _register('tpl_{}'.format(i))
+        scratch_db.evict_templates('default', keep=2)
+        self.assertEqual(len(scratch_db._load_registry()), 2)
+        self.assertEqual([c[0] for c in self.commands], ['dropdb'] * 2)
+
+
+def _reset_db(database=None, debug=False):
+    """ Stands in for django_extensions' reset_db, which isn't needed for SQLite. """
+    django.db.close_connection()
+    if os.path.exists(settings.DATABASES[database]['NAME']):
+        os.remove(settings.DATABASES[database]['NAME'])
+
+
+class ScratchDbTestCase(unittest.TestCase):
+    """ Prepares the SQLite file scratch database, starting from nothing. """
+    def setUp(self):
+        self.reset_db = scratch_db.reset_db
+        scratch_db.reset_db = _reset_db
+        self.db_dir = os.path.dirname(settings.DATABASES[SCRATCH]['NAME'])
+        self.clean()
+
+    def tearDown(self):
+        scratch_db.reset_db = self.reset_db
+        self.clean()
+
+    def clean(self):
+        _reset_db(SCRATCH)
+        shutil.rmtree(os.path.join(self.db_dir, 'fixture_tools_snapshots'), ignore_errors=True)
+        if not os.path.isdir(self.db_dir):
+            os.makedirs(self.db_dir)
+
+    def prepare(self, fake_history=False):
+        return scratch_db._prepare_scratch_db(SCRATCH, fake_history, False)
+
+    def execute(self, sql, params=()):
+        cursor = connections[SCRATCH].cursor()
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+    def add_city(self, name):
+        self.execute('INSERT INTO shop_city (name) VALUES (%s)', [name])
+        scratch_db._commit(SCRATCH)
+
+
+class PrepareScratchDbTest(ScratchDbTestCase):
+    def test_truncated_when_schema_unchanged(self):
+        self.assertEqual(self.prepare(), 'built')
+        self.add_city('Lima')
+        self.assertEqual(self.prepare(), 'truncated')
+        self.assertEqual(self.execute('SELECT COUNT(*) FROM shop_city'), [(0,)])
+        # Sequences start over too.
+        self.add_city('Quito')
+        self.assertEqual(self.execute('SELECT id FROM shop_city'), [(1,)])
+
+    def test_fake_history_after_truncating(self):
+        self.prepare()
+        self.assertEqual(self.prepare(fake_history=True), 'truncated')
+        self.assertEqual(self.execute("SELECT migration FROM south_migrationhistory "
+                                      "WHERE app_name = 'shop' ORDER BY migration"),
+                         [('0001_initial',), ('0002_auto__add_restaurant',)])
+
+    def test_snapshot_restored(self):
+        self.assertEqual(self.prepare(), 'built')
+        _reset_db(SCRATCH)
+        self.assertEqual(self.prepare(), 'restored')
+        self.assertEqual(scratch_db.read_schema_fingerprint(SCRATCH),
+                         scratch_db.compute_schema_fingerprint(SCRATCH))
+        self.assertEqual(self.execute('SELECT COUNT(*) FROM shop_city'), [(0,)])
+
+    def test_migrate_and_dump_invalidates_the_fingerprint(self):
+        self.prepare()
+        dumpdata = shared.dumpdata
+        shared.dumpdata = lambda database, fixture_path, canonical=False: True
+        try:
+            shared.migrate_and_dump('unused.json', database=SCRATCH,
+                                    plan={'migrations': [], 'unchanged_apps': []})
+        finally:
+            shared.dumpdata = dumpdata
+        self.assertEqual(scratch_db.read_schema_fingerprint(SCRATCH), None)
+        # The schema may have been migrated, it's replaced rather than emptied.
+        self.assertEqual(self.prepare(), 'restored')
+
+    def test_schema_cache_off(self):
+        with override_settings(FIXTURE_TOOLS_SCHEMA_CACHE=False):
+            self.assertEqual(self.prepare(), 'built')
+            scratch_db.clear_schema_fingerprint(SCRATCH)
+            self.assertEqual(self.prepare(), 'built')
+
+
+class PostgresTemplateTest(ScratchDbTestCase):
+    """ The Postgres path, with the client programs stubbed out & the schema built in SQLite.
+    """
+    def setUp(self):
+        super(PostgresTemplateTest, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings = override_settings(FIXTURE_TOOLS_CACHE_DIR=self.cache_dir)
+        self.settings.enable()
+        self.patched = dict((name, getattr(scratch_db, name))
+                                for name in ('_pg_command', 'is_postgres', 'is_sqlite'))
+        self.commands = []
+        scratch_db._pg_command = lambda database, *args: self.commands.append(args) or ''
+        scratch_db.is_postgres = lambda database: True
+        scratch_db.is_sqlite = lambda database: False
+        self.name = scratch_db.template_name(scratch_db.compute_schema_fingerprint(SCRATCH))
+
+    def tearDown(self):
+        for name, value in self.patched.items():
+            setattr(scratch_db, name, value)
+        self.settings.disable()
+        shutil.rmtree(self.cache_dir)
+        super(PostgresTemplateTest, self).tearDown()
+
+    def test_template_saved(self):
+        self.assertEqual(self.prepare(), 'built')
+        self.assertEqual(self.commands, [
+            ('dropdb', '--if-exists', self.name),
+            ('createdb', '--template={}'.format(settings.DATABASES[SCRATCH]['NAME']),
+             self.name)])
+        self.assertIn(self.name, scratch_db._load_registry())
+
+    def test_template_cloned(self):
+        _register(self.name)
+        self.assertEqual(self.prepare(), 'cloned')
+        self.assertEqual(self.commands, [
+            ('dropdb', '--if-exists', settings.DATABASES[SCRATCH]['NAME']),
+            ('createdb', '--template={}'.format(self.name),
+             settings.DATABASES[SCRATCH]['NAME'])])
+
+    def test_templates_by_history(self):
+        _register(self.name)
+        self.assertEqual(self.prepare(fake_history=True), 'built')
+        self.assertIn(scratch_db.template_name(scratch_db.compute_schema_fingerprint(SCRATCH),
+                                               fake_history=True),
+                      scratch_db._load_registry())
+
+
+class TruncateTest(ScratchDbTestCase):
+    def setUp(self):
+        super(TruncateTest, self).setUp()
+        self.prepare()
+
+    def test_truncate_tables(self):
+        self.add_city('Lima')
+        self.execute("INSERT INTO stock_item (name) VALUES ('Chair')")
+        self.execute('CREATE TABLE spatial_ref_sys (srid integer)')
+        self.execute('INSERT INTO spatial_ref_sys VALUES (4326)')
+        self.assertTrue(scratch_db.truncate_tables(SCRATCH))
+        self.assertEqual(self.execute('SELECT COUNT(*) FROM shop_city'), [(0,)])
+        self.assertEqual(self.execute('SELECT COUNT(*) FROM stock_item'), [(0,)])
+        # Not a model's table.
+        self.assertEqual(self.execute('SELECT srid FROM spatial_ref_sys'), [(4326,)])
+        self.add_city('Quito')
+        self.assertEqual(self.execute('SELECT id FROM shop_city'), [(1,)])
+
+    def test_unsupported_backend(self):
+        is_sqlite = scratch_db.is_sqlite
+        scratch_db.is_sqlite = lambda database: False
+        try:
+            self.add_city('Lima')
+            self.assertFalse(scratch_db.truncate_tables(SCRATCH))
+        finally:
+            scratch_db.is_sqlite = is_sqlite
+        self.assertEqual(self.execute('SELECT COUNT(*) FROM shop_city'), [(1,)])
+
+    def test_changed_schema_is_replaced(self):
+        scratch_db.write_schema_fingerprint(SCRATCH, 'f' * 40)
+        self.add_city('Lima')
+        self.assertEqual(self.prepare(), 'restored')
+        self.assertEqual(self.execute('SELECT COUNT(*) FROM shop_city'), [(0,)])
+
+    def test_truncate_reset_off(self):
+        with override_settings(FIXTURE_TOOLS_TRUNCATE_RESET=False):
+            self.assertEqual(self.prepare(), 'restored')
+
+
+class SnapshotTest(ScratchDbTestCase):
+    def snapshots(self):
+        snapshot_dir = os.path.join(self.db_dir, 'fixture_tools_snapshots')
+        return sorted(os.listdir(snapshot_dir))
+
+    def test_snapshots_by_history(self):
+        self.prepare()
+        _reset_db(SCRATCH)
+        self.assertEqual(self.prepare(fake_history=True), 'built')
+        fingerprint = scratch_db.compute_schema_fingerprint(SCRATCH)
+        self.assertEqual(self.snapshots(), [
+            '{}.sqlite3'.format(scratch_db.template_name(fingerprint, fake_history=True)),
+            '{}.sqlite3'.format(scratch_db.template_name(fingerprint))])
+
+    def test_restore(self):
+        self.prepare()
+        self.add_city('Lima')
+        self.assertTrue(scratch_db.restore_snapshot(SCRATCH,
+                                                    scratch_db.compute_schema_fingerprint(SCRATCH)))
+        # As saved, before the city was added.
+        self.assertEqual(self.execute('SELECT COUNT(*) FROM shop_city'), [(0,)])
+        self.assertFalse(scratch_db.restore_snapshot(SCRATCH, 'f' * 40))
+
+    def test_evict(self):
+        self.prepare()
+        shutil.rmtree(os.path.join(self.db_dir, 'fixture_tools_snapshots'))
+        for i in range(3):
+            scratch_db.save_snapshot(SCRATCH, str(i) * 40)
+            path = scratch_db._snapshot_path(SCRATCH, str(i) * 40)
+            os.utime(path, (1000 + i, 1000 + i))
+        # Restoring counts as using a snapshot.
+        scratch_db.restore_snapshot(SCRATCH, '0' * 40)
+        scratch_db.evict_snapshots(SCRATCH, keep=2)
+        self.assertEqual(self.snapshots(),
+                         ['{}.sqlite3'.format(scratch_db.template_name(i * 40)) for i in '02'])
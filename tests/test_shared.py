@@ -0,0 +1,76 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of shared's South migration listings, against the apps in tests/.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from django.test.utils import override_settings
+
+from django_fixture_tools import migration_plans
+from django_fixture_tools.shared import get_codebase_migrations, get_pending_migrations
+
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class PendingMigrationsTest(unittest.TestCase):
+    def setUp(self):
+        # Migration plans are keyed by the commit checked out.
+        self.cwd = os.getcwd()
+        os.chdir(TESTS_DIR)
+        migration_plans._plans.clear()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+
+    def pending(self, heads):
+        return [(app_label, name) for app_label, name, path
+                    in get_pending_migrations(heads, get_codebase_migrations())]
+
+    def test_dependencies_order_pending_migrations(self):
+        # shop's 0002 depends on stock's 0002, which sorts after it by app.
+        self.assertEqual(self.pending({'shop': '0001_initial', 'stock': '0001_initial'}),
+                         [('stock', '0002_auto__add_field_item_size'),
+                          ('shop', '0002_auto__add_restaurant')])
+
+    def test_apps_without_history_are_fully_pending(self):
+        pending = self.pending({'shop': '0002_auto__add_restaurant'})
+        self.assertEqual(pending, [('stock', '0001_initial'),
+                                   ('stock', '0002_auto__add_field_item_size')])
+
+    def test_nothing_pending(self):
+        self.assertEqual(self.pending({'shop': '0002_auto__add_restaurant',
+                                       'stock': '0002_auto__add_field_item_size'}), [])
+
+    def test_paths(self):
+        heads = {'shop': '0002_auto__add_restaurant', 'stock': '0001_initial'}
+        (app_label, name, path), = get_pending_migrations(heads, get_codebase_migrations())
+        self.assertEqual(path, os.path.join(os.path.realpath(TESTS_DIR), 'stock', 'migrations',
+                                            '0002_auto__add_field_item_size.py'))
+
+
+class CodebaseMigrationsTest(unittest.TestCase):
+    def migrations(self, app_label):
+        migrations_dir = os.path.join(os.path.realpath(TESTS_DIR), app_label, 'migrations')
+        return [(name[:-3], os.path.join(migrations_dir, name))
+                    for name in sorted(os.listdir(migrations_dir))
+                        if name.endswith('.py') and name != '__init__.py']
+
+    def test_apps_in_the_project(self):
+        self.assertEqual(get_codebase_migrations(),
+                         {'shop': self.migrations('shop'), 'stock': self.migrations('stock')})
+
+    def test_apps_outside_the_project(self):
+        # Ex: apps installed in site-packages.
+        project_root = tempfile.mkdtemp()
+        try:
+            with override_settings(FIXTURE_TOOLS_PROJECT_ROOT=project_root):
+                self.assertEqual(get_codebase_migrations(),
+                                 {'shop': self.migrations('shop'),
+                                  'stock': self.migrations('stock')})
+        finally:
+            shutil.rmtree(project_root)
@@ -0,0 +1,117 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of tracing's spans, trace files & summaries.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import simplejson as json
+
+from django_fixture_tools.tracing import Tracer, FIXTURE_SPAN, get_tracer, span, write_trace
+
+
+class TracerTest(unittest.TestCase):
+    def setUp(self):
+        self.tracer = Tracer()
+        self.tracer.enabled = True
+
+    def test_disabled(self):
+        self.tracer.enabled = False
+        with self.tracer.span('load', fixture='a.json') as trace:
+            trace['rows'] = 1
+        self.assertEqual(self.tracer.spans, [])
+
+    def test_nesting(self):
+        with self.tracer.span(FIXTURE_SPAN, fixture='a.json'):
+            with self.tracer.span('load', fixture='a.json') as trace:
+                trace['rows'] = 3
+            with self.tracer.span('dump', fixture='a.json'):
+                pass
+        # Spans are recorded as they finish.
+        load, dump, fixture = self.tracer.spans
+        self.assertEqual([s['name'] for s in (load, dump, fixture)],
+                         ['load', 'dump', FIXTURE_SPAN])
+        self.assertEqual(load['args'], {'fixture': 'a.json', 'rows': 3})
+        for inner in (load, dump):
+            self.assertTrue(fixture['start'] <= inner['start'])
+            self.assertTrue(inner['start'] + inner['duration'] <=
+                            fixture['start'] + fixture['duration'])
+        self.assertTrue(load['start'] + load['duration'] <= dump['start'])
+        self.assertEqual(set(s['pid'] for s in self.tracer.spans), set([os.getpid()]))
+
+    def test_error(self):
+        def fail():
+            with self.tracer.span('load', fixture='a.json'):
+                raise ValueError('unreadable')
+        self.assertRaises(ValueError, fail)
+        load, = self.tracer.spans
+        self.assertEqual(load['args'], {'fixture': 'a.json', 'error': 'ValueError'})
+
+    def test_take(self):
+        with self.tracer.span('load'):
+            pass
+        spans = self.tracer.take()
+        self.assertEqual([s['name'] for s in spans], ['load'])
+        self.assertEqual(self.tracer.spans, [])
+        # Spans from other processes are added as they were recorded.
+        self.tracer.add(spans)
+        self.assertEqual(self.tracer.spans, spans)
+
+    def test_summary(self):
+        self.tracer.add([
+            {'name': FIXTURE_SPAN, 'start': 0, 'duration': 2.0, 'pid': 1, 'tid': 1,
+             'args': {'fixture': 'a.json'}},
+            {'name': FIXTURE_SPAN, 'start': 3, 'duration': 4.0, 'pid': 1, 'tid': 1,
+             'args': {'fixture': 'a.json'}},
+            {'name': FIXTURE_SPAN, 'start': 0, 'duration': 5.0, 'pid': 2, 'tid': 1,
+             'args': {'fixture': 'b.json'}},
+            {'name': 'load', 'start': 0, 'duration': 1.0, 'pid': 1, 'tid': 1, 'args': {}},
+            {'name': 'load', 'start': 3, 'duration': 3.0, 'pid': 1, 'tid': 1, 'args': {}},
+            {'name': 'dump', 'start': 1, 'duration': 0.5, 'pid': 1, 'tid': 1, 'args': {}},
+        ])
+        lines = self.tracer.summary(top=1).split('\n')
+        # a.json's two spans add up to the slowest fixture.
+        self.assertEqual(lines[:2], ['Slowest fixtures:', '       6.0s  a.json'])
+        self.assertEqual(lines[2], 'Phases:')
+        self.assertEqual([l.split() for l in lines[4:]], [
+            ['load', '2', '4.0s', '2.00s', '3.00s'],
+            ['dump', '1', '0.5s', '0.50s', '0.50s'],
+        ])
+
+
+class WriteTraceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.tracer = get_tracer()
+        self.tracer.take()
+        self.tracer.enabled = True
+
+    def tearDown(self):
+        self.tracer.enabled = False
+        self.tracer.take()
+        shutil.rmtree(self.tmp)
+
+    def test_write_trace(self):
+        with span(FIXTURE_SPAN, fixture='a.json'):
+            with span('load', fixture='a.json'):
+                pass
+        path = os.path.join(self.tmp, 'trace.json')
+        write_trace(path)
+        with open(path) as tf:
+            trace = json.load(tf)
+        load, fixture = trace['traceEvents']
+        self.assertEqual(load['name'], 'load')
+        self.assertEqual(load['ph'], 'X')
+        self.assertEqual(load['args'], {'fixture': 'a.json'})
+        self.assertEqual((load['pid'], load['tid']), (fixture['pid'], fixture['tid']))
+        # Microseconds, nested as the spans were.
+        spans = self.tracer.spans
+        self.assertEqual(load['ts'], int(spans[0]['start'] * 1e6))
+        self.assertTrue(fixture['ts'] <= load['ts'])
+        self.assertTrue(load['ts'] + load['dur'] <= fixture['ts'] + fixture['dur'] + 1)
+
+        with open(os.path.join(self.tmp, 'trace.spans.json')) as sf:
+            self.assertEqual(json.load(sf), spans)
@@ -0,0 +1,190 @@
+"""
+@since: 2014-07-06
+@author: Jivan
+@brief: Tests of worker_pool's workers & pools, with real worker processes running the
+    find_invalid_fixtures job against the models in tests/.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from django_fixture_tools.fixture_io import write_fixture
+from django_fixture_tools.git_worktrees import get_worktree_cache, tools_environment,\
+    PIN_DIRNAME
+from django_fixture_tools.tests.test_git_history import GitRepoTestCase
+from django_fixture_tools.tracing import get_tracer
+from django_fixture_tools.worker_pool import Worker, WorkerPool, WorkerDied, JobFailed,\
+    commit_zygote
+
+
+class WorkerTestCase(unittest.TestCase):
+    fork = False
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.env = tools_environment(os.path.dirname(os.path.abspath(__file__)))
+        self.valid = os.path.join(self.tmp, 'valid.json')
+        write_fixture(self.valid, [{'model': 'shop.city', 'pk': 1, 'fields': {'name': 'Lima'}}])
+        self.invalid = os.path.join(self.tmp, 'invalid.json')
+        write_fixture(self.invalid, [{'model': 'shop.restaurant', 'pk': 1,
+                                      'fields': {'name': 'Pizza', 'city': 'Lima'}}])
+        self.closing = []
+
+    def tearDown(self):
+        for closeable in self.closing:
+            closeable.close()
+        shutil.rmtree(self.tmp)
+
+    def worker(self):
+        worker = Worker(env=self.env, fork=self.fork)
+        self.closing.append(worker)
+        return worker
+
+    def pool(self, **kwargs):
+        pool = WorkerPool(env=self.env, fork=self.fork, **kwargs)
+        self.closing.append(pool)
+        return pool
+
+    def validate(self, runner):
+        return runner.run('find_invalid_fixtures', fixture_paths=[self.valid, self.invalid])
+
+    @staticmethod
+    def pids(pool):
+        return [w.process.pid for w in pool._idle.queue if w is not None]
+
+
+class WorkerTest(WorkerTestCase):
+    def test_run(self):
+        worker = self.worker()
+        self.assertEqual(self.validate(worker), [self.invalid])
+        self.assertEqual(self.validate(worker), [self.invalid])
+        self.assertEqual(worker.jobs_run, 2)
+
+    def test_job_failed(self):
+        worker = self.worker()
+        self.assertRaises(JobFailed, worker.run, 'no_such_job')
+        self.assertRaises(JobFailed, worker.run, 'find_invalid_fixtures', no_such_argument=1)
+        # The worker carries on.
+        self.assertTrue(worker.alive())
+        self.assertEqual(self.validate(worker), [self.invalid])
+
+    def test_worker_died(self):
+        worker = self.worker()
+        self.validate(worker)
+        worker.process.kill()
+        worker.process.wait()
+        self.assertRaises(WorkerDied, self.validate, worker)
+
+
+class WorkerPoolTest(WorkerTestCase):
+    def test_recycled_after_max_jobs(self):
+        pool = self.pool(max_jobs=2)
+        self.validate(pool)
+        first = self.pids(pool)
+        self.assertEqual(len(first), 1)
+        self.validate(pool)
+        # Replaced after its second job, by a new worker when one's next needed.
+        self.assertEqual(self.pids(pool), [])
+        self.validate(pool)
+        second = self.pids(pool)
+        self.assertEqual(len(second), 1)
+        self.assertNotEqual(first, second)
+
+    def test_failed_jobs_count(self):
+        pool = self.pool(max_jobs=2)
+        self.assertRaises(JobFailed, pool.run, 'no_such_job')
+        first = self.pids(pool)
+        self.assertRaises(JobFailed, pool.run, 'no_such_job')
+        self.assertEqual(self.validate(pool), [self.invalid])
+        self.assertNotEqual(self.pids(pool), first)
+
+    def test_never_recycled(self):
+        pool = self.pool(max_jobs=None)
+        self.validate(pool)
+        first = self.pids(pool)
+        for i in range(3):
+            self.validate(pool)
+        self.assertEqual(self.pids(pool), first)
+
+    def test_dead_worker_replaced(self):
+        pool = self.pool(max_jobs=None)
+        self.validate(pool)
+        worker = pool._idle.queue[0]
+        worker.process.kill()
+        worker.process.wait()
+        self.assertRaises(WorkerDied, self.validate, pool)
+        self.assertEqual(self.validate(pool), [self.invalid])
+        self.assertNotEqual(self.pids(pool), [worker.process.pid])
+
+    def test_close(self):
+        pool = self.pool()
+        self.validate(pool)
+        worker = pool._idle.queue[0]
+        pool.close()
+        self.assertFalse(worker.alive())
+        self.assertEqual(pool._started, 0)
+
+
+class ZygoteTest(WorkerTestCase):
+    fork = True
+
+    def setUp(self):
+        super(ZygoteTest, self).setUp()
+        self.tracer = get_tracer()
+        self.tracer.take()
+        self.tracer.enabled = True
+
+    def tearDown(self):
+        self.tracer.enabled = False
+        self.tracer.take()
+        super(ZygoteTest, self).tearDown()
+
+    def span_pids(self, name):
+        return [s['pid'] for s in self.tracer.spans if s['name'] == name]
+
+    def test_job_per_child(self):
+        worker = self.worker()
+        self.assertEqual(self.validate(worker), [self.invalid])
+        self.assertEqual(self.validate(worker), [self.invalid])
+        # Started up once, then each job ran in a child of its own.
+        self.assertEqual(self.span_pids('worker_startup'), [worker.process.pid])
+        pids = self.span_pids('validate_fixtures')
+        self.assertEqual(len(set(pids)), 2)
+        self.assertNotIn(worker.process.pid, pids)
+
+    def test_job_failed(self):
+        worker = self.worker()
+        self.assertRaises(JobFailed, worker.run, 'no_such_job')
+        self.assertTrue(worker.alive())
+        self.assertEqual(self.validate(worker), [self.invalid])
+
+
+class CommitZygoteTest(GitRepoTestCase):
+    def setUp(self):
+        super(CommitZygoteTest, self).setUp()
+        self.cache = get_worktree_cache(self.repo_dir)
+        self.cwd = os.getcwd()
+        os.chdir(self.repo_dir)
+        self.tracer = get_tracer()
+        self.tracer.take()
+        self.tracer.enabled = True
+
+    def tearDown(self):
+        self.tracer.enabled = False
+        self.tracer.take()
+        os.chdir(self.cwd)
+        super(CommitZygoteTest, self).tearDown()
+
+    def test_commit_zygote(self):
+        first = self.commit('1', **{'a.json': '[]'})
+        self.commit('2', **{'a.json': '[]', 'b.json': '[]'})
+        with commit_zygote(first, repo_dir=self.repo_dir) as pool:
+            worktree = self.cache.path(first)
+            self.assertEqual(pool.run('find_invalid_fixtures', fixture_paths=[]), [])
+            self.assertEqual(len(os.listdir(os.path.join(worktree, PIN_DIRNAME))), 1)
+        # The zygote ran in the commit's worktree, which is unpinned once it's finished with.
+        startup, = [s for s in self.tracer.spans if s['name'] == 'worker_startup']
+        self.assertEqual(os.path.realpath(startup['args']['cwd']), os.path.realpath(worktree))
+        self.assertFalse(os.path.exists(os.path.join(worktree, 'fixtures', 'b.json')))
+        self.assertEqual(os.listdir(os.path.join(worktree, PIN_DIRNAME)), [])
@@ -0,0 +1,152 @@
+"""
+@since: 2014-06-30
+@author: Jivan
+@brief: Timing of the phases of fixture tools runs (git, database resets, loads, migrations,
+    dumps, commits, worker start-up, ...) to find where long batches spend their time.
+    Code marks a phase with span(), which does nothing unless tracing is enabled.  Spans carry
+    whatever is known about the phase (fixture path, commit, rows, bytes, ...).  Spans recorded
+    in worker processes are sent back with the job's result (@see worker_pool), so a trace
+    covers every process of a run.
+    A trace can be written as json or in Chrome's trace event format, for chrome://tracing or
+    https://ui.perfetto.dev.
+"""
+from contextlib import contextmanager
+import logging
+import os
+import threading
+import time
+
+import simplejson as json
+
+
+logger = logging.getLogger(__name__)
+
+# Spans of this name cover all the work on one fixture.
+FIXTURE_SPAN = 'fixture'
+
+
+class Tracer(object):
+    """ @brief: Collects the spans recorded by all threads of a process.
+        @author: Jivan
+        @since: 2014-06-30
+    """
+    def __init__(self):
+        self.enabled = False
+        # [{'name': <phase>, 'start': <time>, 'duration': <seconds>, 'pid': <process id>,
+        #   'tid': <thread id>, 'args': {...}}, ...]
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **args):
+        """ @brief: Context manager timing phase \a name, with details \a args.
+            @author: Jivan
+            @since: 2014-06-30
+            @note: Yields \a args so details found out during the phase can be added to it.
+                If the phase raises, the exception's type is recorded in args['error'].
+        """
+        if not self.enabled:
+            yield args
+            return
+        start = time.time()
+        try:
+            yield args
+        except BaseException as ex:
+            args['error'] = type(ex).__name__
+            raise
+        finally:
+            self.add([{
+                'name': name,
+                'start': start,
+                'duration': time.time() - start,
+                'pid': os.getpid(),
+                'tid': threading.current_thread().ident,
+                'args': args,
+            }])
+
+    def add(self, spans):
+        with self._lock:
+            self.spans.extend(spans)
+
+    def take(self):
+        """ @return: The spans recorded so far, which are removed from the tracer. """
+        with self._lock:
+            spans, self.spans = self.spans, []
+        return spans
+
+    def write_json(self, path):
+        with open(path, 'w') as tf:
+            json.dump(self.spans, tf, indent=1)
+
+    def write_chrome_trace(self, path):
+        """ @brief: Writes the spans to \a path in Chrome's trace event format.
+            @author: Jivan
+            @since: 2014-06-30
+        """
+        events = [{
+            'name': s['name'],
+            'cat': 'fixture_tools',
+            'ph': 'X',
+            'ts': int(s['start'] * 1e6),
+            'dur': int(s['duration'] * 1e6),
+            'pid': s['pid'],
+            'tid': s['tid'],
+            'args': s['args'],
+        } for s in self.spans]
+        with open(path, 'w') as tf:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, tf)
+
+    def summary(self, top=10):
+        """ @brief: Returns a human readable summary of the \a top slowest fixtures & the time
+                spent in each phase.
+            @author: Jivan
+            @since: 2014-06-30
+        """
+        # A fixture's work may be split over several spans (Ex: planned, then migrated later).
+        fixtures = {}
+        for s in self.spans:
+            if s['name'] == FIXTURE_SPAN:
+                fixture = s['args'].get('fixture')
+                fixtures[fixture] = fixtures.get(fixture, 0) + s['duration']
+        lines = ['Slowest fixtures:']
+        for fixture, duration in sorted(fixtures.items(), key=lambda f: f[1], reverse=True)[:top]:
+            lines.append('  {:8.1f}s  {}'.format(duration, fixture))
+
+        phases = {}
+        for s in self.spans:
+            if s['name'] != FIXTURE_SPAN:
+                phases.setdefault(s['name'], []).append(s['duration'])
+        lines.append('Phases:')
+        lines.append('  {:<24} {:>6} {:>10} {:>9} {:>9}'.format(
+                     'phase', 'count', 'total', 'mean', 'max'))
+        for name, durations in sorted(phases.items(), key=lambda p: sum(p[1]), reverse=True):
+            lines.append('  {:<24} {:>6} {:>9.1f}s {:>8.2f}s {:>8.2f}s'.format(
+                         name, len(durations), sum(durations),
+                         sum(durations) / len(durations), max(durations)))
+        return '\n'.join(lines)
+
+
+_tracer = Tracer()
+
+
+def get_tracer():
+    """ @brief: Returns the process's Tracer.
+        @author: Jivan
+        @since: 2014-06-30
+    """
+    return _tracer
+
+
+def span(name, **args):
+    """ @brief: Tracer.span() of the process's Tracer. """
+    return _tracer.span(name, **args)
+
+
+def write_trace(path):
+    """ @brief: Writes the process's trace to \a path in Chrome's trace event format and as a
+            plain list of spans to <path without extension>.spans.json.
+        @author: Jivan
+        @since: 2014-06-30
+    """
+    _tracer.write_chrome_trace(path)
+    _tracer.write_json('{}.spans.json'.format(os.path.splitext(path)[0]))
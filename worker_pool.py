@@ -0,0 +1,324 @@
+"""
+@since: 2014-06-23
+@author: Jivan
+@brief: Long-lived python processes that run fixture tools jobs (Ex: migrate_and_dump) with the
+    current code, so django, South & the project are imported and set up once per worker
+    instead of once per fixture.
+    Jobs & results are passed as lines of json over the worker's stdin & stdout.  A worker is
+    replaced after max_jobs jobs to bound whatever state leaks between jobs, and after any job
+    that kills it.
+    Spans traced in a worker are sent back with the job's result, @see tracing.
+    Forking workers ('zygotes') import django, South & the project and load the app cache once,
+    then fork a child for each job.  Every job starts from the same clean, warmed-up state and
+    nothing it does survives it.  A zygote rooted in a worktree of an old commit
+    (@see commit_zygote()) runs jobs with that commit's models.
+
+Settings:
+    FIXTURE_TOOLS_WORKER_MAX_JOBS: Jobs a worker runs before it's replaced (default 20).
+"""
+import atexit
+from contextlib import contextmanager
+import logging
+import os
+from subprocess import Popen, PIPE
+import sys
+import threading
+import traceback
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+import simplejson as json
+
+from django_fixture_tools.tracing import get_tracer, span
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_JOBS = 20
+# Resolved on import, in case the process changes directory later.
+WORKER_SCRIPT = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
+
+
+def _migrate_and_dump(fixture_path, canonical=False):
+    from django_fixture_tools.migration_plans import get_migration_plan
+    from django_fixture_tools.shared import migrate_and_dump, get_latest_fixture_migrations
+    # The scratch database holds the fixture, so its history heads are the database's.
+    plan = get_migration_plan(get_latest_fixture_migrations(fixture_path))
+    return migrate_and_dump(fixture_path, canonical=canonical, plan=plan)
+
+
+def _load_fixture(fixture_path, database='fixture_tools_db', bases=None):
+    from django_fixture_tools.scratch_db import prepare_scratch_db
+    from django_fixture_tools.shared import load_fixture
+    prepare_scratch_db(database)
+    load_fixture(fixture_path, database=database, bases=bases)
+
+
+def _compile_fixture(fixture_path, database='fixture_tools_db', loaded=False):
+    from django_fixture_tools.fixture_cache import compile_fixture
+    return compile_fixture(fixture_path, database=database, loaded=loaded)
+
+
+def _find_invalid_fixtures(fixture_paths):
+    from django_fixture_tools.fixture_validator import find_invalid_fixtures
+    # In the job's own process, migrate_fixtures.py -j already runs zygotes in parallel.
+    invalid = find_invalid_fixtures(fixture_paths, jobs=1)
+    return [f for f in fixture_paths if f in invalid]
+
+
+# Jobs a worker runs: {<name>: <function>, ...}  Arguments & results must be json.
+JOBS = {
+    'compile_fixture': _compile_fixture,
+    'find_invalid_fixtures': _find_invalid_fixtures,
+    'load_fixture': _load_fixture,
+    'migrate_and_dump': _migrate_and_dump,
+}
+
+
+class WorkerDied(Exception):
+    pass
+
+
+class JobFailed(Exception):
+    pass
+
+
+class Worker(object):
+    """ @brief: One worker process, running jobs one at a time.
+        @author: Jivan
+        @since: 2014-06-23
+    """
+    def __init__(self, cwd=None, env=None, fork=False):
+        self.jobs_run = 0
+        args = [sys.executable, WORKER_SCRIPT]
+        if fork:
+            args.append('--fork')
+        self.process = Popen(args, cwd=cwd, env=env, stdin=PIPE, stdout=PIPE,
+                             universal_newlines=True)
+
+    def run(self, job, **kwargs):
+        """ @brief: Runs \a job with keyword arguments \a kwargs in the worker.
+            @author: Jivan
+            @since: 2014-06-23
+            @return: The job's result.
+            @raise JobFailed: If the job raised an exception, the worker carries on.
+            @raise WorkerDied: If the worker exited, it can't be used again.
+        """
+        self.jobs_run += 1
+        tracer = get_tracer()
+        request = {'job': job, 'kwargs': kwargs, 'trace': tracer.enabled}
+        with span('worker_job', job=job, **kwargs):
+            try:
+                self.process.stdin.write(json.dumps(request) + '\n')
+                self.process.stdin.flush()
+                response = self.process.stdout.readline()
+            except IOError:
+                response = ''
+        if not response:
+            raise WorkerDied('Worker exited with {} running {}({})'.format(
+                             self.process.wait(), job, kwargs))
+        response = json.loads(response)
+        tracer.add(response.get('spans', []))
+        if 'error' in response:
+            raise JobFailed('{}({}) failed in worker:\n{}'.format(job, kwargs, response['error']))
+        return response['result']
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def close(self):
+        if self.alive():
+            self.process.stdin.close()
+            self.process.wait()
+
+
+class WorkerPool(object):
+    """ @brief: Up to \a size workers rooted in \a cwd, started as they're needed.
+        @author: Jivan
+        @since: 2014-06-23
+        @param max_jobs: Jobs a worker runs before it's replaced, None to never replace workers.
+        @param fork: If True workers are zygotes, forking a child per job.
+    """
+    def __init__(self, size=1, max_jobs=DEFAULT_MAX_JOBS, cwd=None, env=None, fork=False):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.fork = fork
+        self.cwd = cwd
+        self.env = env
+        self._idle = Queue()
+        self._started = 0
+        self._lock = threading.Lock()
+
+    def _get_worker(self):
+        with self._lock:
+            if self._idle.empty() and self._started < self.size:
+                self._started += 1
+                return Worker(cwd=self.cwd, env=self.env, fork=self.fork)
+        return self._idle.get()
+
+    def _put_worker(self, worker):
+        if worker.alive() and (self.max_jobs is None or worker.jobs_run < self.max_jobs):
+            self._idle.put(worker)
+        else:
+            logger.debug('Recycling worker after {} jobs'.format(worker.jobs_run))
+            worker.close()
+            with self._lock:
+                self._started -= 1
+            # Make way for a replacement if anything is waiting for a worker.
+            self._idle.put(None)
+
+    def run(self, job, **kwargs):
+        """ @brief: Runs \a job in a free worker, waiting for one if they're all busy.
+            @author: Jivan
+            @since: 2014-06-23
+            @see Worker.run()
+        """
+        worker = self._get_worker()
+        while worker is None:
+            worker = self._get_worker()
+        try:
+            return worker.run(job, **kwargs)
+        finally:
+            self._put_worker(worker)
+
+    def close(self):
+        """ @brief: Stops all the idle workers.
+            @author: Jivan
+            @since: 2014-06-23
+        """
+        while not self._idle.empty():
+            worker = self._idle.get()
+            if worker is not None:
+                worker.close()
+                with self._lock:
+                    self._started -= 1
+
+
+_worker_pools = {}
+
+
+def get_worker_pool(project_dir=None, size=1, db_index=None):
+    """ @brief: Returns the (per process) WorkerPool of zygotes running the code in
+            \a project_dir (default: the current directory).
+        @author: Jivan
+        @since: 2014-06-23
+        @param db_index: If not None, the workers' scratch database is
+            fixture_tools_db_<db_index> (@see settings_migrator).
+    """
+    from django.conf import settings
+    from django_fixture_tools.git_worktrees import tools_environment
+    project_dir = os.path.abspath(project_dir or os.getcwd())
+    key = (project_dir, db_index)
+    if key not in _worker_pools:
+        max_jobs = getattr(settings, 'FIXTURE_TOOLS_WORKER_MAX_JOBS', DEFAULT_MAX_JOBS)
+        env = tools_environment(project_dir)
+        if db_index is not None:
+            env['FIXTURE_TOOLS_DB_INDEX'] = str(db_index)
+        pool = WorkerPool(size=size, max_jobs=max_jobs, cwd=project_dir, env=env, fork=True)
+        atexit.register(pool.close)
+        _worker_pools[key] = pool
+    return _worker_pools[key]
+
+
+@contextmanager
+def commit_zygote(commit, repo_dir=None, env=None):
+    """ @brief: Context manager giving a WorkerPool with one zygote running the code of
+            \a commit, from a worktree of it (@see git_worktrees).
+        @author: Jivan
+        @since: 2014-06-24
+        @param env: Extra environment variables for the zygote.
+        @note: The zygote imports django & the project once for all the jobs run with it, the
+            worktree is kept until it's finished with.
+    """
+    from django_fixture_tools.git_worktrees import get_worktree_cache, tools_environment
+    cache = get_worktree_cache(repo_dir)
+    worktree = cache.checkout(commit, pin=True)
+    try:
+        project_dir = cache.project_dir(worktree)
+        zygote_env = tools_environment(project_dir)
+        zygote_env.update(env or {})
+        pool = WorkerPool(size=1, max_jobs=None, cwd=project_dir, env=zygote_env, fork=True)
+        try:
+            yield pool
+        finally:
+            pool.close()
+    finally:
+        cache.unpin(worktree)
+
+
+def _run_job(request):
+    tracer = get_tracer()
+    tracer.enabled = request.get('trace', False)
+    try:
+        response = {'result': JOBS[request['job']](**request['kwargs'])}
+    except Exception:
+        response = {'error': traceback.format_exc()}
+    spans = tracer.take()
+    if tracer.enabled:
+        response['spans'] = spans
+    return response
+
+
+def _warm_up():
+    """ @brief: Imports the project & loads the model, South migration & migration inventory
+            caches, which forked children then share.
+    """
+    from django.db.models import get_models
+    from django_fixture_tools.shared import get_codebase_migrations
+    from south.migration import all_migrations
+    get_models()
+    list(all_migrations())
+    # Lists the working tree's migrations, @see migration_inventory.get_migration_inventory()
+    get_codebase_migrations()
+
+
+def serve(fork=False):
+    """ @brief: Worker main loop, runs jobs from stdin until it's closed.
+        @author: Jivan
+        @since: 2014-06-23
+        @param fork: Run each job in a forked child, @see _warm_up()
+    """
+    # Responses get the real stdout to themselves, anything else printed goes to stderr.
+    responses = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    if fork:
+        import django.db
+        # Reported with the first traced job.
+        tracer = get_tracer()
+        tracer.enabled = True
+        with span('worker_startup', cwd=os.getcwd()):
+            _warm_up()
+        tracer.enabled = False
+        # Children mustn't share the parent's database connection.
+        django.db.close_connection()
+
+    for line in iter(sys.stdin.readline, ''):
+        request = json.loads(line)
+        if not fork:
+            response = _run_job(request)
+        else:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    responses.write(json.dumps(_run_job(request)) + '\n')
+                    responses.flush()
+                finally:
+                    os._exit(0)
+            # The child reported the spans recorded so far.
+            get_tracer().take()
+            pid, status = os.waitpid(pid, 0)
+            if status == 0:
+                continue
+            response = {'error': 'Job process exited with status {}'.format(status)}
+        responses.write(json.dumps(response) + '\n')
+        responses.flush()
+
+
+if __name__ == '__main__':
+    serve(fork='--fork' in sys.argv[1:] and hasattr(os, 'fork'))